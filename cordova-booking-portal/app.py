@@ -1,5 +1,5 @@
 import streamlit as st
-from config.settings import SESSION_KEYS
+from config.settings import QUERY_INSTRUMENTATION, SESSION_KEYS
 
 st.set_page_config(
     page_title="Cordova Publications | Online Booking Portal",
@@ -32,4 +32,9 @@ def get_nav_config():
 
 
 nav = st.navigation(get_nav_config())
+
+if QUERY_INSTRUMENTATION:
+    from utils.query_panel import render_query_panel
+    render_query_panel()
+
 nav.run()
@@ -0,0 +1,66 @@
+# bench/compare.py
+"""
+Compares two benchmark result files written by bench.run.
+
+    python -m bench.compare baseline.json current.json --tolerance 0.2
+
+Exits 1 when any scenario's mean latency or queries per call grew by more
+than the tolerance (a fraction of the baseline value).
+"""
+import argparse
+import json
+import sys
+
+COMPARED_METRICS = ("mean_ms", "p95_ms", "queries_per_call", "ops_per_sec")
+REGRESSION_METRICS = ("mean_ms", "queries_per_call")   # higher is worse
+
+
+def compare(baseline, current, tolerance=0.2):
+    """-> (rows for printing, list of regression messages)."""
+    rows, regressions = [], []
+    for name, cur in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            rows.append((name, "new scenario", "", "", ""))
+            continue
+        for metric in COMPARED_METRICS:
+            b, c = base.get(metric), cur.get(metric)
+            if b is None or c is None:
+                continue
+            change = (c - b) / b if b else 0.0
+            rows.append((name, metric, b, c, change))
+            if metric in REGRESSION_METRICS and change > tolerance:
+                regressions.append(f"{name}.{metric}: {b} -> {c} (+{change:.0%})")
+    return rows, regressions
+
+
+def print_comparison(rows):
+    print(f"{'scenario':26} {'metric':18} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metric, b, c, change in rows:
+        if metric == "new scenario":
+            print(f"{name:26} {metric}")
+            continue
+        print(f"{name:26} {metric:18} {b:>12} {c:>12} {change:>+8.0%}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("baseline")
+    ap.add_argument("current")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    with open(args.current, encoding="utf-8") as fh:
+        current = json.load(fh)
+
+    rows, regressions = compare(baseline, current, args.tolerance)
+    print_comparison(rows)
+    for msg in regressions:
+        print("REGRESSION", msg)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# bench/run.py
+"""
+Runs the allocation benchmarks against the in-process local backend.
+
+Run from the app folder:
+    python -m bench.run --calls 200 --out bench-results.json
+    python -m bench.run --rtt-ms 20 --baseline bench-results.json
+
+Reports per scenario: latency (mean/p50/p95/max), allocations per second,
+queries and rows per call (from db/instrumentation.py) and the hit rate.
+--rtt-ms adds a simulated network round trip to every query so query count
+shows up in latency the way it does against Supabase.
+"""
+import os
+
+# Must be set before the app modules read config.settings
+os.environ["CORDOVA_DB_BACKEND"] = "local"
+os.environ["CORDOVA_QUERY_INSTRUMENTATION"] = "1"
+os.environ.setdefault("CORDOVA_USE_DAY_COUNTERS", "1")
+
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from bench.compare import compare, print_comparison
+from bench.scenarios import build_scenarios
+from bench.workload import WorkloadSpec, generate
+from db.connection import get_supabase
+from db.instrumentation import begin_rerun
+from db.local_backend import get_local_store
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _quiet_streamlit():
+    """st.cache_* warns about the missing runtime on every call outside Streamlit."""
+    get_supabase()   # first call configures streamlit's loggers
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_scenario(scenario, calls, warmup, seed):
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        scenario.run(rng)
+
+    latencies, queries, rows, hits = [], [], [], 0
+    begin_rerun()   # drop records from warmup
+    started = time.perf_counter()
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        hits += scenario.run(rng)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        records = begin_rerun()
+        queries.append(len(records))
+        rows.append(sum(r["rows"] for r in records))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "calls": calls,
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(_percentile(latencies, 0.5), 3),
+        "p95_ms": round(_percentile(latencies, 0.95), 3),
+        "max_ms": round(max(latencies), 3),
+        "ops_per_sec": round(calls * scenario.ops_per_call / elapsed, 2) if elapsed else None,
+        "queries_per_call": round(statistics.fmean(queries), 2),
+        "rows_per_call": round(statistics.fmean(rows), 1),
+        "hit_rate": round(hits / (calls * scenario.ops_per_call), 3),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--calls", type=int, default=100, help="Timed calls per scenario")
+    ap.add_argument("--warmup", type=int, default=5)
+    ap.add_argument("--scenario", action="append", help="Only run these scenarios (repeatable)")
+    ap.add_argument("--rtt-ms", type=float, default=0.0, help="Simulated round trip per query")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--rps", type=int, default=WorkloadSpec.n_rps)
+    ap.add_argument("--subjects", type=int, default=WorkloadSpec.n_subjects)
+    ap.add_argument("--months", type=int, default=WorkloadSpec.months)
+    ap.add_argument("--bookings-per-day", type=int, default=WorkloadSpec.bookings_per_day)
+    ap.add_argument("--out", help="Write results as JSON")
+    ap.add_argument("--dump-seed", help="Also write the generated tables as JSON (for CORDOVA_LOCAL_DB_SEED)")
+    ap.add_argument("--baseline", help="Compare against an earlier results file")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    spec = WorkloadSpec(
+        n_rps=args.rps, n_subjects=args.subjects, months=args.months,
+        bookings_per_day=args.bookings_per_day, seed=args.seed,
+    )
+    data = generate(spec)
+    if args.dump_seed:
+        with open(args.dump_seed, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+
+    _quiet_streamlit()
+    store = get_local_store()
+    store.load(data)
+    store.rpcs["rebuild_booking_day_counters"](store, {})
+
+    store.latency_ms = args.rtt_ms
+
+    scenarios = build_scenarios(data)
+    if args.scenario:
+        scenarios = [s for s in scenarios if s.name in args.scenario]
+    scenarios.sort(key=lambda s: s.mutates)
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(scenario, args.calls, args.warmup, args.seed)
+        r = results[scenario.name]
+        print(
+            f"{scenario.name:26} mean {r['mean_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+            f"{r['ops_per_sec']:9.1f} ops/s  {r['queries_per_call']:5.1f} queries  hit {r['hit_rate']:.0%}"
+        )
+
+    output = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "calls": args.calls,
+            "rtt_ms": args.rtt_ms,
+            "counts": {table: len(rows) for table, rows in data.items()},
+        },
+        "spec": spec.as_dict(),
+        "scenarios": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(output, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        rows, regressions = compare(baseline, output, args.tolerance)
+        print_comparison(rows)
+        for msg in regressions:
+            print("REGRESSION", msg)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# bench/scenarios.py
+"""
+Benchmark scenarios over a generated workload.
+
+Each Scenario wraps one operation the app performs; run(rng) executes it once
+against whatever client db.connection returns and reports how many
+allocations it produced (or slots/days found for read-only scenarios).
+Scenarios that write (mutates=True) are run after the read-only ones.
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable
+
+from db import availability_cache
+from db.allocation import assign_rp, availability_calendar, available_slots_summary, book_session
+from db.bulk_allocation import assign_rp_bulk, plan_rp_bulk
+
+BULK_BATCH_SIZE = 40
+CALENDAR_DAYS = 14
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable            # run(rng) -> allocations made / 1 if any slot was open
+    ops_per_call: int = 1    # allocations attempted per call, for ops/sec
+    mutates: bool = False
+
+
+class RequestFactory:
+    """Random booking requests drawn from the workload's reference rows."""
+
+    def __init__(self, data, window_days=30):
+        self.subjects = [r["id"] for r in data["subjects"]]
+        self.slots = [r["id"] for r in data["slots"]]
+        self.schools = [r["id"] for r in data["schools"]]
+        self.session_types = [r["id"] for r in data["session_types"]]
+        self.salespersons = [u["id"] for u in data["users"] if u["role"] == "salesperson"]
+        first = min(b["date"] for b in data["bookings"]) if data["bookings"] else date.today().isoformat()
+        start = date.fromisoformat(first)
+        self.dates = [
+            d for d in (start + timedelta(days=i) for i in range(window_days)) if d.weekday() != 6
+        ]
+
+    def request(self, rng, booking_date=None):
+        return {
+            "subject_id": rng.choice(self.subjects),
+            "slot_id": rng.choice(self.slots),
+            "session_type_id": rng.choice(self.session_types),
+            "school_id": rng.choice(self.schools),
+            "salesperson_id": rng.choice(self.salespersons) if self.salespersons else None,
+            "date": booking_date or rng.choice(self.dates),
+            "topic": "Benchmark",
+            "title_name": "Benchmark",
+            "status": "Pending",
+        }
+
+
+def build_scenarios(data):
+    factory = RequestFactory(data)
+
+    def run_assign_rp(rng):
+        r = factory.request(rng)
+        return int(bool(assign_rp(r["subject_id"], r["slot_id"], r["date"], r["session_type_id"], r["school_id"])))
+
+    def run_summary(rng):
+        r = factory.request(rng)
+        rows = available_slots_summary(r["subject_id"], r["date"], r["session_type_id"])
+        return int(any(s["possible_rps"] and s["remaining_parallel"] > 0 for s in rows))
+
+    def run_calendar(rng):
+        r = factory.request(rng)
+        cal = availability_calendar(
+            r["subject_id"], r["session_type_id"], r["date"], r["date"] + timedelta(days=CALENDAR_DAYS - 1)
+        )
+        return int(any(any(row) for row in cal["possible_rps"]))
+
+    # A salesperson editing one form: the same few (subject, date, type) repeat
+    pool_rng = random.Random(0)
+    rerender_pool = [factory.request(pool_rng) for _ in range(5)]
+
+    def run_form_rerender(rng):
+        r = rng.choice(rerender_pool)
+        rows = availability_cache.slots_summary(r["subject_id"], r["date"], r["session_type_id"])
+        availability_cache.calendar(
+            r["subject_id"], r["session_type_id"], r["date"], r["date"] + timedelta(days=CALENDAR_DAYS - 1)
+        )
+        return int(any(s["possible_rps"] and s["remaining_parallel"] > 0 for s in rows))
+
+    def bulk_batch(rng):
+        days = rng.sample(factory.dates, min(5, len(factory.dates)))
+        return [factory.request(rng, rng.choice(days)) for _ in range(BULK_BATCH_SIZE)]
+
+    def run_plan_bulk(rng):
+        return sum(1 for r in plan_rp_bulk(bulk_batch(rng)) if r["rp_id"])
+
+    def run_book_session(rng):
+        return int(bool(book_session(factory.request(rng))))
+
+    def run_assign_bulk(rng):
+        return sum(1 for r in assign_rp_bulk(bulk_batch(rng)) if r.get("booking"))
+
+    return [
+        Scenario("assign_rp", run_assign_rp),
+        Scenario("available_slots_summary", run_summary),
+        Scenario("availability_calendar", run_calendar),
+        Scenario("booking_form_rerender", run_form_rerender),
+        Scenario("plan_rp_bulk", run_plan_bulk, ops_per_call=BULK_BATCH_SIZE),
+        Scenario("book_session", run_book_session, mutates=True),
+        Scenario("assign_rp_bulk", run_assign_bulk, ops_per_call=BULK_BATCH_SIZE, mutates=True),
+    ]
@@ -0,0 +1,173 @@
+# bench/workload.py
+"""
+Synthetic data for allocation benchmarks and offline runs.
+
+generate() builds every table the allocation code reads (slots, session types,
+subjects, schools, resource persons, rp_subject_rules, rp_unavailability,
+bookings) plus salesperson users and some feedback, deterministically from a
+seed. The result is the {"table": [rows]} layout LocalStore loads, so it can
+also be written to JSON and used as CORDOVA_LOCAL_DB_SEED.
+"""
+import random
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta, timezone
+
+BOOKING_STATUS_MIX = {
+    "Pending": 0.25,
+    "Approved": 0.25,
+    "Scheduled": 0.15,
+    "Completed": 0.2,
+    "Rejected": 0.1,
+    "Cancelled": 0.05,
+}
+
+
+@dataclass
+class WorkloadSpec:
+    n_rps: int = 40
+    n_subjects: int = 8
+    n_slots: int = 7
+    n_schools: int = 300
+    n_salespersons: int = 25
+    months: int = 3
+    start: str = "2026-11-02"
+    bookings_per_day: int = 45          # attempted per weekday; Saturdays get a third
+    avrd_share: float = 0.15            # share of bookings with the AVRD session type
+    rps_per_subject: int = 8            # rules per subject and day kind
+    absence_rate: float = 0.04          # chance an RP has an absence row on a given day
+    seed: int = 7
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate(spec: WorkloadSpec = None):
+    spec = spec or WorkloadSpec()
+    rng = random.Random(spec.seed)
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat()
+
+    slots = []
+    for i in range(spec.n_slots):
+        start = datetime(2026, 1, 1, 9, 0) + timedelta(minutes=60 * i)
+        slots.append({
+            "id": _uuid(rng),
+            "start_time": start.strftime("%H:%M:%S"),
+            "end_time": (start + timedelta(minutes=45)).strftime("%H:%M:%S"),
+            "duration_minutes": 45,
+            "is_active": True,
+        })
+
+    session_types = [
+        {"id": _uuid(rng), "name": name, "duration_minutes": 45, "is_active": True}
+        for name in ("Classroom", "Workshop", "AVRD")
+    ]
+    avrd = session_types[-1]
+    regular = session_types[:-1]
+
+    subjects = [{"id": _uuid(rng), "name": f"Subject {i + 1:02d}", "is_active": True} for i in range(spec.n_subjects)]
+    schools = [
+        {"id": _uuid(rng), "name": f"School {i + 1:04d}", "city": f"City {i % 12 + 1}", "is_active": True}
+        for i in range(spec.n_schools)
+    ]
+
+    users, resource_persons = [], []
+    for i in range(spec.n_salespersons):
+        users.append({
+            "id": _uuid(rng), "name": f"Salesperson {i + 1}", "email": f"sales{i + 1}@example.com",
+            "role": "salesperson", "is_active": True, "created_at": created,
+        })
+    for i in range(spec.n_rps):
+        user = {
+            "id": _uuid(rng), "name": f"RP {i + 1}", "email": f"rp{i + 1}@example.com",
+            "role": "rp", "is_active": True, "created_at": created,
+        }
+        users.append(user)
+        resource_persons.append({"id": _uuid(rng), "display_name": user["name"], "user_id": user["id"], "is_active": True})
+    salespersons = [u for u in users if u["role"] == "salesperson"]
+
+    rules = []
+    rp_ids = [rp["id"] for rp in resource_persons]
+    for subject in subjects:
+        for is_saturday in (False, True):
+            for is_avrd in (False, True):
+                picked = rng.sample(rp_ids, min(spec.rps_per_subject, len(rp_ids)))
+                for priority, rp_id in enumerate(picked, start=1):
+                    rules.append({
+                        "id": _uuid(rng), "rp_id": rp_id, "subject_id": subject["id"], "priority": priority,
+                        "max_classes_per_day": rng.choice((1, 2, 2, 3, 3, 4)),
+                        "is_saturday": is_saturday, "is_avrd": is_avrd,
+                    })
+    rp_by_subject = {}
+    for r in rules:
+        rp_by_subject.setdefault(r["subject_id"], set()).add(r["rp_id"])
+
+    first = date.fromisoformat(spec.start)
+    days = [first + timedelta(days=i) for i in range(spec.months * 30)]
+    days = [d for d in days if d.weekday() != 6]   # no Sunday sessions
+
+    absences = []
+    for d in days:
+        for rp_id in rp_ids:
+            if rng.random() >= spec.absence_rate:
+                continue
+            full_day = rng.random() < 0.5
+            # Some full-day absences are multi-day leave stored as one range row
+            end_date = d + timedelta(days=rng.randint(1, 4)) if full_day and rng.random() < 0.2 else None
+            absences.append({
+                "id": _uuid(rng), "rp_id": rp_id, "date": d.isoformat(),
+                "end_date": end_date.isoformat() if end_date else None, "is_full_day": full_day,
+                "slot_id": None if full_day else rng.choice(slots)["id"],
+                "session_type_id": None, "created_at": created,
+            })
+
+    bookings, feedback = [], []
+    for d in days:
+        per_day = spec.bookings_per_day // 3 if d.weekday() == 5 else spec.bookings_per_day
+        for _ in range(rng.randint(per_day // 2, per_day)):
+            subject = rng.choice(subjects)
+            st_row = avrd if rng.random() < spec.avrd_share else rng.choice(regular)
+            status = _weighted(rng, BOOKING_STATUS_MIX)
+            row = {
+                "id": _uuid(rng),
+                "date": d.isoformat(),
+                "slot_id": rng.choice(slots)["id"],
+                "school_id": rng.choice(schools)["id"],
+                "subject_id": subject["id"],
+                "session_type_id": st_row["id"],
+                "salesperson_id": rng.choice(salespersons)["id"],
+                "rp_id": rng.choice(sorted(rp_by_subject.get(subject["id"], [None]))) if rng.random() < 0.9 else None,
+                "status": status,
+                "topic": "Synthetic session",
+                "title_name": "Synthetic",
+                "created_at": created,
+            }
+            bookings.append(row)
+            if status == "Completed" and rng.random() < 0.6:
+                feedback.append({
+                    "id": _uuid(rng), "booking_id": row["id"], "salesperson_id": row["salesperson_id"],
+                    "was_conducted": rng.random() < 0.9, "teacher_response_rating": rng.randint(1, 5),
+                    "engagement_rating": rng.randint(1, 5), "school_feedback": "", "notes": "",
+                    "created_at": datetime(d.year, d.month, d.day, 17, rng.randint(0, 59), tzinfo=timezone.utc).isoformat(),
+                })
+
+    return {
+        "slots": slots,
+        "session_types": session_types,
+        "subjects": subjects,
+        "schools": schools,
+        "users": users,
+        "resource_persons": resource_persons,
+        "rp_subject_rules": rules,
+        "rp_unavailability": absences,
+        "bookings": bookings,
+        "feedback": feedback,
+    }
@@ -1,4 +1,5 @@
 # config/settings.py
+import os
 
 ROLES = {
     "salesperson": "Salesperson",
@@ -11,6 +12,9 @@ USER_STATUS = {
     "active": "Active",
 }
 
+# Booking statuses that occupy an RP / slot / school for allocation rules
+STATUS_BLOCKING = ["Pending", "Approved", "Scheduled", "Completed"]
+
 SESSION_KEYS = {
     "role": "role",
     "email": "email",
@@ -18,3 +22,72 @@ SESSION_KEYS = {
     "user_row": "user_row",          # row from public.users table
     "auth_user": "auth_user",        # supabase auth user
 }
+
+# Lookup tables (subjects, schools, RPs, session types, slots) are cached
+# process-wide for this long; writes that change them invalidate explicitly.
+REFERENCE_CACHE_TTL_SECONDS = 600
+
+# Upper bound on concurrent Supabase requests issued by db.fetch.fetch_parallel
+FETCH_MAX_WORKERS = 6
+
+# Query instrumentation (db/instrumentation.py). When on, every Supabase call
+# is timed and the sidebar shows the previous rerun's query cost.
+QUERY_INSTRUMENTATION = os.environ.get("CORDOVA_QUERY_INSTRUMENTATION", "0") == "1"
+QUERY_LOG_PATH = os.environ.get("CORDOVA_QUERY_LOG_PATH")   # optional JSON-lines sink
+N_PLUS_ONE_THRESHOLD = 3    # same query from the same caller this many times per rerun
+
+# Read allocation counters from the booking_day_counters rollup
+# (db/sql/003_booking_day_counters.sql) instead of scanning bookings.
+USE_DAY_COUNTERS = os.environ.get("CORDOVA_USE_DAY_COUNTERS", "1") == "1"
+
+# Days of the rp_unavailability index (db/absences.py) are reused for this long;
+# absences recorded through the app invalidate their dates immediately, and
+# writes from other processes via the table_versions marker (db/sql/009).
+ABSENCE_CACHE_TTL_SECONDS = 120
+
+# Availability per (subject, date, session type) is memoized for this long by
+# db/availability_cache.py; bookings, status changes and absences invalidate
+# the affected dates immediately.
+AVAILABILITY_CACHE_TTL_SECONDS = 60
+
+# School typeahead on the booking form (db/schools.py): at most
+# SCHOOL_SEARCH_LIMIT matches per search; results are reused for longer
+# queries for SCHOOL_SEARCH_TTL_SECONDS (adding a school clears them).
+SCHOOL_SEARCH_LIMIT = 20
+SCHOOL_SEARCH_TTL_SECONDS = 300
+
+# Bulk booking import (db/booking_import.py): uploads are parsed
+# IMPORT_READ_CHUNK_ROWS rows at a time and capped at IMPORT_MAX_ROWS; accepted
+# rows are allocated and committed in whole-day groups of about
+# IMPORT_COMMIT_CHUNK_ROWS.
+IMPORT_READ_CHUNK_ROWS = 500
+IMPORT_MAX_ROWS = 5000
+IMPORT_COMMIT_CHUNK_ROWS = 200
+
+# Admin exports (db/export.py) page through bookings/feedback this many rows
+# per request and stream each page to the output file.
+EXPORT_PAGE_SIZE = 1000
+# Export files older than this are deleted by the next export (sessions that
+# went away without downloading or changing filters leave theirs behind).
+EXPORT_MAX_AGE_SECONDS = 3600
+
+# Feedback analytics (db/feedback_analytics.py): per-month feedback frames are
+# topped up with new rows at most every FEEDBACK_REPORT_REFRESH_SECONDS for the
+# current month, and fully reloaded after FEEDBACK_REPORT_TTL_SECONDS.
+FEEDBACK_REPORT_REFRESH_SECONDS = 60
+FEEDBACK_REPORT_TTL_SECONDS = 3600
+FEEDBACK_REPORT_MONTHS = 12
+
+# Allocation decision traces (db/allocation_trace.py): per-candidate rule
+# rejections and timings for assign_rp, shown in the admin "Allocation Trace"
+# tab. Rule-hit stats from traces reorder the per-RP rule checks once every
+# rule has RULE_ORDER_MIN_SAMPLES evaluations.
+ALLOCATION_TRACE = os.environ.get("CORDOVA_ALLOCATION_TRACE", "0") == "1"
+ALLOCATION_TRACE_HISTORY = 200
+RULE_ORDER_MIN_SAMPLES = 200
+
+# Storage backend: "supabase" (default) or "local" for the in-process store in
+# db/local_backend.py (offline runs, benchmarks). LOCAL_DB_SEED_PATH optionally
+# names a JSON file of {"table": [rows]} loaded when the local store starts.
+DB_BACKEND = os.environ.get("CORDOVA_DB_BACKEND", "supabase")
+LOCAL_DB_SEED_PATH = os.environ.get("CORDOVA_LOCAL_DB_SEED")
@@ -0,0 +1,186 @@
+# db/absences.py
+"""
+Absence index for allocation.
+
+Loads every rp_unavailability row overlapping a date window in one query and
+expands it into one DayAbsences per date: per RP a full-day flag, a set of
+blocked slots and a set of blocked session types. Rows with end_date cover
+[date, end_date] (see db/sql/004_rp_unavailability_ranges.sql), so multi-day
+leave is a single row.
+
+Indexed days are cached process-wide for ABSENCE_CACHE_TTL_SECONDS; code that
+writes rp_unavailability calls invalidate() for the dates it touched. Writes
+from other processes are caught by the table_versions change marker
+(db/sql/009_table_versions.sql): absence_index() reads it first, one primary
+key lookup, and drops the whole cache when it moved. Without that table the
+cache falls back to the TTL alone, which is only safe for a single process.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import date as dt_date, timedelta
+
+from config.settings import ABSENCE_CACHE_TTL_SECONDS
+from db.connection import UNDEFINED_TABLE_CODES, get_supabase, is_undefined
+
+ABSENCE_COLUMNS = "id, rp_id, date, end_date, is_full_day, slot_id, session_type_id"
+
+_lock = threading.Lock()
+_days = {}          # "YYYY-MM-DD" -> (loaded_at, DayAbsences)
+_UNREAD = object()      # fetch_version() result when the marker could not be read this time
+_marker = {"version": None, "installed": True}   # table_versions.version the cached days were loaded under
+
+
+def _as_date(d):
+    return dt_date.fromisoformat(str(d)[:10]) if not isinstance(d, dt_date) else d
+
+
+class DayAbsences:
+    """One day's absences, keyed by RP."""
+
+    def __init__(self, rows=()):
+        self.full_day = set()
+        self.slots = defaultdict(set)            # rp_id -> slot_ids
+        self.session_types = defaultdict(set)    # rp_id -> session_type_ids
+        for r in rows:
+            self.add(r)
+
+    def add(self, row):
+        rp_id = row.get("rp_id")
+        if row.get("is_full_day"):
+            self.full_day.add(rp_id)
+        if row.get("slot_id"):
+            self.slots[rp_id].add(row["slot_id"])
+        if row.get("session_type_id"):
+            self.session_types[rp_id].add(row["session_type_id"])
+
+    def is_absent(self, rp_id, slot_id=None, session_type_id=None):
+        if rp_id in self.full_day:
+            return True
+        if slot_id and slot_id in self.slots.get(rp_id, ()):
+            return True
+        if session_type_id and session_type_id in self.session_types.get(rp_id, ()):
+            return True
+        return False
+
+    def rp_ids(self):
+        return self.full_day | set(self.slots) | set(self.session_types)
+
+    def __bool__(self):
+        return bool(self.full_day or self.slots or self.session_types)
+
+
+def covered_dates(row, start=None, end=None):
+    """Dates a row covers, clipped to [start, end] when given."""
+    first = _as_date(row["date"])
+    last = _as_date(row["end_date"]) if row.get("end_date") else first
+    if start is not None:
+        first = max(first, _as_date(start))
+    if end is not None:
+        last = min(last, _as_date(end))
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def expand(rows, start=None, end=None):
+    """{"YYYY-MM-DD": DayAbsences} for the dates the rows cover."""
+    out = defaultdict(DayAbsences)
+    for r in rows:
+        for d in covered_dates(r, start, end):
+            out[str(d)].add(r)
+    return dict(out)
+
+
+def fetch_absence_rows(start, end, client=None):
+    """Raw rows overlapping [start, end]; a single-day row has end_date null."""
+    supabase = client or get_supabase()
+    start, end = str(start), str(end)
+    res = (
+        supabase.table("rp_unavailability")
+        .select(ABSENCE_COLUMNS)
+        .lte("date", end)
+        .or_(f"end_date.gte.{start},and(end_date.is.null,date.gte.{start})")
+        .order("date")
+        .execute()
+    )
+    return res.data or []
+
+
+def fetch_version(client=None):
+    """
+    rp_unavailability's change marker; None if table_versions is not installed,
+    _UNREAD if reading it failed for another reason (retried on the next call).
+    """
+    if not _marker["installed"]:
+        return None
+    supabase = client or get_supabase()
+    try:
+        rows = supabase.table("table_versions").select("version").eq("name", "rp_unavailability").execute().data
+    except Exception as e:
+        if is_undefined(e, UNDEFINED_TABLE_CODES):
+            _marker["installed"] = False  # migration 009 not applied: TTL only until restart
+            return None
+        return _UNREAD  # network, auth, timeout: skip the marker for this read only
+    return int(rows[0]["version"]) if rows else 0
+
+
+def absence_index(start, end):
+    """
+    {"YYYY-MM-DD": DayAbsences} for every date in [start, end]. Dates not in
+    the cache are loaded with one query spanning the first to last missing day.
+    """
+    first, last = _as_date(start), _as_date(end)
+    dates = [str(first + timedelta(days=i)) for i in range((last - first).days + 1)]
+    now = time.monotonic()
+    # Read before the rows so the rows are at least as new as the marker
+    version = fetch_version()
+
+    # Without a marker reading the cache cannot be trusted: read the rows, leave the cache alone
+    unread = version is _UNREAD
+    with _lock:
+        if not unread and version != _marker["version"]:
+            _days.clear()
+            _marker["version"] = version
+        days = {} if unread else {
+            d: _days[d][1] for d in dates if d in _days and now - _days[d][0] <= ABSENCE_CACHE_TTL_SECONDS
+        }
+    missing = [d for d in dates if d not in days]
+    if missing:
+        rows = fetch_absence_rows(missing[0], missing[-1])
+        loaded = expand(rows, missing[0], missing[-1])
+        span = dates[dates.index(missing[0]):dates.index(missing[-1]) + 1]
+        with _lock:
+            for d in span:
+                days[d] = loaded.get(d) or DayAbsences()
+                if not unread and _marker["version"] == version:
+                    _days[d] = (now, days[d])
+    return {d: days[d] for d in dates}
+
+
+def invalidate(start=None, end=None):
+    """Drops cached days in [start, end]; everything when no range is given."""
+    with _lock:
+        if start is None:
+            _days.clear()
+            return
+        first, last = _as_date(start), _as_date(end or start)
+        for d in list(_days):
+            if first <= _as_date(d) <= last:
+                del _days[d]
+
+
+def record_absence(rp_id, start, end=None, is_full_day=True, slot_id=None, session_type_id=None, client=None):
+    """Inserts one absence row (a range when end is after start) and invalidates its dates."""
+    from db import availability_cache  # imports db.allocation, which imports this module
+    supabase = client or get_supabase()
+    row = {
+        "rp_id": rp_id,
+        "date": str(start),
+        "end_date": str(end) if end and str(end) != str(start) else None,
+        "is_full_day": bool(is_full_day),
+        "slot_id": slot_id,
+        "session_type_id": session_type_id,
+    }
+    res = supabase.table("rp_unavailability").insert(row).execute()
+    invalidate(start, end or start)
+    availability_cache.invalidate(start, end or start)
+    return (res.data or [None])[0]
@@ -0,0 +1,75 @@
+# db/aggregates.py
+"""
+Dashboard counts computed by the database instead of in Python.
+
+count_bookings() is a single `count="exact", head=True` request (no rows
+transferred). status_counts() returns status x date-bucket counts from the
+booking_status_counts() RPC (db/sql/002_booking_status_counts.sql), falling
+back to one head-count per bucket/status if the function is not installed.
+"""
+from collections import Counter
+
+from db.connection import UNDEFINED_FUNCTION_CODES, get_supabase, is_undefined
+
+BOOKING_STATUSES = ["Pending", "Approved", "Scheduled", "Completed", "Rejected", "Cancelled"]
+
+
+def _apply_filters(q, eq=None, in_=None, date_from=None, date_to=None):
+    for k, v in (eq or {}).items():
+        q = q.eq(k, v)
+    for k, v in (in_ or {}).items():
+        q = q.in_(k, list(v))
+    if date_from:
+        q = q.gte("date", str(date_from))
+    if date_to:
+        q = q.lte("date", str(date_to))
+    return q
+
+
+def count_bookings(eq=None, in_=None, date_from=None, date_to=None, client=None) -> int:
+    supabase = client or get_supabase()
+    q = supabase.table("bookings").select("id", count="exact", head=True)
+    res = _apply_filters(q, eq, in_, date_from, date_to).execute()
+    return int(res.count or 0)
+
+
+def status_counts(buckets, salesperson_id=None, rp_id=None, session_type_ids=None, client=None):
+    """
+    buckets: {name: (date_from, date_to)}; None leaves a bound open.
+    Returns {name: Counter({status: n})} with every bucket present.
+    """
+    supabase = client or get_supabase()
+    out = {name: Counter() for name in buckets}
+    params = {
+        "p_buckets": [
+            {"name": name, "from": str(lo) if lo else None, "to": str(hi) if hi else None}
+            for name, (lo, hi) in buckets.items()
+        ],
+        "p_salesperson_id": salesperson_id,
+        "p_rp_id": rp_id,
+        "p_session_type_ids": list(session_type_ids) if session_type_ids else None,
+    }
+    try:
+        rows = supabase.rpc("booking_status_counts", params).execute().data or []
+    except Exception as e:
+        if not is_undefined(e, UNDEFINED_FUNCTION_CODES):
+            raise
+        rows = None  # function not installed yet
+
+    if rows is not None:
+        for r in rows:
+            out[r["bucket"]][r["status"]] += int(r["n"])
+        return out
+
+    eq = {}
+    if salesperson_id:
+        eq["salesperson_id"] = salesperson_id
+    if rp_id:
+        eq["rp_id"] = rp_id
+    in_ = {"session_type_id": session_type_ids} if session_type_ids else None
+    for name, (lo, hi) in buckets.items():
+        for status in BOOKING_STATUSES:
+            n = count_bookings({**eq, "status": status}, in_, lo, hi, client=supabase)
+            if n:
+                out[name][status] = n
+    return out
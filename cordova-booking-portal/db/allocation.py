@@ -1,8 +1,20 @@
 # db/allocation.py
-from datetime import date as dt_date
+from collections import Counter, defaultdict, namedtuple
+from datetime import date as dt_date, timedelta
+from functools import partial
+
+import numpy as np
+
+from config.settings import ALLOCATION_TRACE, STATUS_BLOCKING, USE_DAY_COUNTERS
+from db import allocation_trace, availability_cache
+from db.absences import DayAbsences, absence_index, expand as expand_absences
 from db.connection import get_supabase
+from db.rollup import counters_by_date, fetch_day_counters
+MAX_COMMIT_ATTEMPTS = 5
+
 
-STATUS_BLOCKING = ["Pending", "Approved", "Scheduled", "Completed"]
+class BookingConflictError(RuntimeError):
+    """Raised when concurrent submissions keep invalidating the allocation."""
 
 def _is_saturday(d):
     if isinstance(d, str):
@@ -30,43 +42,108 @@ def _adjacent_slot_ids(slots, slot_id):
     if i + 1 < len(ids): adj.append(ids[i+1])
     return adj
 
-def _count_bookings(filters: dict):
+class DaySnapshot:
+    """
+    In-memory counters of one day's blocking bookings plus the day's absences.
+    Loaded once per allocation so every rule check is a dict lookup instead of
+    a Supabase round-trip.
+    """
+
+    def __init__(self, booking_date, bookings=(), absences=None):
+        self.date = str(booking_date)
+        self.slot_counts = Counter()                # slot_id
+        self.school_counts = Counter()              # school_id
+        self.rp_counts = Counter()                  # rp_id
+        self.rp_subject_counts = Counter()          # (rp_id, subject_id)
+        self.rp_session_type_counts = Counter()     # (rp_id, session_type_id)
+        self.rp_slot_counts = Counter()             # (rp_id, slot_id)
+        # DayAbsences, or raw rp_unavailability rows for this date
+        self.absences = absences if isinstance(absences, DayAbsences) else DayAbsences(absences or ())
+
+        for b in bookings:
+            self.add(b)
+
+    def add(self, booking):
+        """Counts a booking; callers only pass rows with a blocking status."""
+        rp_id = booking.get("rp_id")
+        self.slot_counts[booking.get("slot_id")] += 1
+        self.school_counts[booking.get("school_id")] += 1
+        self.rp_counts[rp_id] += 1
+        self.rp_subject_counts[(rp_id, booking.get("subject_id"))] += 1
+        self.rp_session_type_counts[(rp_id, booking.get("session_type_id"))] += 1
+        self.rp_slot_counts[(rp_id, booking.get("slot_id"))] += 1
+
+    @classmethod
+    def from_counters(cls, booking_date, counters, absences=None):
+        """Builds a snapshot from booking_day_counters rows (see db/rollup.py)."""
+        snap = cls(booking_date, (), absences)
+        for attr, counter in (counters or {}).items():
+            setattr(snap, attr, Counter(counter))
+        return snap
+
+    def copy(self):
+        other = DaySnapshot(self.date)
+        for name in (
+            "slot_counts", "school_counts", "rp_counts",
+            "rp_subject_counts", "rp_session_type_counts", "rp_slot_counts",
+        ):
+            setattr(other, name, Counter(getattr(self, name)))
+        other.absences = self.absences
+        return other
+
+    def rp_is_absent(self, rp_id, slot_id=None, session_type_id=None):
+        return self.absences.is_absent(rp_id, slot_id=slot_id, session_type_id=session_type_id)
+
+
+def _date_range(start, end):
+    start = dt_date.fromisoformat(start) if isinstance(start, str) else start
+    end = dt_date.fromisoformat(end) if isinstance(end, str) else end
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+def _load_snapshots(start, end):
+    """One DaySnapshot per date in [start, end], from a single range query per table."""
     supabase = get_supabase()
-    q = supabase.table("bookings").select("id, status")
-    for k, v in filters.items():
-        q = q.eq(k, v)
-    res = q.execute()
-    rows = res.data or []
-    rows = [r for r in rows if r.get("status") in STATUS_BLOCKING]
-    return len(rows)
-
-def _rp_is_absent(rp_id, booking_date, slot_id=None, session_type_id=None):
-    supabase = get_supabase()
-    try:
-        q = (
-            supabase.table("rp_unavailability")
-            .select("id, is_full_day, slot_id, session_type_id")
-            .eq("rp_id", rp_id)
-            .eq("date", booking_date)
+
+    counters = None
+    if USE_DAY_COUNTERS:
+        try:
+            counters = counters_by_date(fetch_day_counters(start, end))
+        except Exception:
+            counters = None  # rollup not installed yet, count from bookings
+
+    bookings = []
+    if counters is None:
+        res = (
+            supabase.table("bookings")
+            .select("id, date, status, slot_id, school_id, rp_id, subject_id, session_type_id")
+            .gte("date", str(start))
+            .lte("date", str(end))
+            .in_("status", STATUS_BLOCKING)
+            .execute()
         )
-        res = q.execute()
-    except Exception:
-        return False  # if table not created yet, ignore absence
-
-    rows = res.data or []
-    for r in rows:
-        if r.get("is_full_day"):
-            return True
-        if slot_id and r.get("slot_id") == slot_id:
-            return True
-        if session_type_id and r.get("session_type_id") == session_type_id:
-            return True
-    return False
-
-def assign_rp(subject_id, slot_id, booking_date, session_type_id, school_id):
-    supabase = get_supabase()
+        bookings = res.data or []
+
+    absences = absence_index(start, end)
+
+    by_date = defaultdict(list)
+    for b in bookings:
+        by_date[b["date"]].append(b)
+
+    if counters is not None:
+        return {
+            str(d): DaySnapshot.from_counters(d, counters.get(str(d)), absences[str(d)])
+            for d in _date_range(start, end)
+        }
+    return {
+        str(d): DaySnapshot(d, by_date.get(str(d), []), absences[str(d)])
+        for d in _date_range(start, end)
+    }
 
-    # Session type
+def _load_day_snapshot(booking_date):
+    return _load_snapshots(booking_date, booking_date)[str(booking_date)]
+
+def _fetch_session_type(session_type_id):
+    supabase = get_supabase()
     st_res = (
         supabase.table("session_types")
         .select("id, name")
@@ -74,133 +151,377 @@ def assign_rp(subject_id, slot_id, booking_date, session_type_id, school_id):
         .limit(1)
         .execute()
     )
-    st_row = (st_res.data or [None])[0]
-    if not st_row:
-        return None
-
-    is_avrd = (st_row.get("name") or "").strip().upper() == "AVRD"
-    is_sat = _is_saturday(booking_date)
+    return (st_res.data or [None])[0]
 
-    # Rule: max 4 parallel per slot
-    if _count_bookings({"date": booking_date, "slot_id": slot_id}) >= 4:
-        return None
-
-    # Rule: max 2 per school per day
-    if _count_bookings({"date": booking_date, "school_id": school_id}) >= 2:
-        return None
+def _is_avrd(session_type_row):
+    return ((session_type_row or {}).get("name") or "").strip().upper() == "AVRD"
 
-    slots = _fetch_slots_ordered()
-    adjacent_ids = _adjacent_slot_ids(slots, slot_id)
-
-    # Priority list from rp_subject_rules
-    rules_res = (
+def _fetch_rules(subject_id, is_sat, is_avrd):
+    supabase = get_supabase()
+    q = (
         supabase.table("rp_subject_rules")
         .select("rp_id, priority, max_classes_per_day, is_saturday, is_avrd")
         .eq("subject_id", subject_id)
-        .eq("is_saturday", is_sat)
         .eq("is_avrd", is_avrd)
-        .order("priority")
-        .execute()
     )
-    rules = rules_res.data or []
-    if not rules:
-        return None
-
-    global_max = 2 if is_sat else 3
-
-    for rule in rules:
-        rp_id = rule["rp_id"]
-        subject_max = int(rule.get("max_classes_per_day") or 0)
-
-        # Absence rule
-        if _rp_is_absent(rp_id, booking_date, slot_id=slot_id, session_type_id=session_type_id):
-            continue
+    if is_sat is not None:
+        q = q.eq("is_saturday", is_sat)
+    rules_res = q.order("priority").execute()
+    return rules_res.data or []
+
+# Per-RP rules: each returns True when the rule rules the RP out. Listed in
+# the default evaluation order; allocation_trace.rule_order() may reorder them.
+def _rule_absence(snap, rule, req):
+    return snap.rp_is_absent(rule["rp_id"], slot_id=req.slot_id, session_type_id=req.session_type_id)
+
+def _rule_subject_quota(snap, rule, req):
+    return snap.rp_subject_counts[(rule["rp_id"], req.subject_id)] >= int(rule.get("max_classes_per_day") or 0)
+
+def _rule_global_quota(snap, rule, req):
+    return snap.rp_counts[rule["rp_id"]] >= req.global_max
+
+def _rule_avrd(snap, rule, req):
+    # AVRD one per day per RP
+    return req.is_avrd and snap.rp_session_type_counts[(rule["rp_id"], req.session_type_id)] >= 1
+
+def _rule_same_slot(snap, rule, req):
+    return snap.rp_slot_counts[(rule["rp_id"], req.slot_id)] > 0
+
+def _rule_adjacency(snap, rule, req):
+    # Break rule: no adjacent slot for same RP
+    return any(snap.rp_slot_counts[(rule["rp_id"], a)] > 0 for a in req.adjacent_ids)
+
+RP_RULES = {
+    "absence": _rule_absence,
+    "subject_quota": _rule_subject_quota,
+    "global_quota": _rule_global_quota,
+    "avrd": _rule_avrd,
+    "same_slot": _rule_same_slot,
+    "adjacency": _rule_adjacency,
+}
+
+_RuleInput = namedtuple(
+    "_RuleInput", "subject_id slot_id session_type_id is_avrd global_max adjacent_ids"
+)
+
+def _rp_rejection(snap, rule, subject_id, slot_id, session_type_id, is_avrd, global_max, adjacent_ids, order=None):
+    """Returns the first rule that rules this RP out, or None if the RP can take the class."""
+    req = _RuleInput(subject_id, slot_id, session_type_id, is_avrd, global_max, adjacent_ids)
+    for name in order or allocation_trace.rule_order(RP_RULES):
+        if RP_RULES[name](snap, rule, req):
+            return name
+    return None
 
-        # Subject quota
-        if _count_bookings({"date": booking_date, "rp_id": rp_id, "subject_id": subject_id}) >= subject_max:
-            continue
+def assign_rp(subject_id, slot_id, booking_date, session_type_id, school_id, snapshot=None, trace=None):
+    """
+    Returns the first RP (by rule priority) that passes every rule, or None.
+    With ALLOCATION_TRACE on (or an AllocationTrace passed in) the decision is
+    recorded for the admin trace panel.
+    """
+    if trace is None and ALLOCATION_TRACE:
+        trace = allocation_trace.AllocationTrace(subject_id, slot_id, booking_date, session_type_id, school_id)
+    rp_id, blocked_by = _assign_rp(subject_id, slot_id, booking_date, session_type_id, school_id, snapshot, trace)
+    if trace is not None:
+        trace.finish(rp_id, blocked_by)
+    return rp_id
+
+def _assign_rp(subject_id, slot_id, booking_date, session_type_id, school_id, snapshot, trace):
+    """-> (rp_id, None) or (None, reason the request could not be placed)."""
+    with allocation_trace.phase(trace, "session_type"):
+        st_row = _fetch_session_type(session_type_id)
+    if not st_row:
+        return None, "unknown_session_type"
 
-        # Global quota
-        if _count_bookings({"date": booking_date, "rp_id": rp_id}) >= global_max:
-            continue
+    is_avrd = _is_avrd(st_row)
+    is_sat = _is_saturday(booking_date)
+    with allocation_trace.phase(trace, "snapshot"):
+        snap = snapshot or _load_day_snapshot(booking_date)
 
-        # AVRD one per day per RP
-        if is_avrd and _count_bookings({"date": booking_date, "rp_id": rp_id, "session_type_id": session_type_id}) >= 1:
-            continue
+    # Rule: max 4 parallel per slot
+    if snap.slot_counts[slot_id] >= 4:
+        return None, "slot_capacity"
 
-        # Same-slot conflict
-        if _count_bookings({"date": booking_date, "rp_id": rp_id, "slot_id": slot_id}) > 0:
-            continue
+    # Rule: max 2 per school per day
+    if snap.school_counts[school_id] >= 2:
+        return None, "school_capacity"
 
-        # Break rule: no adjacent slot for same RP
-        if any(_count_bookings({"date": booking_date, "rp_id": rp_id, "slot_id": a}) > 0 for a in adjacent_ids):
-            continue
+    with allocation_trace.phase(trace, "slots"):
+        slots = _fetch_slots_ordered()
+    adjacent_ids = _adjacent_slot_ids(slots, slot_id)
 
-        return rp_id
+    # Priority list from rp_subject_rules
+    with allocation_trace.phase(trace, "rules"):
+        rules = _fetch_rules(subject_id, is_sat, is_avrd)
+    if not rules:
+        return None, "no_rules"
 
-    return None
+    global_max = 2 if is_sat else 3
+    order = allocation_trace.rule_order(RP_RULES)
+
+    if trace is None:
+        for rule in rules:
+            if _rp_rejection(snap, rule, subject_id, slot_id, session_type_id, is_avrd, global_max, adjacent_ids, order) is None:
+                return rule["rp_id"], None
+        return None, "all_rejected"
+
+    req = _RuleInput(subject_id, slot_id, session_type_id, is_avrd, global_max, adjacent_ids)
+    with allocation_trace.phase(trace, "candidates"):
+        for rule in rules:
+            checks = [(name, partial(RP_RULES[name], snap, rule, req)) for name in order]
+            if trace.check_candidate(rule, checks) is None:
+                return rule["rp_id"], None
+    return None, "all_rejected"
+
+def _availability_mask(snap, rules, slots, subject_id, session_type_id, is_avrd, global_max):
+    """
+    Boolean matrix (rules x slots): True where the rule's RP could take a class
+    in that slot. Same checks as _rp_rejection, evaluated as whole-array masks.
+    """
+    rp_ids = [r["rp_id"] for r in rules]
+    slot_ids = [s["id"] for s in slots]
+    n_rp, n_slot = len(rp_ids), len(slot_ids)
+
+    occupancy = np.array(
+        [[snap.rp_slot_counts[(rp, sl)] > 0 for sl in slot_ids] for rp in rp_ids],
+        dtype=bool,
+    ).reshape(n_rp, n_slot)
+    rp_total = np.array([snap.rp_counts[rp] for rp in rp_ids], dtype=int)
+    subject_count = np.array([snap.rp_subject_counts[(rp, subject_id)] for rp in rp_ids], dtype=int)
+    subject_max = np.array([int(r.get("max_classes_per_day") or 0) for r in rules], dtype=int)
+    avrd_count = np.array([snap.rp_session_type_counts[(rp, session_type_id)] for rp in rp_ids], dtype=int)
+
+    absences = snap.absences
+    full_day = np.array([rp in absences.full_day for rp in rp_ids], dtype=bool)
+    type_absent = np.array(
+        [bool(session_type_id) and session_type_id in absences.session_types.get(rp, ()) for rp in rp_ids],
+        dtype=bool,
+    )
+    slot_absent = np.zeros((n_rp, n_slot), dtype=bool)
+    slot_index = {sl: j for j, sl in enumerate(slot_ids)}
+    for i, rp in enumerate(rp_ids):
+        for sl in absences.slots.get(rp, ()):
+            if sl in slot_index:
+                slot_absent[i, slot_index[sl]] = True
+
+    # Break rule: a booking in the previous or next active slot blocks this one
+    adjacent = np.zeros_like(occupancy)
+    adjacent[:, 1:] |= occupancy[:, :-1]
+    adjacent[:, :-1] |= occupancy[:, 1:]
+
+    mask = ~slot_absent & ~occupancy & ~adjacent
+    mask &= ~(full_day | type_absent)[:, None]
+    mask &= (subject_count < subject_max)[:, None]
+    mask &= (rp_total < global_max)[:, None]
+    if is_avrd:
+        mask &= (avrd_count < 1)[:, None]
+    return mask
 
 def available_slots_summary(subject_id, booking_date, session_type_id):
-    supabase = get_supabase()
     slots = _fetch_slots_ordered()
-
-    st_res = (
-        supabase.table("session_types")
-        .select("id, name")
-        .eq("id", session_type_id)
-        .limit(1)
-        .execute()
-    )
-    st_row = (st_res.data or [None])[0]
-    is_avrd = (st_row.get("name") or "").strip().upper() == "AVRD"
+    is_avrd = _is_avrd(_fetch_session_type(session_type_id))
     is_sat = _is_saturday(booking_date)
+    rules = _fetch_rules(subject_id, is_sat, is_avrd)
+    global_max = 2 if is_sat else 3
+    snap = _load_day_snapshot(booking_date)
 
-    rules_res = (
-        supabase.table("rp_subject_rules")
-        .select("rp_id, priority, max_classes_per_day, is_saturday, is_avrd")
-        .eq("subject_id", subject_id)
-        .eq("is_saturday", is_sat)
-        .eq("is_avrd", is_avrd)
-        .order("priority")
+    mask = _availability_mask(snap, rules, slots, subject_id, session_type_id, is_avrd, global_max)
+    possible = mask.sum(axis=0)
+    booked = np.array([snap.slot_counts[s["id"]] for s in slots], dtype=int)
+    remaining = np.maximum(0, 4 - booked)
+
+    return [
+        {
+            "slot_id": s["id"],
+            "start_time": s["start_time"],
+            "end_time": s["end_time"],
+            "remaining_parallel": int(remaining[j]),
+            "possible_rps": int(possible[j]),
+        }
+        for j, s in enumerate(slots)
+    ]
+
+def availability_calendar(subject_id, session_type_id, start, end):
+    """
+    Availability for every date x active slot in [start, end].
+
+    Returns a compact dict:
+        dates: ["YYYY-MM-DD", ...]
+        slots: [{"slot_id", "start_time", "end_time"}, ...]
+        possible_rps / remaining_parallel: one row per date, one value per slot
+    """
+    slots = _fetch_slots_ordered()
+    is_avrd = _is_avrd(_fetch_session_type(session_type_id))
+
+    # Both weekday and Saturday rules in one query, split locally
+    all_rules = _fetch_rules(subject_id, None, is_avrd)
+    rules_by_sat = {
+        sat: [r for r in all_rules if bool(r.get("is_saturday")) == sat]
+        for sat in (True, False)
+    }
+
+    snapshots = _load_snapshots(start, end)
+
+    possible_rows, remaining_rows = [], []
+    for d, snap in snapshots.items():
+        is_sat = _is_saturday(d)
+        global_max = 2 if is_sat else 3
+        mask = _availability_mask(
+            snap, rules_by_sat[is_sat], slots, subject_id, session_type_id, is_avrd, global_max
+        )
+        booked = np.array([snap.slot_counts[s["id"]] for s in slots], dtype=int)
+        possible_rows.append(mask.sum(axis=0).astype(int).tolist())
+        remaining_rows.append(np.maximum(0, 4 - booked).tolist())
+
+    return {
+        "dates": list(snapshots.keys()),
+        "slots": [
+            {"slot_id": s["id"], "start_time": s["start_time"], "end_time": s["end_time"]}
+            for s in slots
+        ],
+        "possible_rps": possible_rows,
+        "remaining_parallel": remaining_rows,
+    }
+
+# ----------------------------
+# ATOMIC ALLOCATE + INSERT
+# See db/sql/001_commit_bookings.sql for the commit_bookings() RPC.
+# ----------------------------
+def _fetch_day_versions(dates):
+    supabase = get_supabase()
+    dates = sorted({str(d) for d in dates})
+    res = (
+        supabase.table("booking_day_versions")
+        .select("date, version")
+        .in_("date", dates)
         .execute()
     )
-    rules = rules_res.data or []
-    global_max = 2 if is_sat else 3
+    found = {r["date"]: int(r["version"]) for r in (res.data or [])}
+    return {d: found.get(d, 0) for d in dates}
 
-    summary = []
-    for s in slots:
-        slot_id = s["id"]
-        booked_here = _count_bookings({"date": booking_date, "slot_id": slot_id})
-        remaining_parallel = max(0, 4 - booked_here)
+def _commit_rows(expected_versions, rows):
+    """Inserts rows if no date in expected_versions changed; returns None on conflict."""
+    supabase = get_supabase()
+    dates = sorted({str(r["date"]) for r in rows})
+    try:
+        res = supabase.rpc(
+            "commit_bookings",
+            {"p_expected": expected_versions, "p_rows": rows},
+        ).execute()
+    except Exception as e:
+        if "booking_version_conflict" in str(e):
+            # Someone else changed these dates; cached availability is stale too
+            availability_cache.invalidate(dates[0], dates[-1])
+            return None
+        raise
+    if dates:
+        availability_cache.invalidate(dates[0], dates[-1])
+    return res.data or []
 
-        adjacent_ids = _adjacent_slot_ids(slots, slot_id)
+def book_session(booking: dict, max_attempts: int = MAX_COMMIT_ATTEMPTS):
+    """
+    Allocates an RP and inserts the booking as one compare-and-insert.
+    Re-runs allocation when another submission for the same date commits first.
+    Returns the inserted booking row, or None if no RP is available.
+    """
+    booking_date = str(booking["date"])
+
+    for _ in range(max_attempts):
+        # Versions must be read before the snapshot so the snapshot is at least as new
+        versions = _fetch_day_versions([booking_date])
+        snap = _load_day_snapshot(booking_date)
+
+        rp_id = assign_rp(
+            subject_id=booking["subject_id"],
+            slot_id=booking["slot_id"],
+            booking_date=booking_date,
+            session_type_id=booking["session_type_id"],
+            school_id=booking["school_id"],
+            snapshot=snap,
+        )
+        if not rp_id:
+            return None
 
-        possible = 0
-        for r in rules:
-            rp_id = r["rp_id"]
-            subject_max = int(r.get("max_classes_per_day") or 0)
+        rows = _commit_rows(versions, [{**booking, "date": booking_date, "rp_id": rp_id}])
+        if rows:
+            return rows[0]
 
-            if _rp_is_absent(rp_id, booking_date, slot_id=slot_id, session_type_id=session_type_id):
-                continue
-            if _count_bookings({"date": booking_date, "rp_id": rp_id}) >= global_max:
-                continue
-            if _count_bookings({"date": booking_date, "rp_id": rp_id, "slot_id": slot_id}) > 0:
-                continue
-            if any(_count_bookings({"date": booking_date, "rp_id": rp_id, "slot_id": a}) > 0 for a in adjacent_ids):
-                continue
-            if _count_bookings({"date": booking_date, "rp_id": rp_id, "subject_id": subject_id}) >= subject_max:
+    raise BookingConflictError(
+        f"Booking for {booking_date} kept conflicting with other submissions "
+        f"({max_attempts} attempts). Please submit again."
+    )
+
+# ----------------------------
+# RULE AUDIT
+# ----------------------------
+def find_rule_violations(bookings, slots, rules, session_types, absences=()):
+    """
+    Checks a set of committed bookings against the allocation rules.
+    `bookings` may span several dates; only blocking statuses are considered.
+    Returns a list of {"date", "rule", "detail"} dicts (empty when consistent).
+    """
+    slot_order = [s["id"] for s in slots]
+    avrd_types = {t["id"] for t in session_types if _is_avrd(t)}
+    rule_max = {
+        (r["rp_id"], r.get("subject_id"), bool(r.get("is_saturday")), bool(r.get("is_avrd"))):
+            int(r.get("max_classes_per_day") or 0)
+        for r in rules
+    }
+
+    by_date = defaultdict(list)
+    for b in bookings:
+        if b.get("status") in STATUS_BLOCKING:
+            by_date[str(b["date"])].append(b)
+    abs_by_date = expand_absences(absences)
+
+    violations = []
+
+    def flag(d, rule, detail):
+        violations.append({"date": d, "rule": rule, "detail": detail})
+
+    for d, day in sorted(by_date.items()):
+        snap = DaySnapshot(d, day, abs_by_date.get(d))
+        is_sat = _is_saturday(d)
+        global_max = 2 if is_sat else 3
+
+        for slot_id, n in snap.slot_counts.items():
+            if n > 4:
+                flag(d, "parallel", f"slot {slot_id} has {n} bookings")
+        for school_id, n in snap.school_counts.items():
+            if n > 2:
+                flag(d, "school", f"school {school_id} has {n} bookings")
+
+        # AVRD and normal sessions share the subject count but each has its own
+        # rule max, so a day is only over quota if it beats the largest one used
+        subject_limit = {}
+        for b in day:
+            rp_id = b.get("rp_id")
+            if not rp_id:
                 continue
-            if is_avrd and _count_bookings({"date": booking_date, "rp_id": rp_id, "session_type_id": session_type_id}) >= 1:
+            if snap.rp_is_absent(rp_id, slot_id=b.get("slot_id"), session_type_id=b.get("session_type_id")):
+                flag(d, "absence", f"RP {rp_id} booked while absent ({b.get('id')})")
+            is_avrd = b.get("session_type_id") in avrd_types
+            limit = rule_max.get((rp_id, b.get("subject_id"), is_sat, is_avrd))
+            if limit is not None:
+                key = (rp_id, b.get("subject_id"))
+                subject_limit[key] = max(subject_limit.get(key, limit), limit)
+        for (rp_id, subject_id), limit in subject_limit.items():
+            if snap.rp_subject_counts[(rp_id, subject_id)] > limit:
+                flag(d, "subject_quota", f"RP {rp_id} over subject max for {subject_id}")
+
+        for rp_id, n in snap.rp_counts.items():
+            if rp_id and n > global_max:
+                flag(d, "global_quota", f"RP {rp_id} has {n} classes")
+        for (rp_id, st_id), n in snap.rp_session_type_counts.items():
+            if rp_id and st_id in avrd_types and n > 1:
+                flag(d, "avrd", f"RP {rp_id} has {n} AVRD sessions")
+        for (rp_id, slot_id), n in snap.rp_slot_counts.items():
+            if not rp_id:
                 continue
-
-            possible += 1
-
-        summary.append({
-            "slot_id": slot_id,
-            "start_time": s["start_time"],
-            "end_time": s["end_time"],
-            "remaining_parallel": remaining_parallel,
-            "possible_rps": possible
-        })
-
-    return summary
+            if n > 1:
+                flag(d, "same_slot", f"RP {rp_id} double-booked in slot {slot_id}")
+            if slot_id in slot_order:
+                i = slot_order.index(slot_id)
+                if i + 1 < len(slot_order) and snap.rp_slot_counts[(rp_id, slot_order[i + 1])] > 0:
+                    flag(d, "adjacency", f"RP {rp_id} in adjacent slots {slot_id}/{slot_order[i + 1]}")
+
+    return violations
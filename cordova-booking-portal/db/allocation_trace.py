@@ -0,0 +1,185 @@
+# db/allocation_trace.py
+"""
+Decision traces for assign_rp.
+
+With ALLOCATION_TRACE on, every assign_rp call builds an AllocationTrace: time
+(and, with QUERY_INSTRUMENTATION, queries) per phase, and for each candidate
+RP every per-RP rule that rejects it with its evaluation time. Finished traces
+go to a process-wide ring buffer for the admin panel and feed per-rule hit
+stats, from which rule_order() derives the order _rp_rejection uses:
+highest rejection rate per nanosecond first.
+"""
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from config.settings import ALLOCATION_TRACE_HISTORY, RULE_ORDER_MIN_SAMPLES
+from db.instrumentation import current_record_count
+
+_lock = threading.Lock()
+_traces = deque(maxlen=ALLOCATION_TRACE_HISTORY)
+_outcomes = Counter()            # blocked_by (or "assigned") -> calls
+_stats = {}                      # rule -> {"evaluated", "rejected", "total_ns"}
+_order_cache = {"order": None, "version": -1}
+_version = 0
+
+
+class AllocationTrace:
+    def __init__(self, subject_id, slot_id, booking_date, session_type_id, school_id):
+        self.request = {
+            "subject_id": subject_id,
+            "slot_id": slot_id,
+            "date": str(booking_date),
+            "session_type_id": session_type_id,
+            "school_id": school_id,
+        }
+        self.ts = datetime.now(timezone.utc).isoformat()
+        self.phases = []         # {"phase", "ms", "queries"}
+        self.candidates = []     # {"rp_id", "priority", "rejected_by", "failed", "check_ns"}
+        self.order = []
+        self.rp_id = None
+        self.blocked_by = None
+        self.total_ms = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        before = current_record_count()
+        try:
+            yield
+        finally:
+            after = current_record_count()
+            self.phases.append({
+                "phase": name,
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+                "queries": None if before is None or after is None else after - before,
+            })
+
+    def check_candidate(self, rule, checks):
+        """
+        Runs every (name, check) pair for one RP so rejection rates are not
+        skewed by the current order. Returns the first failing rule in order.
+        """
+        failed, check_ns = [], {}
+        for name, check in checks:
+            started = time.perf_counter_ns()
+            rejects = check()
+            check_ns[name] = time.perf_counter_ns() - started
+            if rejects:
+                failed.append(name)
+        self.order = [name for name, _ in checks]
+        self.candidates.append({
+            "rp_id": rule["rp_id"],
+            "priority": rule.get("priority"),
+            "rejected_by": failed[0] if failed else None,
+            "failed": failed,
+            "check_ns": check_ns,
+        })
+        return failed[0] if failed else None
+
+    def finish(self, rp_id, blocked_by):
+        self.rp_id = rp_id
+        self.blocked_by = blocked_by
+        self.total_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        _record(self)
+        return self
+
+    def as_dict(self):
+        return {
+            "ts": self.ts,
+            "request": self.request,
+            "rp_id": self.rp_id,
+            "blocked_by": self.blocked_by,
+            "total_ms": self.total_ms,
+            "phases": self.phases,
+            "candidates": self.candidates,
+            "order": self.order,
+        }
+
+
+def phase(trace, name):
+    """trace.phase(name), or a no-op when not tracing."""
+    return trace.phase(name) if trace is not None else nullcontext()
+
+
+def _record(trace):
+    global _version
+    with _lock:
+        _traces.append(trace.as_dict())
+        _outcomes[trace.blocked_by or "assigned"] += 1
+        for c in trace.candidates:
+            for name, ns in c["check_ns"].items():
+                s = _stats.setdefault(name, {"evaluated": 0, "rejected": 0, "total_ns": 0})
+                s["evaluated"] += 1
+                s["total_ns"] += ns
+                s["rejected"] += name in c["failed"]
+        _version += 1
+
+
+def rule_order(default):
+    """
+    Evaluation order for the per-RP rules: by rejection rate / mean cost once
+    every rule has RULE_ORDER_MIN_SAMPLES evaluations, else `default`.
+    """
+    default = tuple(default)
+    with _lock:
+        if _order_cache["version"] == _version and _order_cache["order"] is not None:
+            cached = _order_cache["order"]
+            if set(cached) == set(default):
+                return cached
+        stats = {name: _stats.get(name) for name in default}
+        if any(s is None or s["evaluated"] < RULE_ORDER_MIN_SAMPLES for s in stats.values()):
+            order = default
+        else:
+            def score(name):
+                s = stats[name]
+                mean_ns = max(s["total_ns"] / s["evaluated"], 1.0)
+                return (s["rejected"] / s["evaluated"]) / mean_ns
+            # Stable sort keeps the default order for ties
+            order = tuple(sorted(default, key=score, reverse=True))
+        _order_cache.update(order=order, version=_version)
+        return order
+
+
+def current_order():
+    """The order rule_order() last returned, or None before the first allocation."""
+    with _lock:
+        return _order_cache["order"]
+
+
+def rule_stats():
+    """Per-rule evaluation counts, rejection rate and mean cost."""
+    with _lock:
+        out = []
+        for name, s in _stats.items():
+            out.append({
+                "rule": name,
+                "evaluated": s["evaluated"],
+                "rejected": s["rejected"],
+                "rejection_rate": round(s["rejected"] / s["evaluated"], 3) if s["evaluated"] else 0.0,
+                "mean_ns": round(s["total_ns"] / s["evaluated"]) if s["evaluated"] else 0,
+            })
+        return out
+
+
+def outcome_counts():
+    with _lock:
+        return dict(_outcomes)
+
+
+def recent_traces():
+    """Newest first."""
+    with _lock:
+        return list(reversed(_traces))
+
+
+def reset():
+    global _version
+    with _lock:
+        _traces.clear()
+        _outcomes.clear()
+        _stats.clear()
+        _version += 1
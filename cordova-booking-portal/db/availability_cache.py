@@ -0,0 +1,121 @@
+# db/availability_cache.py
+"""
+Memoized availability for the booking form.
+
+Results of availability_calendar are stored per (subject_id, date,
+session_type_id) for AVAILABILITY_CACHE_TTL_SECONDS, so reruns that do not
+change the subject/date/type (typing a topic, switching sub-tabs) read memory
+instead of running the allocation queries again. The per-date summary and the
+two-week heatmap share the same entries.
+
+Writes that change a date's availability call invalidate() for that date:
+booking commits (db/allocation.py), attendance/status updates and absences
+(db/absences.py). A per-date generation counter keeps a computation that
+started before an invalidation from storing its stale result.
+
+Invalidation is per process: with several workers/replicas, another
+process's booking or absence shows up here only when the entry expires
+(AVAILABILITY_CACHE_TTL_SECONDS). That is acceptable because this cache only
+drives what the form displays; allocation itself reads fresh counters and
+absences (db/absences.py checks its cross-process change marker) and commits
+under booking_day_versions.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date as dt_date, timedelta
+
+from config.settings import AVAILABILITY_CACHE_TTL_SECONDS
+from db import allocation
+
+_lock = threading.Lock()
+_entries = {}                    # (subject_id, date, session_type_id) -> (loaded_at, day)
+_generation = defaultdict(int)   # date -> bumped on every invalidation of that date
+_clears = 0                      # bumped by invalidate() without a range
+_stats = Counter()
+
+
+def _as_date(d):
+    return d if isinstance(d, dt_date) else dt_date.fromisoformat(str(d)[:10])
+
+
+def _dates(start, end):
+    first, last = _as_date(start), _as_date(end)
+    return [str(first + timedelta(days=i)) for i in range((last - first).days + 1)]
+
+
+def calendar(subject_id, session_type_id, start, end):
+    """Same result as allocation.availability_calendar, served per date from the cache."""
+    dates = _dates(start, end)
+    now = time.monotonic()
+
+    with _lock:
+        days = {}
+        for d in dates:
+            entry = _entries.get((subject_id, d, session_type_id))
+            if entry and now - entry[0] < AVAILABILITY_CACHE_TTL_SECONDS:
+                days[d] = entry[1]
+        generations = {d: _generation[d] for d in dates}
+        clears = _clears
+        # Entries loaded before a slot change disagree on the slot list; reload them all
+        if len({tuple(s["slot_id"] for s in day["slots"]) for day in days.values()}) > 1:
+            days = {}
+        _stats["hits"] += len(days)
+        _stats["misses"] += len(dates) - len(days)
+
+    missing = [d for d in dates if d not in days]
+    if missing:
+        cal = allocation.availability_calendar(subject_id, session_type_id, missing[0], missing[-1])
+        loaded = {
+            d: {"slots": cal["slots"], "possible_rps": p, "remaining_parallel": r}
+            for d, p, r in zip(cal["dates"], cal["possible_rps"], cal["remaining_parallel"])
+        }
+        with _lock:
+            for d, day in loaded.items():
+                if _clears == clears and _generation[d] == generations.get(d, _generation[d]):
+                    _entries[(subject_id, d, session_type_id)] = (now, day)
+        days.update({d: loaded[d] for d in missing})
+
+    slots = days[dates[0]]["slots"] if dates else []
+    return {
+        "dates": dates,
+        "slots": slots,
+        "possible_rps": [days[d]["possible_rps"] for d in dates],
+        "remaining_parallel": [days[d]["remaining_parallel"] for d in dates],
+    }
+
+
+def slots_summary(subject_id, booking_date, session_type_id):
+    """Same rows as allocation.available_slots_summary for one date."""
+    cal = calendar(subject_id, session_type_id, booking_date, booking_date)
+    return [
+        {
+            "slot_id": s["slot_id"],
+            "start_time": s["start_time"],
+            "end_time": s["end_time"],
+            "remaining_parallel": int(cal["remaining_parallel"][0][j]),
+            "possible_rps": int(cal["possible_rps"][0][j]),
+        }
+        for j, s in enumerate(cal["slots"])
+    ]
+
+
+def invalidate(start=None, end=None):
+    """Drops every subject/type for dates in [start, end]; everything without a range."""
+    global _clears
+    with _lock:
+        if start is None:
+            _entries.clear()
+            _clears += 1
+            return
+        dates = set(_dates(start, end or start))
+        for d in dates:
+            _generation[d] += 1
+        for key in [k for k in _entries if k[1] in dates]:
+            del _entries[key]
+        _stats["invalidations"] += 1
+
+
+def cache_stats():
+    with _lock:
+        return {"entries": len(_entries), **_stats}
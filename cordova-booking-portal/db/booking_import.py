@@ -0,0 +1,256 @@
+# db/booking_import.py
+"""
+Bulk booking import from a CSV/XLSX upload.
+
+read_upload() parses the file in chunks of IMPORT_READ_CHUNK_ROWS rows (CSV
+through pandas, XLSX streamed row by row with openpyxl's read-only mode) and
+stops as soon as IMPORT_MAX_ROWS is exceeded.
+validate() checks every row with vectorized pandas operations and resolves
+names to ids in one pass: subjects, slots and session types come from the
+reference cache, and schools come from one exact-name query per 100 names.
+import_bookings() allocates the valid rows with assign_rp_bulk. It works
+through groups of whole days of about IMPORT_COMMIT_CHUNK_ROWS rows each.
+Every group is planned against one snapshot per day and written with a
+single commit_bookings() call. The result is a per-row report.
+
+Dates must be ISO YYYY-MM-DD (as in the template) or day-first DD/MM/YYYY;
+anything else is flagged rather than guessed, since a per-cell guess reads
+02/11 month-first but 13/11 day-first within the same upload.
+"""
+import re
+from datetime import date
+
+import pandas as pd
+
+from config.settings import IMPORT_COMMIT_CHUNK_ROWS, IMPORT_MAX_ROWS, IMPORT_READ_CHUNK_ROWS
+from db import reference, schools
+from db.allocation import BookingConflictError
+from db.bulk_allocation import assign_rp_bulk
+
+REQUIRED_COLUMNS = (
+    "school", "date", "slot", "subject", "session_type",
+    "class_name", "grade_of_school", "curriculum", "topic", "title_name",
+)
+OPTIONAL_COLUMNS = ("city", "notes")
+TEMPLATE_ROW = {
+    "school": "Greenwood High", "city": "Pune", "date": "2026-11-02", "slot": "09:00",
+    "subject": "Science", "session_type": "Classroom", "class_name": "5A",
+    "grade_of_school": "Primary", "curriculum": "CBSE", "topic": "Magnets",
+    "title_name": "Ms. Rao", "notes": "",
+}
+
+STATUS_BOOKED = "Booked"
+STATUS_REJECTED = "Rejected"
+STATUS_INVALID = "Invalid"
+STATUS_CONFLICT = "Not submitted"
+
+# Excel date cells arrive as "YYYY-MM-DD 00:00:00"
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(?:[ T]00:00:00)?$")
+
+
+class BookingImportError(ValueError):
+    """The upload as a whole cannot be read (format, columns, size)."""
+
+
+def template_csv():
+    return pd.DataFrame([TEMPLATE_ROW]).to_csv(index=False)
+
+
+def _normalize_header(col):
+    return "_".join(str(col).strip().lower().replace("-", " ").split())
+
+
+def _xlsx_chunks(file):
+    """The first sheet as DataFrames of IMPORT_READ_CHUNK_ROWS string rows."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ["" if h is None else str(h) for h in header]
+        chunk = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            values = ["" if v is None else str(v) for v in row[:len(columns)]]
+            chunk.append(values + [""] * (len(columns) - len(values)))
+            if len(chunk) == IMPORT_READ_CHUNK_ROWS:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        wb.close()
+
+
+def read_upload(file, filename):
+    """The upload as one DataFrame of stripped strings, parsed chunk by chunk."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        chunks = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=IMPORT_READ_CHUNK_ROWS)
+    elif name.endswith(".xlsx"):
+        chunks = _xlsx_chunks(file)
+    else:
+        raise BookingImportError("Upload a .csv or .xlsx file.")
+
+    frames, total = [], 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > IMPORT_MAX_ROWS:
+            raise BookingImportError(f"At most {IMPORT_MAX_ROWS} rows can be imported at once.")
+        chunk = chunk.rename(columns=_normalize_header)
+        frames.append(chunk.apply(lambda c: c.astype(str).str.strip()))
+    if not frames:
+        raise BookingImportError("The file has no rows.")
+
+    df = pd.concat(frames, ignore_index=True)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise BookingImportError(f"Missing columns: {', '.join(missing)}")
+    for c in OPTIONAL_COLUMNS:
+        if c not in df.columns:
+            df[c] = ""
+    # Row numbers as the user sees them in the spreadsheet (header is row 1)
+    df.insert(0, "row", df.index + 2)
+    return df
+
+
+def _lookups():
+    slot_ids = {}
+    for s in reference.get_rows("slots"):
+        for label in (f'{s["start_time"]} - {s["end_time"]}', s["start_time"], str(s["start_time"])[:5]):
+            slot_ids[str(label).lower()] = s["id"]
+    return {
+        "subject": {s["name"].lower(): s["id"] for s in reference.get_rows("subjects")},
+        "session_type": {t["name"].lower(): t["id"] for t in reference.get_rows("session_types")},
+        "slot": slot_ids,
+    }
+
+
+def _resolve_schools(df):
+    """school_id per row: exact name, disambiguated by city when the name repeats."""
+    rows = schools.find_schools(df["school"].unique())
+    by_name, by_name_city = {}, {}
+    for r in rows:
+        name = r["name"].lower()
+        by_name[name] = None if name in by_name else r["id"]   # None: ambiguous
+        by_name_city[(name, (r.get("city") or "").lower())] = r["id"]
+
+    names, cities = df["school"].str.lower(), df["city"].str.lower()
+    exact = pd.Series(list(zip(names, cities)), index=df.index).map(by_name_city)
+    return exact.fillna(names.map(by_name))
+
+
+def validate(df, today=None):
+    """
+    Adds subject_id / slot_id / session_type_id / school_id and an "error"
+    column ("" for valid rows) to the frame returned by read_upload.
+    """
+    today = today or date.today()
+    df = df.copy()
+    errors = pd.Series("", index=df.index)
+
+    def flag(mask, message):
+        nonlocal errors
+        errors = errors.mask(mask, errors + message + "; ")
+
+    for col in REQUIRED_COLUMNS:
+        flag(df[col] == "", f"{col} is required")
+
+    # One explicit format per notation, never a per-cell guess
+    iso = df["date"].where(df["date"].str.match(_ISO_DATE)).str[:10]
+    parsed = pd.to_datetime(iso, format="%Y-%m-%d", errors="coerce").fillna(
+        pd.to_datetime(df["date"], format="%d/%m/%Y", errors="coerce")
+    )
+    flag(parsed.isna() & (df["date"] != ""), "date must be YYYY-MM-DD or DD/MM/YYYY")
+    df["date"] = parsed.dt.date.astype(str).where(parsed.notna(), df["date"])
+    flag(parsed.notna() & (parsed.dt.date < today), "date is in the past")
+
+    for col, ids in _lookups().items():
+        df[f"{col}_id"] = df[col].str.lower().map(ids)
+        flag(df[f"{col}_id"].isna() & (df[col] != ""), f"unknown {col.replace('_', ' ')}")
+
+    df["school_id"] = _resolve_schools(df)
+    flag(df["school_id"].isna() & (df["school"] != ""), "unknown or ambiguous school (add it first or give its city)")
+
+    df["error"] = errors.str.rstrip("; ")
+    return df
+
+
+def _date_chunks(requests):
+    """Groups request indexes into runs of whole days of about IMPORT_COMMIT_CHUNK_ROWS."""
+    by_date = {}
+    for i, req in enumerate(requests):
+        by_date.setdefault(req["date"], []).append(i)
+    chunk = []
+    for d in sorted(by_date):
+        if chunk and len(chunk) + len(by_date[d]) > IMPORT_COMMIT_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+        chunk += by_date[d]
+    if chunk:
+        yield chunk
+
+
+def import_bookings(df, salesperson_id, tab_type, progress=None):
+    """
+    Books every valid row of a validated frame. Returns the per-row report:
+    row, school, date, slot, subject, status, reason, rp, booking_id.
+    progress(done, total) is called after each committed chunk.
+    """
+    valid = df[df["error"] == ""]
+    requests = [
+        {
+            "school_id": r.school_id,
+            "salesperson_id": salesperson_id,
+            "subject_id": r.subject_id,
+            "slot_id": r.slot_id,
+            "session_type_id": r.session_type_id,
+            "date": r.date,
+            "city": r.city,
+            "class_name": r.class_name,
+            "grade_of_school": r.grade_of_school,
+            "curriculum": r.curriculum,
+            "topic": r.topic,
+            "title_name": r.title_name,
+            "notes": r.notes,
+            "status": "Pending",
+            "tab_type": tab_type,
+        }
+        for r in valid.itertuples()
+    ]
+
+    report = df[["row", "school", "date", "slot", "subject"]].copy()
+    report["status"] = STATUS_INVALID
+    report["reason"] = df["error"]
+    report["rp_id"] = None
+    report["booking_id"] = None
+
+    done = 0
+    for chunk in _date_chunks(requests):
+        labels = valid.index[chunk]
+        try:
+            results = assign_rp_bulk([requests[i] for i in chunk])
+        except BookingConflictError as e:
+            report.loc[labels, "status"] = STATUS_CONFLICT
+            report.loc[labels, "reason"] = str(e)
+        else:
+            for label, res in zip(labels, results):
+                booking = res.get("booking")
+                if booking:
+                    report.loc[label, ["status", "reason", "rp_id", "booking_id"]] = [
+                        STATUS_BOOKED, "", booking["rp_id"], booking["id"],
+                    ]
+                else:
+                    report.loc[label, ["status", "reason"]] = [STATUS_REJECTED, res.get("reason") or ""]
+        done += len(chunk)
+        if progress:
+            progress(done, len(requests))
+
+    rp_names = reference.name_map("resource_persons")
+    rp = report.pop("rp_id").map(lambda i: rp_names.get(i) if i else None)
+    report.insert(report.columns.get_loc("booking_id"), "rp", rp)
+    return report
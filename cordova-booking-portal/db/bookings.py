@@ -0,0 +1,134 @@
+# db/bookings.py
+"""
+Bookings read API with display names resolved server-side.
+
+Rows are fetched with PostgREST resource embedding (subject, school, RP,
+slot, session type, salesperson joined via their FK columns) and flattened
+into the display columns the pages show ("Subject", "School", "RP", ...),
+so pages no longer download whole lookup tables to map ids to names.
+"""
+from db.connection import get_supabase
+
+# Named column sets so each page only transfers what it renders
+BOOKING_COLUMN_SETS = {
+    "summary": "id, date, status, subject_id, rp_id, slot_id, session_type_id, school_id",
+    "list": (
+        "id, date, status, topic, title_name, "
+        "session_type_id, subject_id, slot_id, school_id, rp_id"
+    ),
+    "rp_classes": (
+        "id, date, status, topic, title_name, notes, "
+        "school_id, subject_id, slot_id, session_type_id, city, "
+        "rp_attendance_status, rp_session_notes, rp_marked_at"
+    ),
+    "grid": "id, date, status, topic, salesperson_id, rp_id, subject_id, school_id, slot_id, session_type_id",
+    "all": "*",
+}
+
+# alias -> embed; "!<fk column>" pins the relationship PostgREST should follow
+BOOKING_EMBEDS = {
+    "subject": "subject:subjects!subject_id(name)",
+    "school": "school:schools!school_id(name,city)",
+    "rp": "rp:resource_persons!rp_id(display_name)",
+    "slot": "slot:slots!slot_id(start_time,end_time)",
+    "session_type": "session_type:session_types!session_type_id(name)",
+    "salesperson": "salesperson:users!salesperson_id(name,email)",
+}
+DEFAULT_EMBEDS = ("subject", "school", "rp", "slot", "session_type")
+
+
+def booking_select(columns="list", embeds=DEFAULT_EMBEDS):
+    """Select string for a column set (or an explicit column string) plus embeds."""
+    cols = BOOKING_COLUMN_SETS.get(columns, columns)
+    parts = [" ".join(cols.split())] + [BOOKING_EMBEDS[e] for e in embeds]
+    return ", ".join(parts)
+
+
+def _flatten(row):
+    """Replaces nested embed objects with flat display columns."""
+    subject = row.pop("subject", None) or {}
+    school = row.pop("school", None) or {}
+    rp = row.pop("rp", None) or {}
+    slot = row.pop("slot", None) or {}
+    session_type = row.pop("session_type", None) or {}
+
+    row["Subject"] = subject.get("name")
+    row["School"] = school.get("name")
+    row["School City"] = school.get("city")
+    row["RP"] = rp.get("display_name")
+    row["Slot"] = f'{slot["start_time"]} - {slot["end_time"]}' if slot else None
+    row["Session Type"] = session_type.get("name")
+    if "salesperson" in row:
+        salesperson = row.pop("salesperson") or {}
+        row["Salesperson"] = salesperson.get("name") or salesperson.get("email")
+    return row
+
+
+def flatten_bookings(rows):
+    return [_flatten(dict(r)) for r in (rows or [])]
+
+
+def bookings_query(columns="list", embeds=DEFAULT_EMBEDS, eq=None, in_=None,
+                   date_from=None, date_to=None, client=None, table="bookings"):
+    """
+    Unexecuted query so callers can add order/limit/range (or run it in
+    fetch_parallel). `table` may be a view over bookings with the same columns.
+    """
+    supabase = client or get_supabase()
+    q = supabase.table(table).select(booking_select(columns, embeds))
+    for k, v in (eq or {}).items():
+        q = q.eq(k, v)
+    for k, v in (in_ or {}).items():
+        q = q.in_(k, list(v))
+    if date_from:
+        q = q.gte("date", str(date_from))
+    if date_to:
+        q = q.lte("date", str(date_to))
+    return q
+
+
+def fetch_bookings(columns="list", embeds=DEFAULT_EMBEDS, eq=None, in_=None,
+                   date_from=None, date_to=None, order="date", desc=False,
+                   limit=None, client=None):
+    """Bookings matching the filters, each row already carrying display names."""
+    q = bookings_query(columns, embeds, eq, in_, date_from, date_to, client)
+    if order:
+        q = q.order(order, desc=desc)
+    if limit:
+        q = q.limit(limit)
+    return flatten_bookings(q.execute().data)
+
+
+def fetch_booking(booking_id, columns="all", embeds=DEFAULT_EMBEDS + ("salesperson",), client=None):
+    """One booking with every column, for lazily loaded detail views."""
+    rows = bookings_query(columns, embeds, eq={"id": booking_id}, client=client).limit(1).execute().data
+    return (flatten_bookings(rows) or [None])[0]
+
+
+def fetch_bookings_page(filters=None, after=None, page_size=50, desc=True,
+                        columns="grid", embeds=DEFAULT_EMBEDS + ("salesperson",), client=None,
+                        table="bookings"):
+    """
+    Keyset-paginated bookings ordered by (date, id).
+
+    filters: date_from, date_to and any equality column (status, salesperson_id,
+    rp_id, subject_id, school_id); None / "All" values are ignored.
+    after: the (date, id) cursor returned for the previous page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v not in (None, "", "All")}
+    date_from = filters.pop("date_from", None)
+    date_to = filters.pop("date_to", None)
+
+    q = bookings_query(columns, embeds, eq=filters, date_from=date_from, date_to=date_to, client=client, table=table)
+    if after:
+        last_date, last_id = after
+        op = "lt" if desc else "gt"
+        q = q.or_(f"date.{op}.{last_date},and(date.eq.{last_date},id.{op}.{last_id})")
+
+    # One extra row tells us whether another page exists without a count query
+    rows = q.order("date", desc=desc).order("id", desc=desc).limit(page_size + 1).execute().data or []
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = (rows[-1]["date"], rows[-1]["id"]) if has_more and rows else None
+    return flatten_bookings(rows), next_cursor
@@ -0,0 +1,321 @@
+# db/bulk_allocation.py
+"""
+Batch allocation for a set of booking requests (e.g. a school's whole week).
+
+Instead of allocating requests one by one (where an early booking can take
+the only RP a later one could use), each day's requests are matched to RPs
+with a min-cost max-flow:
+
+    source -> request -> (RP, subject, kind) -> [(RP, AVRD type)] -> RP -> sink
+
+Capacities carry the remaining subject quota, the AVRD 1/day limit and the
+global 3 (weekday) / 2 (Saturday) cap; edge costs are the rule priority so
+preferred RPs win ties. Constraints that are not nested in that chain
+(same-slot, adjacency break rule, subject quota shared by AVRD and normal
+sessions) are enforced by re-checking the matching with the exact
+single-booking rules and dropping offending edges until it is clean.
+The per-slot and per-school caps do not depend on the RP; they are applied
+to the matched requests only, and requests over a cap are refused and the
+day re-matched without them, so unmatched requests never hold capacity.
+"""
+import uuid
+from collections import Counter, defaultdict
+
+from db.allocation import (
+    MAX_COMMIT_ATTEMPTS,
+    BookingConflictError,
+    _adjacent_slot_ids,
+    _commit_rows,
+    _fetch_day_versions,
+    _fetch_slots_ordered,
+    _is_avrd,
+    _is_saturday,
+    _load_snapshots,
+    _rp_rejection,
+)
+from db.connection import get_supabase
+
+REASON_UNKNOWN_TYPE = "Unknown session type."
+REASON_SLOT_FULL = "Slot already has 4 parallel bookings."
+REASON_SCHOOL_FULL = "School already has 2 bookings on this date."
+REASON_NO_RULES = "No RP rules configured for this subject/session type."
+REASON_NO_RP = "No Resource Person available for this slot/subject."
+
+
+def _min_cost_max_flow(n, edges, source, sink):
+    """
+    Successive shortest paths (Bellman-Ford); graphs here are a few hundred
+    nodes at most. `edges` is a list of (u, v, capacity, cost).
+    Returns the flow on each input edge, in the same order.
+    """
+    graph = [[] for _ in range(n)]
+    handles = []
+    for u, v, cap, cost in edges:
+        graph[u].append([v, cap, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+        handles.append((u, len(graph[u]) - 1, cap))
+
+    while True:
+        dist = [float("inf")] * n
+        prev = [None] * n
+        dist[source] = 0
+        updated = True
+        while updated:
+            updated = False
+            for u in range(n):
+                if dist[u] == float("inf"):
+                    continue
+                for i, (v, cap, cost, _) in enumerate(graph[u]):
+                    if cap > 0 and dist[u] + cost < dist[v]:
+                        dist[v] = dist[u] + cost
+                        prev[v] = (u, i)
+                        updated = True
+        if dist[sink] == float("inf"):
+            break
+
+        push = float("inf")
+        v = sink
+        while v != source:
+            u, i = prev[v]
+            push = min(push, graph[u][i][1])
+            v = u
+        v = sink
+        while v != source:
+            u, i = prev[v]
+            graph[u][i][1] -= push
+            rev = graph[u][i][3]
+            graph[v][rev][1] += push
+            v = u
+
+    return [cap - graph[u][i][1] for u, i, cap in handles]
+
+
+def _match_day(items, snap, global_max, banned):
+    """
+    items: [(request_index, request, is_avrd, candidate_rules)] for one date.
+    banned: set of (request_index, rp_id) edges excluded by earlier passes.
+    Returns {request_index: rp_id}.
+    """
+    nodes = {}
+
+    def node(key):
+        if key not in nodes:
+            nodes[key] = len(nodes)
+        return nodes[key]
+
+    source, sink = node("source"), node("sink")
+    edges, edge_meta = [], []
+    subject_caps, avrd_types, rp_ids = {}, set(), set()
+
+    for idx, req, is_avrd, rules in items:
+        edges.append((source, node(("req", idx)), 1, 0))
+        edge_meta.append(None)
+        for rank, rule in enumerate(rules):
+            rp_id = rule["rp_id"]
+            if (idx, rp_id) in banned:
+                continue
+            kind = ("avrd", req["session_type_id"]) if is_avrd else ("normal", None)
+            group = ("subject", rp_id, req["subject_id"], kind)
+            cap = int(rule.get("max_classes_per_day") or 0) - snap.rp_subject_counts[(rp_id, req["subject_id"])]
+            subject_caps[group] = min(subject_caps.get(group, cap), cap)
+            if is_avrd:
+                avrd_types.add((rp_id, req["session_type_id"]))
+            rp_ids.add(rp_id)
+            edges.append((node(("req", idx)), node(group), 1, rank))
+            edge_meta.append((idx, rp_id))
+
+    for key, cap in subject_caps.items():
+        _, rp_id, _, kind = key
+        target = node(("avrd", rp_id, kind[1])) if kind[0] == "avrd" else node(("rp", rp_id))
+        edges.append((node(key), target, max(0, cap), 0))
+        edge_meta.append(None)
+    for rp_id, st_id in avrd_types:
+        cap = 1 - snap.rp_session_type_counts[(rp_id, st_id)]
+        edges.append((node(("avrd", rp_id, st_id)), node(("rp", rp_id)), max(0, cap), 0))
+        edge_meta.append(None)
+    for rp_id in rp_ids:
+        cap = global_max - snap.rp_counts[rp_id]
+        edges.append((node(("rp", rp_id)), sink, max(0, cap), 0))
+        edge_meta.append(None)
+
+    flows = _min_cost_max_flow(len(nodes), edges, source, sink)
+    return {
+        meta[0]: meta[1]
+        for meta, f in zip(edge_meta, flows)
+        if meta is not None and f > 0
+    }
+
+
+def plan_rp_bulk(requests, snapshots=None):
+    """
+    Assigns RPs to many booking requests at once without writing anything.
+
+    Each request is a booking dict with at least date, slot_id, subject_id,
+    session_type_id and school_id. Returns one {"index", "rp_id", "reason"}
+    per request, in input order; rp_id is None when the request is rejected.
+    """
+    results = [{"index": i, "rp_id": None, "reason": None} for i in range(len(requests))]
+    if not requests:
+        return results
+
+    supabase = get_supabase()
+    dates = sorted({str(r["date"]) for r in requests})
+    subject_ids = sorted({r["subject_id"] for r in requests})
+
+    session_types = supabase.table("session_types").select("id, name").execute().data or []
+    avrd_by_type = {t["id"]: _is_avrd(t) for t in session_types}
+    rules = (
+        supabase.table("rp_subject_rules")
+        .select("rp_id, subject_id, priority, max_classes_per_day, is_saturday, is_avrd")
+        .in_("subject_id", subject_ids)
+        .order("priority")
+        .execute()
+    ).data or []
+    rules_by_key = defaultdict(list)
+    for r in rules:
+        rules_by_key[(r["subject_id"], bool(r.get("is_saturday")), bool(r.get("is_avrd")))].append(r)
+
+    slots = _fetch_slots_ordered()
+    if snapshots is None:
+        snapshots = _load_snapshots(dates[0], dates[-1])
+
+    by_date = defaultdict(list)
+    for i, req in enumerate(requests):
+        d = str(req["date"])
+        snap = snapshots[d]
+        if req["session_type_id"] not in avrd_by_type:
+            results[i]["reason"] = REASON_UNKNOWN_TYPE
+            continue
+        is_avrd = avrd_by_type[req["session_type_id"]]
+        is_sat = _is_saturday(d)
+        global_max = 2 if is_sat else 3
+
+        # Already full before this batch; caps within the batch are applied after matching
+        if snap.slot_counts[req["slot_id"]] >= 4:
+            results[i]["reason"] = REASON_SLOT_FULL
+            continue
+        if snap.school_counts[req["school_id"]] >= 2:
+            results[i]["reason"] = REASON_SCHOOL_FULL
+            continue
+
+        candidates = rules_by_key.get((req["subject_id"], is_sat, is_avrd), [])
+        if not candidates:
+            results[i]["reason"] = REASON_NO_RULES
+            continue
+
+        adjacent_ids = _adjacent_slot_ids(slots, req["slot_id"])
+        candidates = [
+            r for r in candidates
+            if _rp_rejection(
+                snap, r, req["subject_id"], req["slot_id"], req["session_type_id"],
+                is_avrd, global_max, adjacent_ids,
+            ) is None
+        ]
+        if not candidates:
+            results[i]["reason"] = REASON_NO_RP
+            continue
+
+        by_date[d].append((i, req, is_avrd, candidates))
+
+    for d, items in by_date.items():
+        base = snapshots[d]
+        global_max = 2 if _is_saturday(d) else 3
+        refused = {}
+
+        while True:
+            live = [item for item in items if item[0] not in refused]
+            matched = _match_verified(live, base, global_max, slots)
+            over = _over_caps(live, matched, base)
+            if not over:
+                break
+            # Re-match without them: the RPs they held may suit another request
+            refused.update(over)
+
+        for idx, _, _, _ in items:
+            rp_id = matched.get(idx)
+            results[idx]["rp_id"] = rp_id
+            if rp_id is None:
+                results[idx]["reason"] = refused.get(idx, REASON_NO_RP)
+
+    return results
+
+
+def _match_verified(items, base, global_max, slots):
+    """_match_day, re-checked with the exact single-booking rules until clean."""
+    banned = set()
+    while True:
+        matched = _match_day(items, base, global_max, banned)
+
+        # Verify with the exact single-booking rules, in input order
+        check = base.copy()
+        clean = True
+        for idx, req, is_avrd, rules_for_req in items:
+            rp_id = matched.get(idx)
+            if rp_id is None:
+                continue
+            rule = next(r for r in rules_for_req if r["rp_id"] == rp_id)
+            adjacent_ids = _adjacent_slot_ids(slots, req["slot_id"])
+            if _rp_rejection(
+                check, rule, req["subject_id"], req["slot_id"], req["session_type_id"],
+                is_avrd, global_max, adjacent_ids,
+            ) is not None:
+                banned.add((idx, rp_id))
+                clean = False
+                continue
+            check.add({**req, "rp_id": rp_id})
+        if clean:
+            return matched
+
+
+def _over_caps(items, matched, base):
+    """{request_index: reason} for matched requests past the slot/school caps, in input order."""
+    taken_slot, taken_school = Counter(), Counter()
+    over = {}
+    for idx, req, _, _ in items:
+        if idx not in matched:
+            continue
+        if base.slot_counts[req["slot_id"]] + taken_slot[req["slot_id"]] >= 4:
+            over[idx] = REASON_SLOT_FULL
+            continue
+        if base.school_counts[req["school_id"]] + taken_school[req["school_id"]] >= 2:
+            over[idx] = REASON_SCHOOL_FULL
+            continue
+        taken_slot[req["slot_id"]] += 1
+        taken_school[req["school_id"]] += 1
+    return over
+
+
+def assign_rp_bulk(requests, max_attempts: int = MAX_COMMIT_ATTEMPTS):
+    """
+    Plans all requests together and inserts every accepted booking in one
+    commit_bookings() call. Re-plans if another submission touched one of
+    the dates first. Returns plan_rp_bulk results with the inserted row
+    under "booking" (None for rejected requests).
+    """
+    if not requests:
+        return []
+    dates = sorted({str(r["date"]) for r in requests})
+
+    for _ in range(max_attempts):
+        versions = _fetch_day_versions(dates)
+        results = plan_rp_bulk(requests)
+        accepted = [r for r in results if r["rp_id"]]
+        if not accepted:
+            return [{**r, "booking": None} for r in results]
+
+        # Client-generated ids tie each inserted row back to its request
+        # (db/sql/008_commit_bookings_client_ids.sql); RETURNING order is not guaranteed
+        ids = {r["index"]: str(uuid.uuid4()) for r in accepted}
+        rows = [
+            {**requests[r["index"]], "id": ids[r["index"]], "date": str(requests[r["index"]]["date"]), "rp_id": r["rp_id"]}
+            for r in accepted
+        ]
+        inserted = _commit_rows({d: versions[d] for d in {row["date"] for row in rows}}, rows)
+        if inserted:
+            by_id = {row["id"]: row for row in inserted}
+            return [{**r, "booking": by_id.get(ids.get(r["index"]))} for r in results]
+
+    raise BookingConflictError(
+        f"Bulk booking kept conflicting with other submissions ({max_attempts} attempts). "
+        "Please submit again."
+    )
@@ -1,18 +1,39 @@
 import streamlit as st
 from supabase import create_client, Client
+from config.settings import DB_BACKEND, LOCAL_DB_SEED_PATH
+from db.instrumentation import instrument
+
+# PostgREST / Postgres error codes for objects a migration has not created yet
+UNDEFINED_TABLE_CODES = ("PGRST205", "42P01")
+UNDEFINED_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def is_undefined(error, codes):
+    """True if `error` says the table/function does not exist (and not e.g. a timeout)."""
+    return getattr(error, "code", None) in codes
+
+
+def _local_client():
+    from db.local_backend import LocalClient, get_local_store
+    return LocalClient(get_local_store(LOCAL_DB_SEED_PATH))
 
 @st.cache_resource
 def get_supabase() -> Client:
+    if DB_BACKEND == "local":
+        return instrument(_local_client())
     url = st.secrets["SUPABASE_URL"]
     key = st.secrets["SUPABASE_ANON_KEY"]
-    return create_client(url, key)
+    return instrument(create_client(url, key))
 
 @st.cache_resource
 def get_supabase_admin() -> Client:
     """
     Uses Service Role Key to bypass RLS for admin-only operations.
     Add SUPABASE_SERVICE_ROLE_KEY in Streamlit secrets.
+    The local backend has no RLS, so both clients share one store.
     """
+    if DB_BACKEND == "local":
+        return instrument(_local_client())
     url = st.secrets["SUPABASE_URL"]
     key = st.secrets["SUPABASE_SERVICE_ROLE_KEY"]
-    return create_client(url, key)
+    return instrument(create_client(url, key))
@@ -0,0 +1,176 @@
+# db/export.py
+"""
+Streaming exports of bookings and feedback for admins.
+
+iter_booking_pages() / iter_feedback_pages() walk the table with keyset
+pagination (EXPORT_PAGE_SIZE rows per request) and yield one DataFrame per
+page. write_export() streams those pages into a temporary CSV, Parquet or
+XLSX file, one page at a time, so an export of any size holds a single page
+of rows in memory. The caller hands the file to st.download_button and
+deletes it afterwards; write_export() also sweeps export files older than
+EXPORT_MAX_AGE_SECONDS that abandoned sessions left behind.
+"""
+import csv
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from config.settings import EXPORT_MAX_AGE_SECONDS, EXPORT_PAGE_SIZE
+from db.bookings import DEFAULT_EMBEDS, fetch_bookings_page
+from db.connection import get_supabase
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is offered only when pyarrow is installed
+    pa = None
+    pq = None
+
+FEEDBACK_SELECT = (
+    "*, booking:bookings!booking_id(date,status,topic), "
+    "salesperson:users!salesperson_id(name,email)"
+)
+EXPORT_PREFIX = "cordova-export-"
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_formats():
+    return [f for f in MIME_TYPES if f != "parquet" or pq is not None]
+
+
+def iter_booking_pages(filters=None, page_size=EXPORT_PAGE_SIZE, client=None):
+    """Bookings matching fetch_bookings_page filters, oldest first, one DataFrame per page."""
+    cursor = None
+    while True:
+        rows, cursor = fetch_bookings_page(
+            filters, after=cursor, page_size=page_size, desc=False,
+            columns="all", embeds=DEFAULT_EMBEDS + ("salesperson",), client=client,
+        )
+        if rows:
+            yield pd.DataFrame(rows)
+        if cursor is None:
+            return
+
+
+def _flatten_feedback(row):
+    booking = row.pop("booking", None) or {}
+    salesperson = row.pop("salesperson", None) or {}
+    row["Booking Date"] = booking.get("date")
+    row["Booking Status"] = booking.get("status")
+    row["Topic"] = booking.get("topic")
+    row["Salesperson"] = salesperson.get("name") or salesperson.get("email")
+    return row
+
+
+def iter_feedback_pages(date_from=None, date_to=None, page_size=EXPORT_PAGE_SIZE, client=None):
+    """Feedback submitted in [date_from, date_to], oldest first, keyset-paginated on (created_at, id)."""
+    supabase = client or get_supabase()
+    after = None
+    while True:
+        q = supabase.table("feedback").select(FEEDBACK_SELECT)
+        if date_from:
+            q = q.gte("created_at", str(date_from))
+        if date_to:
+            q = q.lt("created_at", str(pd.Timestamp(date_to) + pd.Timedelta(days=1))[:10])
+        if after:
+            last_ts, last_id = after
+            q = q.or_(f'created_at.gt."{last_ts}",and(created_at.eq."{last_ts}",id.gt.{last_id})')
+        rows = q.order("created_at").order("id").limit(page_size + 1).execute().data or []
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if rows:
+            yield pd.DataFrame([_flatten_feedback(dict(r)) for r in rows])
+        if not has_more:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def _write_csv(pages, path):
+    columns, n = None, 0
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        for df in pages:
+            if columns is None:
+                columns = list(df.columns)
+                csv.writer(fh).writerow(columns)
+            df.reindex(columns=columns).to_csv(fh, header=False, index=False)
+            n += len(df)
+    return n
+
+
+def _write_parquet(pages, path):
+    writer, schema, columns, n = None, None, None, 0
+    try:
+        for df in pages:
+            if writer is None:
+                columns = list(df.columns)
+                # Columns that are all null on the first page would be typed null; store them as text
+                schema = pa.schema([
+                    pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                    for f in pa.Schema.from_pandas(df, preserve_index=False)
+                ])
+                writer = pq.ParquetWriter(path, schema)
+            table = pa.Table.from_pandas(df.reindex(columns=columns), schema=schema, preserve_index=False, safe=False)
+            writer.write_table(table)
+            n += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
+def _write_xlsx(pages, path):
+    from openpyxl import Workbook
+
+    # write_only streams rows to disk instead of building the sheet in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("export")
+    columns, n = None, 0
+    for df in pages:
+        if columns is None:
+            columns = list(df.columns)
+            ws.append(columns)
+        page = df.reindex(columns=columns).astype(object)
+        for row in page.where(page.notna(), None).itertuples(index=False):
+            ws.append([v if v is None or isinstance(v, (int, float, bool)) else str(v) for v in row])
+        n += len(df)
+    wb.save(path)
+    return n
+
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}
+
+
+def sweep_exports(max_age=EXPORT_MAX_AGE_SECONDS):
+    """Deletes export files older than max_age seconds; returns how many."""
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(tempfile.gettempdir()):
+        if not entry.name.startswith(EXPORT_PREFIX):
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:  # removed by another session meanwhile
+            pass
+    return removed
+
+
+def write_export(pages, fmt):
+    """Streams DataFrame pages into a temp file -> (path, row count). Caller deletes the file."""
+    if fmt not in export_formats():
+        raise ValueError(f"Unsupported export format: {fmt}")
+    sweep_exports()
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        return path, WRITERS[fmt](pages, path)
+    except Exception:
+        os.remove(path)
+        raise
@@ -0,0 +1,45 @@
+# db/feedback.py
+"""
+Salesperson feedback on completed sessions.
+
+Bookings still awaiting feedback are read from the pending_feedback_bookings
+view (db/sql/006_pending_feedback.sql: bookings left join feedback where the
+feedback is missing), keyset-paginated and with display names embedded, so
+the Feedback tab only transfers the pending rows it shows.
+"""
+from db import feedback_analytics
+from db.bookings import DEFAULT_EMBEDS, fetch_bookings_page
+from db.connection import get_supabase
+
+PENDING_FEEDBACK_VIEW = "pending_feedback_bookings"
+
+
+def fetch_pending_feedback(salesperson_id, after=None, page_size=50, client=None):
+    """One page of the salesperson's completed bookings without feedback -> (rows, next_cursor)."""
+    return fetch_bookings_page(
+        {"salesperson_id": salesperson_id},
+        after=after,
+        page_size=page_size,
+        columns="list",
+        embeds=DEFAULT_EMBEDS,
+        client=client,
+        table=PENDING_FEEDBACK_VIEW,
+    )
+
+
+def count_pending_feedback(salesperson_id, client=None) -> int:
+    supabase = client or get_supabase()
+    res = (
+        supabase.table(PENDING_FEEDBACK_VIEW)
+        .select("id", count="exact", head=True)
+        .eq("salesperson_id", salesperson_id)
+        .execute()
+    )
+    return int(res.count or 0)
+
+
+def submit_feedback(row, client=None):
+    supabase = client or get_supabase()
+    res = supabase.table("feedback").insert(row).execute()
+    feedback_analytics.mark_stale()
+    return (res.data or [None])[0]
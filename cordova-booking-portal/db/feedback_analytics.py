@@ -0,0 +1,273 @@
+# db/feedback_analytics.py
+"""
+Feedback analytics for the admin Feedback & Reports tab.
+
+Feedback is held per submission month as a columnar DataFrame: ids, ratings,
+a conducted flag, and the booking's RP/subject/school. It is loaded once with
+keyset paging. After that, a month that can still receive feedback (the
+current one) is refreshed incrementally every FEEDBACK_REPORT_REFRESH_SECONDS
+by fetching only rows created since its watermark (less a few minutes, so a
+transaction that committed late is not skipped; rows already held are
+dropped by id). Closed months are
+reloaded after FEEDBACK_REPORT_TTL_SECONDS. report() groups the selected
+months by RP, subject, school, salesperson or month with one pandas groupby
+and memoizes the result until one of those months changes. Reruns of the
+tab therefore neither scan the table nor aggregate again.
+"""
+import itertools
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from config.settings import EXPORT_PAGE_SIZE, FEEDBACK_REPORT_REFRESH_SECONDS, FEEDBACK_REPORT_TTL_SECONDS
+from db import reference
+from db.connection import get_supabase
+
+ANALYTICS_SELECT = (
+    "id, created_at, salesperson_id, was_conducted, teacher_response_rating, engagement_rating, "
+    "booking:bookings!booking_id(rp_id,subject_id,school_id)"
+)
+FRAME_COLUMNS = [
+    "id", "created_at", "month", "salesperson_id", "rp_id", "subject_id", "school_id",
+    "conducted", "teacher_response_rating", "engagement_rating",
+]
+# dimension -> (frame column, table its labels come from or None)
+DIMENSIONS = {
+    "RP": ("rp_id", "resource_persons"),
+    "Subject": ("subject_id", "subjects"),
+    "School": ("school_id", "schools"),
+    "Salesperson": ("salesperson_id", "users"),
+    "Month": ("month", None),
+}
+# Tables too large for the reference cache: labels are fetched for the grouped ids only
+LABELS_BY_ID = {
+    "schools": ("id, name, city", lambda r: f'{r["name"]} ({r["city"]})' if r.get("city") else r["name"]),
+    "users": ("id, name, email", lambda r: r.get("name") or r.get("email")),
+}
+_CONDUCTED_TRUE = {"true", "yes", "y", "1"}
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_periods = {}       # "YYYY-MM" -> {"frame", "ids", "watermark", "loaded_at", "refreshed_at", "version"}
+_reports = {}       # (months, dimension, versions) -> DataFrame
+_versions = itertools.count()
+_stats = {"full_loads": 0, "incremental": 0, "rows_fetched": 0, "report_hits": 0, "report_misses": 0}
+
+
+def recent_months(n, today=None):
+    """The last n "YYYY-MM" periods, newest first."""
+    today = today or date.today()
+    y, m = today.year, today.month
+    out = []
+    for _ in range(n):
+        out.append(f"{y:04d}-{m:02d}")
+        y, m = (y, m - 1) if m > 1 else (y - 1, 12)
+    return out
+
+
+def _bounds(month):
+    y, m = int(month[:4]), int(month[5:7])
+    nxt = f"{y + (m == 12):04d}-{m % 12 + 1:02d}-01"
+    return f"{month}-01", nxt
+
+
+def _is_open(month):
+    return month >= datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def _fetch(month, since=None, client=None):
+    """Feedback rows of `month` (created at or after `since`), all pages in (created_at, id) order."""
+    supabase = client or get_supabase()
+    start, end = _bounds(month)
+    if since:
+        start = max(start, since)
+    rows, after = [], None
+    while True:
+        q = supabase.table("feedback").select(ANALYTICS_SELECT).gte("created_at", start).lt("created_at", end)
+        if after:
+            last_ts, last_id = after
+            q = q.or_(f'created_at.gt."{last_ts}",and(created_at.eq."{last_ts}",id.gt.{last_id})')
+        page = q.order("created_at").order("id").limit(EXPORT_PAGE_SIZE).execute().data or []
+        rows += page
+        if len(page) < EXPORT_PAGE_SIZE:
+            return rows
+        after = (page[-1]["created_at"], page[-1]["id"])
+
+
+def _conducted(value):
+    # Stored as a boolean, or as the "Yes"/"No" the salesperson form submits
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _CONDUCTED_TRUE
+
+
+def _to_frame(rows):
+    """Columnar frame (one array per column) for a list of feedback rows."""
+    bookings = [r.get("booking") or {} for r in rows]
+    conducted = [_conducted(r.get("was_conducted")) for r in rows]
+    return pd.DataFrame({
+        "id": [r["id"] for r in rows],
+        "created_at": [r["created_at"] for r in rows],
+        "month": [str(r["created_at"])[:7] for r in rows],
+        "salesperson_id": [r.get("salesperson_id") for r in rows],
+        "rp_id": [b.get("rp_id") for b in bookings],
+        "subject_id": [b.get("subject_id") for b in bookings],
+        "school_id": [b.get("school_id") for b in bookings],
+        "conducted": np.array(conducted, dtype=bool),
+        "teacher_response_rating": pd.to_numeric([r.get("teacher_response_rating") for r in rows], errors="coerce"),
+        "engagement_rating": pd.to_numeric([r.get("engagement_rating") for r in rows], errors="coerce"),
+    }, columns=FRAME_COLUMNS)
+
+
+def _watermark(frame, previous=None):
+    """Latest created_at in the frame, as the ISO string the database returned."""
+    if frame.empty:
+        return previous
+    return max(frame["created_at"].max(), previous or "")
+
+
+def _since(watermark):
+    if not watermark:
+        return None
+    return (datetime.fromisoformat(watermark) - REFRESH_OVERLAP).isoformat()
+
+
+def _period(month, client=None):
+    now = time.monotonic()
+    with _lock:
+        entry = _periods.get(month)
+    if entry and now - entry["loaded_at"] < FEEDBACK_REPORT_TTL_SECONDS:
+        if not _is_open(month) or now - entry["refreshed_at"] < FEEDBACK_REPORT_REFRESH_SECONDS:
+            return entry
+        fetched = _fetch(month, since=_since(entry["watermark"]), client=client)
+        with _lock:
+            _stats["incremental"] += 1
+            _stats["rows_fetched"] += len(fetched)
+            new_rows = [r for r in fetched if r["id"] not in entry["ids"]]
+            if new_rows:
+                new = _to_frame(new_rows)
+                entry["frame"] = pd.concat([entry["frame"], new], ignore_index=True)
+                entry["ids"].update(new["id"])
+                entry["watermark"] = _watermark(new, entry["watermark"])
+                entry["version"] = next(_versions)
+            entry["refreshed_at"] = now
+        return entry
+
+    rows = _fetch(month, client=client)
+    frame = _to_frame(rows)
+    entry = {
+        "frame": frame,
+        "ids": set(frame["id"]),
+        "watermark": _watermark(frame),
+        "loaded_at": now,
+        "refreshed_at": now,
+        "version": next(_versions),
+    }
+    with _lock:
+        _periods[month] = entry
+        _stats["full_loads"] += 1
+        _stats["rows_fetched"] += len(rows)
+    return entry
+
+
+def _labels(table, ids, client=None, chunk_size=100):
+    """id -> label for the given ids of a LABELS_BY_ID table, one query per chunk_size ids."""
+    columns, label = LABELS_BY_ID[table]
+    supabase = client or get_supabase()
+    ids = sorted({i for i in ids if i and i != "—"})
+    out = {}
+    for i in range(0, len(ids), chunk_size):
+        rows = supabase.table(table).select(columns).in_("id", ids[i:i + chunk_size]).execute().data or []
+        out.update({r["id"]: label(r) for r in rows})
+    return out
+
+
+def report(months, dimension, client=None):
+    """
+    Feedback count, average ratings and conducted rate per `dimension` value
+    over the given "YYYY-MM" months, best average teacher response first.
+    """
+    months = tuple(sorted(months))
+    entries = [_period(m, client=client) for m in months]
+    key = (months, dimension, tuple(e["version"] for e in entries))
+    with _lock:
+        cached = _reports.get(key)
+        _stats["report_hits" if cached is not None else "report_misses"] += 1
+    if cached is not None:
+        return cached
+
+    column, table = DIMENSIONS[dimension]
+    frames = [e["frame"] for e in entries if not e["frame"].empty]
+    if not frames:
+        out = pd.DataFrame(columns=[dimension, "Feedback", "Avg Teacher Response", "Avg Engagement", "Conducted %"])
+    else:
+        df = pd.concat(frames, ignore_index=True)
+        grouped = df.groupby(df[column].fillna("—"), sort=False).agg(
+            Feedback=("id", "size"),
+            teacher=("teacher_response_rating", "mean"),
+            engagement=("engagement_rating", "mean"),
+            conducted=("conducted", "mean"),
+        )
+        if table in LABELS_BY_ID:
+            labels = _labels(table, grouped.index, client=client)
+        elif table:
+            labels = reference.name_map(table)
+        else:
+            labels = {}
+        out = pd.DataFrame({
+            dimension: [labels.get(i, i) for i in grouped.index],
+            "Feedback": grouped["Feedback"].to_numpy(),
+            "Avg Teacher Response": grouped["teacher"].round(2).to_numpy(),
+            "Avg Engagement": grouped["engagement"].round(2).to_numpy(),
+            "Conducted %": (grouped["conducted"] * 100).round(1).to_numpy(),
+        })
+        sort_by = [dimension] if dimension == "Month" else ["Avg Teacher Response", "Feedback"]
+        out = out.sort_values(sort_by, ascending=dimension == "Month", ignore_index=True)
+
+    with _lock:
+        # Older versions of these months can never be asked for again
+        for k in [k for k in _reports if k[0] == months and k[1] == dimension]:
+            del _reports[k]
+        _reports[key] = out
+    return out
+
+
+def totals(months, client=None):
+    """Overall count, average ratings and conducted rate for the months."""
+    frames = [e["frame"] for e in (_period(m, client=client) for m in sorted(months)) if not e["frame"].empty]
+    if not frames:
+        return {"feedback": 0, "teacher": None, "engagement": None, "conducted_pct": None}
+    df = pd.concat(frames, ignore_index=True)
+    return {
+        "feedback": len(df),
+        "teacher": round(float(df["teacher_response_rating"].mean()), 2),
+        "engagement": round(float(df["engagement_rating"].mean()), 2),
+        "conducted_pct": round(float(df["conducted"].mean()) * 100, 1),
+    }
+
+
+def mark_stale(month=None):
+    """New feedback for `month` (default: the current one): refresh it on the next read."""
+    month = month or datetime.now(timezone.utc).strftime("%Y-%m")
+    with _lock:
+        entry = _periods.get(month)
+        if entry:
+            entry["refreshed_at"] = float("-inf")
+
+
+def invalidate(month=None):
+    """Drops one month (or every month) so the next report reloads it in full."""
+    with _lock:
+        if month is None:
+            _periods.clear()
+            _reports.clear()
+        else:
+            _periods.pop(month, None)
+
+
+def cache_stats():
+    with _lock:
+        return {"periods": len(_periods), "reports": len(_reports), **_stats}
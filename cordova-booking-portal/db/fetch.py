@@ -0,0 +1,70 @@
+# db/fetch.py
+"""
+Runs independent Supabase queries concurrently on a bounded thread pool.
+
+    results = fetch_parallel({
+        "today": lambda: supabase.table("bookings").select("...").eq("date", d).execute().data,
+        "absences": lambda: ...,
+    })
+    today_rows = results["today"].unwrap()   # re-raises that query's error
+
+A failing query does not affect the others; its exception is kept on the
+result so callers (and safe_tab) decide how to surface it.
+
+Jobs must not call fetch_parallel themselves: a job waiting on inner jobs
+holds a worker, and enough of them at once leave no worker to run the inner
+ones. Such a nested call runs its jobs inline on the worker instead.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import FETCH_MAX_WORKERS
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # running outside Streamlit (scripts, benchmarks)
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+_THREAD_PREFIX = "db-fetch"
+_pool = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix=_THREAD_PREFIX)
+
+
+@dataclass
+class FetchResult:
+    data: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def unwrap(self):
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+
+def _run(fn, ctx):
+    # Lets st.cache_* and st.secrets work inside worker threads
+    if ctx is not None and add_script_run_ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    try:
+        data = fn()
+        return FetchResult(data=[] if data is None else data)
+    except Exception as e:
+        return FetchResult(error=e)
+
+
+def fetch_parallel(jobs: Dict[str, Callable[[], Any]]) -> Dict[str, FetchResult]:
+    """Runs every job concurrently and returns {name: FetchResult} once all finish."""
+    if not jobs:
+        return {}
+    ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx is not None else None
+    if len(jobs) == 1 or threading.current_thread().name.startswith(_THREAD_PREFIX):
+        return {name: _run(fn, None) for name, fn in jobs.items()}
+
+    futures = {name: _pool.submit(_run, fn, ctx) for name, fn in jobs.items()}
+    return {name: f.result() for name, f in futures.items()}
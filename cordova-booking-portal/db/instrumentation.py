@@ -0,0 +1,223 @@
+# db/instrumentation.py
+"""
+Optional tracing wrapper around the Supabase client.
+
+instrument(client) returns a proxy whose table()/rpc() builders record every
+execute(): target, filter chain, latency, row count, payload bytes and the
+page/function that issued it. Records are grouped per Streamlit session and
+rerun; begin_rerun() (called by utils/query_panel.py at the top of every full
+rerun) closes the previous rerun so the debug panel can show it. Queries from
+@st.fragment reruns, which do not run app.py, are kept apart and reported as
+fragment reruns instead of being added to the next full rerun. Sessions that
+are gone (or idle for SESSION_IDLE_SECONDS) are dropped on each
+begin_rerun(). Enabled with QUERY_INSTRUMENTATION in config/settings.py;
+QUERY_LOG_PATH also appends every record as JSON lines.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+from config.settings import N_PLUS_ONE_THRESHOLD, QUERY_INSTRUMENTATION, QUERY_LOG_PATH
+
+try:
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:  # outside Streamlit
+    Runtime = None
+    get_script_run_ctx = None
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+SESSION_IDLE_SECONDS = 3600
+
+_lock = threading.Lock()
+_current = defaultdict(list)                      # session -> records of the running full rerun
+_fragments = defaultdict(list)                    # session -> records of fragment reruns since then
+_previous = {}                                    # session -> (full rerun records, fragment rerun records)
+_last_seen = {}                                   # session -> time.monotonic() of its last activity
+_history = deque(maxlen=5000)                     # all sessions, for offline export
+
+
+def _ctx():
+    return get_script_run_ctx(suppress_warning=True) if get_script_run_ctx is not None else None
+
+
+def _session_id():
+    return getattr(_ctx(), "session_id", None) or "no-session"
+
+
+def _bucket():
+    """(session, records list) the running script adds to: its full rerun or its fragment reruns."""
+    ctx = _ctx()
+    sid = getattr(ctx, "session_id", None) or "no-session"
+    # fragment_ids_this_run is set only when Streamlit reruns fragments alone
+    return sid, (_fragments if getattr(ctx, "fragment_ids_this_run", None) else _current)[sid]
+
+
+def _caller():
+    """First frame inside the app (pages/, db/, utils/) that is not this module."""
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        path = os.path.abspath(frame.filename)
+        if path == _THIS_FILE or not path.startswith(_APP_ROOT):
+            continue
+        return f"{os.path.relpath(path, _APP_ROOT)}:{frame.name}"
+    return "unknown"
+
+
+def _record(kind, target, ops, started, data, error=None):
+    latency_ms = (time.perf_counter() - started) * 1000
+    try:
+        payload_bytes = len(json.dumps(data, default=str)) if data is not None else 0
+    except (TypeError, ValueError):
+        payload_bytes = 0
+    ctx = _ctx()
+    rec = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "session": getattr(ctx, "session_id", None) or "no-session",
+        "fragment": getattr(ctx, "current_fragment_id", None),
+        "kind": kind,
+        "target": target,
+        "ops": ".".join(ops),
+        "latency_ms": round(latency_ms, 2),
+        "rows": len(data) if isinstance(data, list) else (0 if data is None else 1),
+        "bytes": payload_bytes,
+        "caller": _caller(),
+        "error": str(error) if error else None,
+    }
+    with _lock:
+        sid, records = _bucket()
+        records.append(rec)
+        _last_seen[sid] = time.monotonic()
+        _history.append(rec)
+        if QUERY_LOG_PATH:
+            with open(QUERY_LOG_PATH, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(rec) + "\n")
+
+
+class _TracedBuilder:
+    """Wraps a postgrest builder; every chained call stays wrapped until execute()."""
+
+    def __init__(self, builder, kind, target, ops):
+        self._builder = builder
+        self._kind = kind
+        self._target = target
+        self._ops = ops
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _TracedBuilder(result, self._kind, self._target, self._ops + [name])
+            return result
+
+        return call
+
+    def execute(self):
+        started = time.perf_counter()
+        try:
+            res = self._builder.execute()
+        except Exception as e:
+            _record(self._kind, self._target, self._ops, started, None, error=e)
+            raise
+        _record(self._kind, self._target, self._ops, started, getattr(res, "data", None))
+        return res
+
+
+class InstrumentedClient:
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _TracedBuilder(self._client.table(name), "table", name, [])
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return _TracedBuilder(self._client.rpc(fn, params or {}, *args, **kwargs), "rpc", fn, [])
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument(client):
+    """Returns the client wrapped for tracing when instrumentation is enabled."""
+    return InstrumentedClient(client) if QUERY_INSTRUMENTATION else client
+
+
+def _session_gone(sid, now):
+    if now - _last_seen.get(sid, now) >= SESSION_IDLE_SECONDS:
+        return True
+    return Runtime is not None and Runtime.exists() and not Runtime.instance().is_active_session(sid)
+
+
+def _evict(now):
+    for sid in [s for s in set(_current) | set(_fragments) | set(_previous) if _session_gone(s, now)]:
+        _current.pop(sid, None)
+        _fragments.pop(sid, None)
+        _previous.pop(sid, None)
+        _last_seen.pop(sid, None)
+
+
+def begin_rerun():
+    """Closes the current session's full rerun and returns its records."""
+    sid = _session_id()
+    now = time.monotonic()
+    with _lock:
+        _evict(now)
+        # A rerun without queries has no entry; it still replaces the previous one
+        _previous[sid] = (_current.pop(sid, []), _fragments.pop(sid, []))
+        _last_seen[sid] = now
+        return list(_previous[sid][0])
+
+
+def fragment_records():
+    """Records of the fragment reruns between the previous full rerun and this one."""
+    with _lock:
+        return list(_previous.get(_session_id(), ((), ()))[1])
+
+
+def current_record_count():
+    """Queries recorded so far in this session's running script; None when tracing is off."""
+    if not QUERY_INSTRUMENTATION:
+        return None
+    with _lock:
+        return len(_bucket()[1])
+
+
+def summarize(records):
+    """Totals, top queries by total latency, and suspected N+1 patterns."""
+    groups = {}
+    for r in records:
+        key = (r["target"], r["ops"], r["caller"])
+        g = groups.setdefault(key, {"target": r["target"], "ops": r["ops"], "caller": r["caller"],
+                                    "calls": 0, "total_ms": 0.0, "rows": 0, "bytes": 0})
+        g["calls"] += 1
+        g["total_ms"] += r["latency_ms"]
+        g["rows"] += r["rows"]
+        g["bytes"] += r["bytes"]
+
+    top = sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+    return {
+        "calls": len(records),
+        "total_ms": round(sum(r["latency_ms"] for r in records), 2),
+        "rows": sum(r["rows"] for r in records),
+        "bytes": sum(r["bytes"] for r in records),
+        "top": top,
+        "n_plus_one": [g for g in top if g["calls"] >= N_PLUS_ONE_THRESHOLD],
+    }
+
+
+def to_jsonl(records):
+    return "".join(json.dumps(r) + "\n" for r in records)
+
+
+def history():
+    with _lock:
+        return list(_history)
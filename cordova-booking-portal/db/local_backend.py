@@ -0,0 +1,660 @@
+# db/local_backend.py
+"""
+In-process stand-in for the Supabase client, for offline runs and benchmarks.
+
+Implements the subset of the supabase-py / postgrest query builder the app
+uses: table().select()/insert()/update()/upsert()/delete() with eq, neq, gt,
+gte, lt, lte, like, ilike, is_, in_, or_, order, limit, range and
+execute(); count="exact" / head=True; PostgREST-style embeds
+("alias:table!fk_col(cols)"); rpc() for the SQL functions and read-only
+VIEWS for the views in db/sql/.
+Writes to bookings update booking_day_counters like the database trigger;
+writes to rp_unavailability bump table_versions (db/sql/009_table_versions.sql).
+
+Rows live in Python dicts with hash indexes on the common filter columns.
+Select it with DB_BACKEND = "local" in config/settings.py; LOCAL_DB_SEED_PATH
+can point at a JSON file of {"table": [rows]} to load at start-up.
+"""
+import copy
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from config.settings import STATUS_BLOCKING
+
+# Hash indexes used to narrow eq / in_ filters before scanning
+INDEXED_COLUMNS = {
+    "bookings": ("id", "date", "status", "salesperson_id", "rp_id", "subject_id", "school_id", "slot_id"),
+    "rp_unavailability": ("id", "date", "rp_id"),
+    "rp_subject_rules": ("id", "subject_id", "rp_id"),
+    "feedback": ("id", "booking_id", "salesperson_id"),
+    "booking_day_counters": ("date",),
+    "booking_day_versions": ("date",),
+    "users": ("id", "email", "role"),
+}
+DEFAULT_INDEX = ("id",)
+
+# Tables with a table_versions change marker
+VERSIONED_TABLES = ("rp_unavailability",)
+
+# Tables whose primary key is not "id"
+PRIMARY_KEYS = {
+    "booking_day_versions": ("date",),
+    "booking_day_counters": ("date", "kind", "key1", "key2"),
+    "table_versions": ("name",),
+}
+
+
+class LocalBackendError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code    # PostgREST error code where one applies
+
+
+class LocalResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# ----------------------------
+# FILTER PARSING / EVALUATION
+# ----------------------------
+def _like_regex(pattern, flags=0):
+    out = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+    return re.compile(f"^{out}$", flags | re.DOTALL)
+
+
+def _compare(op, value, arg):
+    if op == "eq":
+        return value is not None and value == arg
+    if op == "neq":
+        return value is not None and value != arg
+    if op == "is":
+        return value is arg if arg in (None, True, False) else False
+    if op == "in":
+        return value in arg
+    if op == "like":
+        return value is not None and bool(_like_regex(str(arg)).match(str(value)))
+    if op == "ilike":
+        return value is not None and bool(_like_regex(str(arg), re.IGNORECASE).match(str(value)))
+    if value is None or arg is None:
+        return False
+    try:
+        if op == "gt":
+            return value > arg
+        if op == "gte":
+            return value >= arg
+        if op == "lt":
+            return value < arg
+        if op == "lte":
+            return value <= arg
+    except TypeError:
+        return str(value) > str(arg) if op == "gt" else \
+            str(value) >= str(arg) if op == "gte" else \
+            str(value) < str(arg) if op == "lt" else str(value) <= str(arg)
+    raise LocalBackendError(f"Unsupported operator: {op}")
+
+
+def _coerce(raw):
+    """Typed value for a filter written in PostgREST text syntax."""
+    if raw == "null":
+        return None
+    if raw == "true":
+        return True
+    if raw == "false":
+        return False
+    return raw
+
+
+def _split_top(text, sep=","):
+    parts, depth, buf = [], 0, []
+    for c in text:
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        if c == sep and depth == 0:
+            parts.append("".join(buf).strip())
+            buf = []
+        else:
+            buf.append(c)
+    if "".join(buf).strip():
+        parts.append("".join(buf).strip())
+    return parts
+
+
+def _parse_or(text):
+    """'a.eq.1,and(b.lt.2,c.gt.3)' -> predicate(row)."""
+    preds = [_parse_condition(p) for p in _split_top(text)]
+    return lambda row: any(p(row) for p in preds)
+
+
+def _parse_condition(text):
+    for group, combine in (("and(", all), ("or(", any)):
+        if text.startswith(group) and text.endswith(")"):
+            preds = [_parse_condition(p) for p in _split_top(text[len(group):-1])]
+            return lambda row, preds=preds, combine=combine: combine(p(row) for p in preds)
+
+    col, op, raw = text.split(".", 2)
+    negate = False
+    if op == "not":
+        negate = True
+        op, raw = raw.split(".", 1)
+    if op == "in":
+        arg = [_coerce(v.strip().strip('"')) for v in raw.strip("()").split(",") if v.strip()]
+    elif len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        arg = raw[1:-1]   # quoted value (may contain reserved characters)
+    else:
+        arg = _coerce(raw)
+    return lambda row: _compare(op, row.get(col), arg) != negate
+
+
+# ----------------------------
+# SELECT PARSING
+# ----------------------------
+_EMBED_RE = re.compile(r"^(?:(?P<alias>\w+):)?(?P<table>\w+)(?:!(?P<hint>\w+))?\((?P<cols>.*)\)$", re.DOTALL)
+
+
+def _parse_select(columns):
+    """-> [("col", alias, name) | ("embed", alias, table, hint, sub_spec) | ("star",)]"""
+    spec = []
+    for part in _split_top(" ".join((columns or "*").split())):
+        if part == "*":
+            spec.append(("star",))
+            continue
+        m = _EMBED_RE.match(part)
+        if m:
+            spec.append((
+                "embed", m.group("alias") or m.group("table"), m.group("table"),
+                m.group("hint"), _parse_select(m.group("cols")),
+            ))
+            continue
+        alias, _, name = part.rpartition(":")
+        spec.append(("col", alias or name, name))
+    return spec
+
+
+def _singular(table):
+    return table[:-1] if table.endswith("s") else table
+
+
+class LocalStore:
+    """Shared, thread-safe table storage plus RPC implementations."""
+
+    def __init__(self, seed=None, latency_ms=0):
+        self._lock = threading.RLock()
+        self.latency_ms = latency_ms      # simulated round trip per execute(), for benchmarks
+        self._rows = defaultdict(dict)                                   # table -> {rowid: row}
+        self._indexes = defaultdict(lambda: defaultdict(set))            # (table, col) -> value -> rowids
+        self._next_rowid = 0
+        self.rpcs = {
+            "commit_bookings": _rpc_commit_bookings,
+            "update_bookings_versioned": _rpc_update_bookings_versioned,
+            "booking_status_counts": _rpc_booking_status_counts,
+            "rebuild_booking_day_counters": _rpc_rebuild_booking_day_counters,
+        }
+        if seed:
+            self.load(seed)
+
+    def round_trip(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    # -- storage ------------------------------------------------------------
+    def _indexed(self, table):
+        return INDEXED_COLUMNS.get(table, DEFAULT_INDEX)
+
+    def _add(self, table, row):
+        self._next_rowid += 1
+        rid = self._next_rowid
+        self._rows[table][rid] = row
+        for col in self._indexed(table):
+            self._indexes[(table, col)][row.get(col)].add(rid)
+        return rid
+
+    def _remove(self, table, rid):
+        row = self._rows[table].pop(rid)
+        for col in self._indexed(table):
+            self._indexes[(table, col)][row.get(col)].discard(rid)
+        return row
+
+    def _reindex(self, table, rid, old, new):
+        for col in self._indexed(table):
+            if old.get(col) != new.get(col):
+                self._indexes[(table, col)][old.get(col)].discard(rid)
+                self._indexes[(table, col)][new.get(col)].add(rid)
+
+    def load(self, tables):
+        """Bulk-loads {"table": [rows]} (rows without an id get one)."""
+        with self._lock:
+            for table, rows in tables.items():
+                for row in rows:
+                    self._insert_row(table, dict(row))
+        return self
+
+    def rows(self, table):
+        with self._lock:
+            return [copy.deepcopy(r) for r in self._rows[table].values()]
+
+    def _candidates(self, table, filters):
+        """Row ids to scan: intersect index hits for filters on indexed columns."""
+        best = None
+        for kind, col, arg in filters:
+            if col not in self._indexed(table) or kind not in ("eq", "in", "gt", "gte", "lt", "lte"):
+                continue
+            index = self._indexes[(table, col)]
+            if kind == "eq":
+                hit = set(index.get(arg, ()))
+            elif kind == "in":
+                hit = set().union(*(index.get(a, ()) for a in arg))
+            else:  # range: one bucket per distinct value, so scan the keys
+                hit = set().union(*(ids for key, ids in index.items() if _compare(kind, key, arg)))
+            best = hit if best is None else best & hit
+        return list(self._rows[table]) if best is None else sorted(best)
+
+    def match(self, table, filters, predicates):
+        out = []
+        for rid in self._candidates(table, filters):
+            row = self._rows[table].get(rid)
+            if row is None:
+                continue
+            if all(_compare(kind, row.get(col), arg) for kind, col, arg in filters) and all(p(row) for p in predicates):
+                out.append((rid, row))
+        return out
+
+    # -- writes -------------------------------------------------------------
+    def _insert_row(self, table, row):
+        if table not in PRIMARY_KEYS:
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        pk = PRIMARY_KEYS.get(table, ("id",))
+        existing = self.match(table, [("eq", c, row.get(c)) for c in pk], [])
+        if existing:
+            raise LocalBackendError(f'duplicate key value violates unique constraint "{table}_pkey"')
+        self._add(table, row)
+        self._after_write(table, None, row)
+        return row
+
+    def insert(self, table, rows, upsert=False, on_conflict=None):
+        with self._lock:
+            out = []
+            for row in rows:
+                row = dict(row)
+                if upsert:
+                    keys = [c.strip() for c in on_conflict.split(",")] if on_conflict else list(PRIMARY_KEYS.get(table, ("id",)))
+                    existing = self.match(table, [("eq", c, row.get(c)) for c in keys], []) if all(row.get(c) is not None for c in keys) else []
+                    if existing:
+                        out.extend(self._update_rows(table, existing, row))
+                        continue
+                out.append(copy.deepcopy(self._insert_row(table, row)))
+            return out
+
+    def _update_rows(self, table, matched, values):
+        out = []
+        for rid, row in matched:
+            old = dict(row)
+            row.update(values)
+            self._reindex(table, rid, old, row)
+            self._after_write(table, old, row)
+            out.append(copy.deepcopy(row))
+        return out
+
+    def update(self, table, values, filters, predicates):
+        with self._lock:
+            return self._update_rows(table, self.match(table, filters, predicates), values)
+
+    def delete(self, table, filters, predicates):
+        with self._lock:
+            out = []
+            for rid, _ in self.match(table, filters, predicates):
+                row = self._remove(table, rid)
+                self._after_write(table, row, None)
+                out.append(row)
+            return out
+
+    # -- triggers -----------------------------------------------------------
+    def _after_write(self, table, old, new):
+        if table == "bookings":
+            self._bump_day_counters(old, -1)
+            self._bump_day_counters(new, 1)
+        elif table in VERSIONED_TABLES:
+            hit = self.match("table_versions", [("eq", "name", table)], [])
+            if hit:
+                self._update_rows("table_versions", hit, {"version": hit[0][1]["version"] + 1})
+            else:
+                self._add("table_versions", {"name": table, "version": 1})
+
+    def _bump_day_counters(self, booking, delta):
+        from db.rollup import compute_day_counters
+        if not booking:
+            return
+        for c in compute_day_counters([booking]):
+            key = [("eq", "date", c["date"]), ("eq", "kind", c["kind"]), ("eq", "key1", c["key1"]), ("eq", "key2", c["key2"])]
+            hit = self.match("booking_day_counters", key, [])
+            if hit:
+                self._update_rows("booking_day_counters", hit, {"n": hit[0][1]["n"] + delta})
+            else:
+                self._add("booking_day_counters", {**c, "n": delta})
+
+    # -- embeds -------------------------------------------------------------
+    def project(self, table, row, spec):
+        out = {}
+        for item in spec:
+            if item[0] == "star":
+                out.update(copy.deepcopy(row))
+            elif item[0] == "col":
+                out[item[1]] = copy.deepcopy(row.get(item[2]))
+            else:
+                _, alias, target, hint, sub = item
+                out[alias] = self._embed(table, row, target, hint, sub)
+        return out
+
+    def _embed(self, table, row, target, hint, sub):
+        fk = hint or f"{_singular(target)}_id"
+        if fk in row:  # many-to-one: this row points at the target
+            if row.get(fk) is None:
+                return None
+            hit = self.match(target, [("eq", "id", row[fk])], [])
+            return self.project(target, hit[0][1], sub) if hit else None
+        # one-to-many: target rows point back at this row
+        back = hint or f"{_singular(table)}_id"
+        return [self.project(target, r, sub) for _, r in self.match(target, [("eq", back, row.get("id"))], [])]
+
+
+# ----------------------------
+# RPCs (Python versions of db/sql/*.sql)
+# ----------------------------
+# The SQL functions run in one transaction. Their Python versions check
+# everything that can fail before the first write, so a failed call leaves
+# the store untouched instead of half-applied.
+def _check_day_versions(store, expected):
+    """{date: (hit, version)} if every date is at its expected version; writes nothing."""
+    versions = {}
+    for d, v in sorted(expected.items()):
+        hit = store.match("booking_day_versions", [("eq", "date", d)], [])
+        current = hit[0][1]["version"] if hit else 0
+        if current != int(v):
+            raise LocalBackendError("booking_version_conflict")
+        versions[d] = (hit, current)
+    return versions
+
+
+def _check_new_ids(store, table, rows):
+    ids = [r["id"] for r in rows if r.get("id") is not None]
+    if len(set(ids)) != len(ids) or any(store.match(table, [("eq", "id", i)], []) for i in ids):
+        raise LocalBackendError(f'duplicate key value violates unique constraint "{table}_pkey"')
+
+
+def _bump_day_versions(store, versions):
+    for d, (hit, current) in versions.items():
+        if hit:
+            store._update_rows("booking_day_versions", hit, {"version": current + 1})
+        else:
+            store._insert_row("booking_day_versions", {"date": d, "version": 1})
+
+
+def _rpc_commit_bookings(store, params):
+    versions = _check_day_versions(store, params.get("p_expected") or {})
+    rows = []
+    for r in params.get("p_rows") or []:
+        r = {k: v for k, v in r.items() if k != "created_at" and not (k == "id" and v is None)}
+        r.setdefault("status", "Pending")
+        rows.append(r)
+    _check_new_ids(store, "bookings", rows)
+    _bump_day_versions(store, versions)
+    return [copy.deepcopy(store._insert_row("bookings", r)) for r in rows]
+
+
+def _rpc_update_bookings_versioned(store, params):
+    _bump_day_versions(store, _check_day_versions(store, params.get("p_expected") or {}))
+    rows = []
+    for u in params.get("p_updates") or []:
+        hit = store.match("bookings", [("in", "id", list(u.get("ids") or []))], [])
+        rows += store._update_rows("bookings", hit, dict(u.get("values") or {}))
+    return rows
+
+
+def _rpc_booking_status_counts(store, params):
+    filters = []
+    for col, key in (("salesperson_id", "p_salesperson_id"), ("rp_id", "p_rp_id")):
+        if params.get(key):
+            filters.append(("eq", col, params[key]))
+    if params.get("p_session_type_ids"):
+        filters.append(("in", "session_type_id", list(params["p_session_type_ids"])))
+    rows = [r for _, r in store.match("bookings", filters, [])]
+    out = []
+    for b in params.get("p_buckets") or []:
+        counts = Counter(
+            r.get("status") for r in rows
+            if (not b.get("from") or (r.get("date") or "") >= b["from"])
+            and (not b.get("to") or (r.get("date") or "") <= b["to"])
+        )
+        out.extend({"bucket": b["name"], "status": s, "n": n} for s, n in counts.items())
+    return out
+
+
+def _rpc_rebuild_booking_day_counters(store, params):
+    from db.rollup import compute_day_counters
+    lo, hi = params.get("p_from"), params.get("p_to")
+
+    def in_range(d):
+        return (not lo or d >= lo) and (not hi or d <= hi)
+
+    for rid, row in list(store._rows["booking_day_counters"].items()):
+        if in_range(row["date"]):
+            store._remove("booking_day_counters", rid)
+    bookings = [
+        r for r in store._rows["bookings"].values()
+        if r.get("status") in STATUS_BLOCKING and in_range(r.get("date") or "")
+    ]
+    rows = compute_day_counters(bookings)
+    for r in rows:
+        store._add("booking_day_counters", r)
+    return len(rows)
+
+
+def _view_pending_feedback(store, row):
+    return row.get("status") == "Completed" and not store._indexes[("feedback", "booking_id")].get(row.get("id"))
+
+
+# view -> (base table, row predicate); embeds resolve against the base table
+VIEWS = {
+    "pending_feedback_bookings": ("bookings", _view_pending_feedback),
+}
+
+
+# ----------------------------
+# QUERY BUILDER
+# ----------------------------
+class LocalQuery:
+    def __init__(self, store, table):
+        self._store = store
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._payload = None
+        self._upsert = False
+        self._on_conflict = None
+        self._count = None
+        self._head = False
+        self._filters = []        # (op, column, value)
+        self._predicates = []     # or_ / not_ callables
+        self._order = []
+        self._limit = None
+        self._offset = 0
+
+    # actions
+    def select(self, *columns, count=None, head=None):
+        self._columns = ",".join(columns) if columns else "*"
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, json, *, count=None, returning=None, upsert=False, default_to_null=True):
+        self._action = "insert"
+        self._payload = json if isinstance(json, list) else [json]
+        self._upsert = upsert
+        return self
+
+    def upsert(self, json, *, count=None, returning=None, ignore_duplicates=False, on_conflict="", default_to_null=True):
+        self.insert(json, upsert=True)
+        self._on_conflict = on_conflict or None
+        return self
+
+    def update(self, json, *, count=None, returning=None):
+        self._action = "update"
+        self._payload = dict(json)
+        return self
+
+    def delete(self, *, count=None, returning=None):
+        self._action = "delete"
+        return self
+
+    # filters
+    def _add(self, op, column, value):
+        self._filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._add("eq", column, value)
+
+    def neq(self, column, value):
+        return self._add("neq", column, value)
+
+    def gt(self, column, value):
+        return self._add("gt", column, value)
+
+    def gte(self, column, value):
+        return self._add("gte", column, value)
+
+    def lt(self, column, value):
+        return self._add("lt", column, value)
+
+    def lte(self, column, value):
+        return self._add("lte", column, value)
+
+    def like(self, column, pattern):
+        return self._add("like", column, pattern)
+
+    def ilike(self, column, pattern):
+        return self._add("ilike", column, pattern)
+
+    def is_(self, column, value):
+        return self._add("is", column, _coerce(value) if isinstance(value, str) else value)
+
+    def in_(self, column, values):
+        return self._add("in", column, list(values))
+
+    def or_(self, filters, reference_table=None):
+        self._predicates.append(_parse_or(filters))
+        return self
+
+    def not_(self):
+        raise LocalBackendError("not_ is not supported by the local backend")
+
+    # modifiers
+    def order(self, column, *, desc=False, nullsfirst=None, foreign_table=None):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self._limit = size
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def offset(self, size):
+        self._offset = size
+        return self
+
+    def execute(self):
+        store = self._store
+        store.round_trip()
+        with store._lock:
+            if self._action != "select" and self._table in VIEWS:
+                raise LocalBackendError(f'cannot {self._action} view "{self._table}"')
+            if self._action == "insert":
+                return LocalResponse(store.insert(self._table, self._payload, self._upsert, self._on_conflict))
+            if self._action == "update":
+                return LocalResponse(store.update(self._table, self._payload, self._filters, self._predicates))
+            if self._action == "delete":
+                return LocalResponse(store.delete(self._table, self._filters, self._predicates))
+
+            table, predicates = self._table, self._predicates
+            if table in VIEWS:
+                table, view = VIEWS[table]
+                predicates = predicates + [lambda r: view(store, r)]
+            rows = [r for _, r in store.match(table, self._filters, predicates)]
+            count = len(rows) if self._count else None
+            if self._head:
+                return LocalResponse([], count)
+
+            # Stable multi-key sort: apply keys last to first; None sorts last like Postgres ASC
+            for column, desc in reversed(self._order):
+                present = [r for r in rows if r.get(column) is not None]
+                missing = [r for r in rows if r.get(column) is None]
+                present.sort(key=lambda r: r[column], reverse=desc)
+                rows = (missing + present) if desc else (present + missing)
+            if self._offset:
+                rows = rows[self._offset:]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+
+            spec = _parse_select(self._columns)
+            return LocalResponse([store.project(table, r, spec) for r in rows], count)
+
+
+class LocalRpc:
+    def __init__(self, store, fn, params):
+        self._store = store
+        self._fn = fn
+        self._params = params or {}
+
+    def execute(self):
+        self._store.round_trip()
+        impl = self._store.rpcs.get(self._fn)
+        if impl is None:
+            raise LocalBackendError(f"Could not find the function public.{self._fn}", code="PGRST202")
+        with self._store._lock:
+            return LocalResponse(impl(self._store, copy.deepcopy(self._params)))
+
+
+class LocalClient:
+    """Drop-in for supabase.Client limited to table() and rpc()."""
+
+    def __init__(self, store=None):
+        self.store = store or LocalStore()
+
+    def table(self, name):
+        return LocalQuery(self.store, name)
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return LocalRpc(self.store, fn, params)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_local_store(seed_path=None):
+    """Process-wide store; seeded once from seed_path (JSON) if given."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            seed = None
+            if seed_path:
+                with open(seed_path, encoding="utf-8") as fh:
+                    seed = json.load(fh)
+            _default_store = LocalStore(seed)
+        return _default_store
@@ -0,0 +1,193 @@
+# db/moderation.py
+"""
+Batch moderation of bookings from the admin grid.
+
+diff_changes() compares the rows the admin started from with the edited grid
+(status, date and slot). validate_changes() re-checks, in memory and in one
+pass, only the changes that can add load: moves to another date/slot and
+reactivations of rejected/cancelled bookings. It loads the affected dates'
+blocking bookings, absences and rules once and runs find_rule_violations per
+change. A change that would introduce a violation is refused with its reason.
+
+apply_changes() writes changes that only free capacity as one
+update().in_("id", ids) per distinct set of new values (usually one per
+target status). Load-adding changes go through the update_bookings_versioned
+RPC (db/sql/007_update_bookings_versioned.sql) with the booking_day_versions
+of their old and new dates, read before validation, exactly like
+book_session(): a booking committed on one of those dates in the meantime
+makes the RPC fail, and the batch is re-validated and retried. Cached
+availability is invalidated only for the dates whose load changed.
+
+Approve/reject decisions never add load (Pending already counts against
+capacity), so they skip validation entirely.
+"""
+from collections import defaultdict
+
+from config.settings import STATUS_BLOCKING
+from db import availability_cache, reference
+from db.absences import fetch_absence_rows
+from db.allocation import MAX_COMMIT_ATTEMPTS, _fetch_day_versions, find_rule_violations
+from db.bookings import BOOKING_COLUMN_SETS
+from db.connection import get_supabase
+
+EDITABLE_FIELDS = ("status", "date", "slot_id")
+
+
+def diff_changes(original_rows, edited_rows, fields=EDITABLE_FIELDS):
+    """-> [{"id", "before": booking row, "after": {changed field: new value}}]"""
+    edited_by_id = {r["id"]: r for r in edited_rows}
+    changes = []
+    for row in original_rows:
+        edited = edited_by_id.get(row["id"])
+        if edited is None:
+            continue
+        after = {f: str(edited[f]) for f in fields if edited.get(f) is not None and str(edited[f]) != str(row.get(f))}
+        if after:
+            changes.append({"id": row["id"], "before": row, "after": after})
+    return changes
+
+
+def _adds_load(change):
+    before, after = change["before"], change["after"]
+    if after.get("status", before.get("status")) not in STATUS_BLOCKING:
+        return False
+    moved = "date" in after or "slot_id" in after
+    return moved or before.get("status") not in STATUS_BLOCKING
+
+
+def _violation_keys(rows, slots, rules, session_types, absences):
+    return {
+        (v["date"], v["rule"], v["detail"])
+        for v in find_rule_violations(rows, slots, rules, session_types, absences)
+    }
+
+
+def validate_changes(changes, client=None):
+    """-> (accepted changes, [{"id", "reason"}] refused)."""
+    loading = [c for c in changes if _adds_load(c)]
+    loading_ids = {c["id"] for c in loading}
+    if not loading:
+        return list(changes), []
+
+    supabase = client or get_supabase()
+    dates = sorted({str(c["after"].get("date", c["before"]["date"])) for c in loading})
+    day_rows = (
+        supabase.table("bookings")
+        .select(BOOKING_COLUMN_SETS["summary"])
+        .in_("date", dates)
+        .in_("status", STATUS_BLOCKING)
+        .execute()
+    ).data or []
+    rp_ids = sorted({r["rp_id"] for r in day_rows if r.get("rp_id")} | {c["before"]["rp_id"] for c in loading if c["before"].get("rp_id")})
+    rules = []
+    if rp_ids:
+        rules = (
+            supabase.table("rp_subject_rules")
+            .select("rp_id, subject_id, max_classes_per_day, is_saturday, is_avrd")
+            .in_("rp_id", rp_ids)
+            .execute()
+        ).data or []
+    absences = fetch_absence_rows(dates[0], dates[-1], client=supabase)
+    slots = reference.get_rows("slots")
+    session_types = reference.get_rows("session_types")
+
+    # Current state of the affected dates with every non-loading change applied first:
+    # those only free capacity, so the loading changes are checked against the freed days
+    state = {r["id"]: r for r in day_rows}
+    for c in changes:
+        if c["id"] in loading_ids:
+            continue
+        if c["id"] in state:
+            state[c["id"]] = {**state[c["id"]], **c["after"]}
+            if state[c["id"]]["status"] not in STATUS_BLOCKING:
+                del state[c["id"]]
+
+    def day(d):
+        return [r for r in state.values() if str(r["date"]) == d]
+
+    accepted = [c for c in changes if c["id"] not in loading_ids]
+    refused = []
+    for c in loading:
+        new_row = {**c["before"], **c["after"]}
+        d = str(new_row["date"])
+        baseline = [r for r in day(d) if r["id"] != c["id"]]
+        before = _violation_keys(baseline, slots, rules, session_types, absences)
+        introduced = _violation_keys(baseline + [new_row], slots, rules, session_types, absences) - before
+        if introduced:
+            _, rule, detail = sorted(introduced)[0]
+            refused.append({"id": c["id"], "reason": f"{rule}: {detail}"})
+            continue
+        state[c["id"]] = new_row
+        accepted.append(c)
+    return accepted, refused
+
+
+def _group(changes):
+    """{sorted new values: [ids]}: one write per distinct set of new values."""
+    groups = defaultdict(list)
+    for c in changes:
+        groups[tuple(sorted(c["after"].items()))].append(c["id"])
+    return groups
+
+
+def _dates(change):
+    before = change["before"]
+    return {str(before["date"]), str(change["after"].get("date", before["date"]))}
+
+
+def _commit_versioned(supabase, expected_versions, groups):
+    """Applies the grouped updates if no date in expected_versions changed; False on conflict."""
+    updates = [{"ids": ids, "values": dict(values)} for values, ids in groups.items()]
+    try:
+        supabase.rpc("update_bookings_versioned", {"p_expected": expected_versions, "p_updates": updates}).execute()
+    except Exception as e:
+        if "booking_version_conflict" in str(e):
+            return False
+        raise
+    return True
+
+
+def apply_changes(changes, client=None, max_attempts=MAX_COMMIT_ATTEMPTS):
+    """
+    Validates and writes a batch of grid edits.
+    Returns {"applied": n, "updates": n write requests, "refused": [{"id", "reason"}]}.
+    """
+    supabase = client or get_supabase()
+    loading = [c for c in changes if _adds_load(c)]
+    freeing = [c for c in changes if not _adds_load(c)]
+
+    # Freeing capacity cannot overbook a day, so these need no version check
+    groups = _group(freeing)
+    for values, ids in groups.items():
+        supabase.table("bookings").update(dict(values)).in_("id", ids).execute()
+    accepted, refused, updates = list(freeing), [], len(groups)
+
+    if loading:
+        dates = sorted(set().union(*(_dates(c) for c in loading)))
+        for _ in range(max_attempts):
+            # Versions must be read before validation loads the days
+            versions = _fetch_day_versions(dates)
+            ok, refused = validate_changes(loading, client=supabase)
+            if not ok:
+                break
+            if _commit_versioned(supabase, versions, _group(ok)):
+                accepted += ok
+                updates += 1
+                break
+            availability_cache.invalidate(dates[0], dates[-1])
+        else:
+            refused = [
+                {"id": c["id"], "reason": f"Kept conflicting with other bookings ({max_attempts} attempts). Apply again."}
+                for c in loading
+            ]
+
+    # Availability only changes where a booking entered/left the blocking statuses or moved
+    touched = set()
+    for c in accepted:
+        before, after = c["before"], c["after"]
+        was_blocking = before.get("status") in STATUS_BLOCKING
+        if was_blocking != (after.get("status", before.get("status")) in STATUS_BLOCKING) or "date" in after or "slot_id" in after:
+            touched |= {str(before["date"]), after.get("date", str(before["date"]))}
+    for d in sorted(touched):
+        availability_cache.invalidate(d)
+    return {"applied": len(accepted), "updates": updates, "refused": refused}
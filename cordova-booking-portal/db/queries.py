@@ -15,3 +15,18 @@ def fetch_slots():
     supabase = get_supabase()
     res = supabase.table("slots").select("id,start_time,end_time,duration_minutes").eq("is_active", True).order("start_time").execute()
     return pd.DataFrame(res.data or [])
+
+# Lookup tables shared by every page: table -> (columns, order by)
+REFERENCE_TABLES = {
+    "subjects": ("id,name", "name"),
+    "schools": ("id,name,city", "name"),
+    "resource_persons": ("id,display_name,user_id", "display_name"),
+    "session_types": ("id,name,duration_minutes", "name"),
+    "slots": ("id,start_time,end_time,duration_minutes", "start_time"),
+}
+
+def fetch_reference_rows(table: str):
+    columns, order = REFERENCE_TABLES[table]
+    supabase = get_supabase()
+    res = supabase.table(table).select(columns).order(order).execute()
+    return res.data or []
@@ -0,0 +1,111 @@
+# db/reference.py
+"""
+Process-wide cache for the lookup tables every page needs.
+
+Rows come from db.queries.fetch_reference_rows and are kept for
+REFERENCE_CACHE_TTL_SECONDS. Code that writes to one of these tables calls
+invalidate(<table>) so the next read reloads it.
+"""
+import threading
+import time
+from collections import Counter
+
+from config.settings import REFERENCE_CACHE_TTL_SECONDS
+from db.fetch import fetch_parallel
+from db.queries import REFERENCE_TABLES, fetch_reference_rows
+
+_lock = threading.Lock()
+_entries = {}       # table -> {"rows", "maps", "loaded_at"}
+_hits = Counter()
+_misses = Counter()
+
+
+def _label(table, row):
+    if table == "slots":
+        return f'{row["start_time"]} - {row["end_time"]}'
+    if table == "resource_persons":
+        return row.get("display_name")
+    return row.get("name")
+
+
+def _entry(table):
+    if table not in REFERENCE_TABLES:
+        raise KeyError(f"Not a reference table: {table}")
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(table)
+        if entry and now - entry["loaded_at"] < REFERENCE_CACHE_TTL_SECONDS:
+            _hits[table] += 1
+            return entry
+        _misses[table] += 1
+
+    rows = fetch_reference_rows(table)
+    entry = {
+        "rows": rows,
+        "maps": {"label": {r["id"]: _label(table, r) for r in rows}},
+        "loaded_at": now,
+    }
+    with _lock:
+        _entries[table] = entry
+    return entry
+
+
+def get_rows(table: str):
+    """All rows of a lookup table (do not mutate the returned list)."""
+    return _entry(table)["rows"]
+
+
+def name_map(table: str):
+    """id -> display label (name, display_name, or "start - end" for slots)."""
+    return _entry(table)["maps"]["label"]
+
+
+def field_map(table: str, field: str):
+    """id -> any other column, e.g. field_map("schools", "city")."""
+    entry = _entry(table)
+    maps = entry["maps"]
+    if field not in maps:
+        maps[field] = {r["id"]: r.get(field) for r in entry["rows"]}
+    return maps[field]
+
+
+def prefetch_jobs(*tables):
+    """
+    {"lookup:<table>": loader} for every missing/expired table, to be merged
+    into the caller's own fetch_parallel jobs (pool jobs must not start
+    another fetch_parallel and wait on it).
+    """
+    now = time.monotonic()
+    with _lock:
+        stale = [
+            t for t in (tables or REFERENCE_TABLES)
+            if t not in _entries or now - _entries[t]["loaded_at"] >= REFERENCE_CACHE_TTL_SECONDS
+        ]
+    return {f"lookup:{t}": (lambda t=t: _entry(t)) for t in stale}
+
+
+def prefetch(*tables):
+    """Loads every missing/expired table concurrently (one round-trip of latency)."""
+    results = fetch_parallel(prefetch_jobs(*tables))
+    for r in results.values():
+        r.unwrap()
+
+
+def invalidate(*tables):
+    """Drops the given tables (all of them when called with no args)."""
+    with _lock:
+        for t in tables or list(_entries):
+            _entries.pop(t, None)
+
+
+def cache_stats():
+    with _lock:
+        return {
+            t: {
+                "hits": _hits[t],
+                "misses": _misses[t],
+                "rows": len(_entries[t]["rows"]) if t in _entries else 0,
+            }
+            for t in REFERENCE_TABLES
+        }
@@ -0,0 +1,127 @@
+# db/rollup.py
+"""
+Reads and checks the booking_day_counters rollup (db/sql/003_booking_day_counters.sql).
+
+The table is maintained by a trigger on bookings; this module turns its rows
+into the Counter layout DaySnapshot uses, recomputes the same rows from raw
+bookings, and compares the two.
+"""
+from collections import Counter
+
+from config.settings import STATUS_BLOCKING
+from db.connection import get_supabase
+
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+# Rows per request; must not exceed PostgREST's max_rows (1000 by default),
+# which would otherwise truncate the response silently
+COUNTER_PAGE_SIZE = 1000
+
+# kind -> (DaySnapshot attribute, booking column for key1, booking column for key2)
+COUNTER_KINDS = {
+    "slot": ("slot_counts", "slot_id", None),
+    "school": ("school_counts", "school_id", None),
+    "rp": ("rp_counts", "rp_id", None),
+    "rp_subject": ("rp_subject_counts", "rp_id", "subject_id"),
+    "rp_session_type": ("rp_session_type_counts", "rp_id", "session_type_id"),
+    "rp_slot": ("rp_slot_counts", "rp_id", "slot_id"),
+}
+
+
+def _after(row):
+    """Keyset filter for rows past `row` in primary-key order (date, kind, key1, key2)."""
+    d, kind, key1, key2 = row["date"], row["kind"], row["key1"], row["key2"]
+    return (
+        f"date.gt.{d},"
+        f"and(date.eq.{d},kind.gt.{kind}),"
+        f"and(date.eq.{d},kind.eq.{kind},key1.gt.{key1}),"
+        f"and(date.eq.{d},kind.eq.{kind},key1.eq.{key1},key2.gt.{key2})"
+    )
+
+
+def fetch_day_counters(start, end, client=None, page_size=COUNTER_PAGE_SIZE):
+    """Every non-zero counter row for dates in [start, end], paged on the primary key."""
+    supabase = client or get_supabase()
+    rows, last = [], None
+    while True:
+        q = (
+            supabase.table("booking_day_counters")
+            .select("date, kind, key1, key2, n")
+            .gte("date", str(start))
+            .lte("date", str(end))
+            .gt("n", 0)
+        )
+        if last:
+            q = q.or_(_after(last))
+        page = q.order("date").order("kind").order("key1").order("key2").limit(page_size).execute().data or []
+        rows += page
+        if len(page) < page_size:
+            return rows
+        last = page[-1]
+
+
+def counters_by_date(rows):
+    """{date: {snapshot attribute: Counter}} from booking_day_counters rows."""
+    out = {}
+    for r in rows:
+        attr, _, col2 = COUNTER_KINDS[r["kind"]]
+        day = out.setdefault(str(r["date"]), {a: Counter() for a, _, _ in COUNTER_KINDS.values()})
+        key2 = None if r.get("key2") in (None, NIL_UUID) else r["key2"]
+        key = (r["key1"], key2) if col2 else r["key1"]
+        day[attr][key] += int(r["n"])
+    return out
+
+
+def compute_day_counters(bookings):
+    """The rows the trigger should have produced for these bookings."""
+    totals = Counter()
+    for b in bookings:
+        if b.get("status") not in STATUS_BLOCKING:
+            continue
+        for kind, (_, col1, col2) in COUNTER_KINDS.items():
+            key1 = b.get(col1)
+            if key1 is None:
+                continue
+            key2 = (b.get(col2) or NIL_UUID) if col2 else NIL_UUID
+            totals[(str(b["date"]), kind, key1, key2)] += 1
+    return [
+        {"date": d, "kind": kind, "key1": k1, "key2": k2, "n": n}
+        for (d, kind, k1, k2), n in sorted(totals.items())
+    ]
+
+
+def verify_day_counters(start, end, client=None):
+    """Differences between the rollup and a recount from bookings (empty when in sync)."""
+    supabase = client or get_supabase()
+    bookings = (
+        supabase.table("bookings")
+        .select("date, status, slot_id, school_id, rp_id, subject_id, session_type_id")
+        .gte("date", str(start))
+        .lte("date", str(end))
+        .in_("status", STATUS_BLOCKING)
+        .execute()
+    ).data or []
+
+    def key(r):
+        return (str(r["date"]), r["kind"], r["key1"], r.get("key2") or NIL_UUID)
+
+    expected = {key(r): r["n"] for r in compute_day_counters(bookings)}
+    actual = {key(r): int(r["n"]) for r in fetch_day_counters(start, end, client=supabase)}
+
+    diffs = []
+    for k in sorted(set(expected) | set(actual)):
+        if expected.get(k, 0) != actual.get(k, 0):
+            d, kind, k1, k2 = k
+            diffs.append({
+                "date": d, "kind": kind, "key1": k1, "key2": k2,
+                "expected": expected.get(k, 0), "actual": actual.get(k, 0),
+            })
+    return diffs
+
+
+def rebuild_day_counters(start=None, end=None, client=None):
+    supabase = client or get_supabase()
+    res = supabase.rpc(
+        "rebuild_booking_day_counters",
+        {"p_from": str(start) if start else None, "p_to": str(end) if end else None},
+    ).execute()
+    return res.data
@@ -0,0 +1,133 @@
+# db/schools.py
+"""
+School search for the booking form.
+
+search_schools() asks the database for at most SCHOOL_SEARCH_LIMIT schools
+whose name starts with the typed text, topped up with names containing it
+(both served by the trigram index in db/sql/005_schools_search.sql). The
+city filter is case-insensitive, like the name match. Results are
+kept in a process-wide prefix index: once a query returns fewer rows than the
+limit it is complete, so any longer query extending it is answered locally by
+bisecting the sorted names instead of another round trip.
+"""
+import bisect
+import re
+import threading
+import time
+
+from config.settings import SCHOOL_SEARCH_LIMIT, SCHOOL_SEARCH_TTL_SECONDS
+from db.connection import get_supabase
+
+SCHOOL_COLUMNS = "id, name, city"
+
+_lock = threading.Lock()
+_index = {}         # (kind, city, term) -> {"keys", "rows", "complete", "limit", "loaded_at"}
+
+# PostgREST pattern / filter syntax characters
+_UNSAFE = re.compile(r"[%_*,()\\]")
+
+
+def normalize(text):
+    return " ".join(_UNSAFE.sub(" ", text or "").split()).lower()
+
+
+def _query(kind, term, city, limit, client=None):
+    supabase = client or get_supabase()
+    pattern = f"{term}%" if kind == "prefix" else f"%{term}%"
+    q = supabase.table("schools").select(SCHOOL_COLUMNS).ilike("name", pattern)
+    if city:
+        q = q.ilike("city", city)
+    return q.order("name").limit(limit).execute().data or []
+
+
+def _store(kind, city, term, rows, limit, now):
+    rows = sorted(rows, key=lambda r: (r.get("name") or "").lower())
+    entry = {
+        "keys": [(r.get("name") or "").lower() for r in rows],
+        "rows": rows,
+        "complete": len(rows) < limit,
+        "limit": limit,
+        "loaded_at": now,
+    }
+    with _lock:
+        for key in [k for k, e in _index.items() if now - e["loaded_at"] >= SCHOOL_SEARCH_TTL_SECONDS]:
+            del _index[key]
+        _index[(kind, city, term)] = entry
+    return entry
+
+
+def _local(kind, city, term, limit, now):
+    """
+    Rows for `term` from the cache: the same search if it fetched at least
+    `limit` rows, else a complete cached result that must contain all of them
+    (a shorter prefix for prefix searches; for contains searches, a cached
+    substring of `term` or the complete empty prefix, i.e. the whole table).
+    """
+    with _lock:
+        entry = _index.get((kind, city, term))
+        if entry and entry["limit"] >= limit and now - entry["loaded_at"] < SCHOOL_SEARCH_TTL_SECONDS:
+            return entry["rows"]
+        for (k, c, base), entry in _index.items():
+            if c != city or not entry["complete"] or now - entry["loaded_at"] >= SCHOOL_SEARCH_TTL_SECONDS:
+                continue
+            keys, rows = entry["keys"], entry["rows"]
+            if kind == "prefix" and k == "prefix" and term.startswith(base):
+                lo = bisect.bisect_left(keys, term)
+                hi = bisect.bisect_left(keys, term + "\uffff")
+                return rows[lo:hi]
+            if kind == "contains" and ((k == "contains" and base in term) or (k == "prefix" and base == "")):
+                return [r for key, r in zip(keys, rows) if term in key]
+    return None
+
+
+def _lookup(kind, term, city, limit):
+    now = time.monotonic()
+    rows = _local(kind, city, term, limit, now)
+    if rows is not None:
+        return rows[:limit]
+    return _store(kind, city, term, _query(kind, term, city, limit), limit, now)["rows"]
+
+
+def search_schools(text, city=None, limit=None):
+    """
+    Up to `limit` schools matching `text`: name prefix matches first, then
+    names containing it (for 3+ characters). Optionally restricted to a city.
+    """
+    limit = limit or SCHOOL_SEARCH_LIMIT
+    term = normalize(text)
+    city = normalize(city) or None
+
+    rows = list(_lookup("prefix", term, city, limit))
+    if len(rows) < limit and len(term) >= 3:
+        seen = {r["id"] for r in rows}
+        for r in _lookup("contains", term, city, limit):
+            if r["id"] not in seen:
+                rows.append(r)
+                if len(rows) >= limit:
+                    break
+    return rows
+
+
+def find_schools(names, client=None, chunk_size=100):
+    """Schools whose name is exactly one of `names`, in one query per chunk_size names."""
+    supabase = client or get_supabase()
+    names = sorted({n for n in names if n})
+    rows = []
+    for i in range(0, len(names), chunk_size):
+        rows += (
+            supabase.table("schools").select(SCHOOL_COLUMNS).in_("name", names[i:i + chunk_size]).execute()
+        ).data or []
+    return rows
+
+
+def add_school(name, city, client=None):
+    """Inserts a school and drops cached searches so it shows up immediately."""
+    supabase = client or get_supabase()
+    res = supabase.table("schools").insert({"name": name, "city": city, "is_active": True}).execute()
+    invalidate()
+    return (res.data or [None])[0]
+
+
+def invalidate():
+    with _lock:
+        _index.clear()
@@ -0,0 +1,53 @@
+-- db/sql/001_commit_bookings.sql
+-- Optimistic-concurrency commit for bookings.
+--
+-- Every booking date has a version counter. The app reads the versions of
+-- the dates it is about to book, allocates against a snapshot taken AFTER
+-- that read, and calls commit_bookings() with the versions it saw. The
+-- function bumps each version only if it is unchanged, and inserts the rows
+-- in the same transaction. If another writer committed first, nothing is
+-- inserted, an empty set is returned and the app re-runs allocation.
+
+create table if not exists public.booking_day_versions (
+    date date primary key,
+    version bigint not null default 0
+);
+
+create or replace function public.commit_bookings(p_expected jsonb, p_rows jsonb)
+returns setof public.bookings
+language plpgsql
+as $$
+declare
+    d text;
+    v bigint;
+begin
+    -- p_expected: {"YYYY-MM-DD": version, ...}
+    for d, v in select key, value::bigint from jsonb_each_text(p_expected) order by key loop
+        insert into public.booking_day_versions (date, version)
+        values (d::date, 0)
+        on conflict (date) do nothing;
+
+        update public.booking_day_versions
+        set version = version + 1
+        where date = d::date and version = v;
+
+        if not found then
+            -- Another submission committed this date first; undo earlier bumps.
+            raise exception using errcode = 'P0001', message = 'booking_version_conflict';
+        end if;
+    end loop;
+
+    return query
+    insert into public.bookings (
+        school_id, salesperson_id, subject_id, slot_id, session_type_id, date,
+        city, class_name, grade_of_school, curriculum, topic, title_name, notes,
+        rp_id, status, tab_type
+    )
+    select
+        school_id, salesperson_id, subject_id, slot_id, session_type_id, date,
+        city, class_name, grade_of_school, curriculum, topic, title_name, notes,
+        rp_id, coalesce(status, 'Pending'), tab_type
+    from jsonb_populate_recordset(null::public.bookings, p_rows)
+    returning *;
+end;
+$$;
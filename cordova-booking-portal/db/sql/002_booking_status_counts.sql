@@ -0,0 +1,27 @@
+-- db/sql/002_booking_status_counts.sql
+-- Grouped status counts for dashboards: one row per (bucket, status).
+--
+-- p_buckets: [{"name": "today", "from": "2026-01-05", "to": "2026-01-05"},
+--             {"name": "all", "from": null, "to": null}, ...]
+-- A null bound leaves that side of the date range open. Buckets may overlap.
+
+create or replace function public.booking_status_counts(
+    p_buckets jsonb,
+    p_salesperson_id uuid default null,
+    p_rp_id uuid default null,
+    p_session_type_ids uuid[] default null
+)
+returns table (bucket text, status text, n bigint)
+language sql
+stable
+as $$
+    select b.name, bk.status, count(*)
+    from jsonb_to_recordset(p_buckets) as b(name text, "from" date, "to" date)
+    join public.bookings bk
+      on (b."from" is null or bk.date >= b."from")
+     and (b."to" is null or bk.date <= b."to")
+    where (p_salesperson_id is null or bk.salesperson_id = p_salesperson_id)
+      and (p_rp_id is null or bk.rp_id = p_rp_id)
+      and (p_session_type_ids is null or bk.session_type_id = any (p_session_type_ids))
+    group by b.name, bk.status;
+$$;
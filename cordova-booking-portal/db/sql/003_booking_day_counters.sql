@@ -0,0 +1,115 @@
+-- db/sql/003_booking_day_counters.sql
+-- Per-day occupancy rollup kept in sync with bookings by trigger.
+--
+-- One row per (date, kind, key1, key2) counting bookings in a blocking
+-- status (Pending / Approved / Scheduled / Completed):
+--   slot             key1 = slot_id
+--   school           key1 = school_id
+--   rp               key1 = rp_id
+--   rp_subject       key1 = rp_id, key2 = subject_id
+--   rp_session_type  key1 = rp_id, key2 = session_type_id
+--   rp_slot          key1 = rp_id, key2 = slot_id
+-- key2 uses the nil UUID when unused so it can be part of the primary key.
+--
+-- Check / repair from the app folder:
+--   python -m scripts.rollup verify --from 2026-01-01 --to 2026-12-31
+--   python -m scripts.rollup rebuild --from 2026-01-01 --to 2026-12-31
+
+create table if not exists public.booking_day_counters (
+    date date not null,
+    kind text not null,
+    key1 uuid not null,
+    key2 uuid not null default '00000000-0000-0000-0000-000000000000',
+    n integer not null default 0,
+    primary key (date, kind, key1, key2)
+);
+
+create or replace function public._bump_day_counter(
+    p_date date, p_kind text, p_key1 uuid, p_key2 uuid, p_delta integer
+) returns void
+language sql
+as $$
+    insert into public.booking_day_counters (date, kind, key1, key2, n)
+    select p_date, p_kind, p_key1, coalesce(p_key2, '00000000-0000-0000-0000-000000000000'), p_delta
+    where p_key1 is not null
+    on conflict (date, kind, key1, key2)
+    do update set n = public.booking_day_counters.n + excluded.n;
+$$;
+
+create or replace function public._bump_day_counters(b public.bookings, p_delta integer)
+returns void
+language plpgsql
+as $$
+begin
+    if b.status is null or b.status not in ('Pending', 'Approved', 'Scheduled', 'Completed') then
+        return;
+    end if;
+    perform public._bump_day_counter(b.date, 'slot', b.slot_id, null, p_delta);
+    perform public._bump_day_counter(b.date, 'school', b.school_id, null, p_delta);
+    if b.rp_id is not null then
+        perform public._bump_day_counter(b.date, 'rp', b.rp_id, null, p_delta);
+        perform public._bump_day_counter(b.date, 'rp_subject', b.rp_id, b.subject_id, p_delta);
+        perform public._bump_day_counter(b.date, 'rp_session_type', b.rp_id, b.session_type_id, p_delta);
+        perform public._bump_day_counter(b.date, 'rp_slot', b.rp_id, b.slot_id, p_delta);
+    end if;
+end;
+$$;
+
+create or replace function public._bookings_day_counters_trg()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public._bump_day_counters(old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public._bump_day_counters(new, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists bookings_day_counters on public.bookings;
+create trigger bookings_day_counters
+after insert or update or delete on public.bookings
+for each row execute function public._bookings_day_counters_trg();
+
+-- Recomputes the rollup for [p_from, p_to] (null = unbounded) from bookings.
+create or replace function public.rebuild_booking_day_counters(p_from date default null, p_to date default null)
+returns integer
+language plpgsql
+as $$
+declare
+    inserted integer;
+begin
+    delete from public.booking_day_counters
+    where (p_from is null or date >= p_from) and (p_to is null or date <= p_to);
+
+    insert into public.booking_day_counters (date, kind, key1, key2, n)
+    select date, kind, key1, coalesce(key2, '00000000-0000-0000-0000-000000000000'), count(*)
+    from (
+        select b.date, k.kind, k.key1, k.key2
+        from public.bookings b
+        cross join lateral (values
+            ('slot', b.slot_id, null::uuid),
+            ('school', b.school_id, null::uuid),
+            ('rp', b.rp_id, null::uuid),
+            ('rp_subject', b.rp_id, b.subject_id),
+            ('rp_session_type', b.rp_id, b.session_type_id),
+            ('rp_slot', b.rp_id, b.slot_id)
+        ) as k(kind, key1, key2)
+        where b.status in ('Pending', 'Approved', 'Scheduled', 'Completed')
+          and (p_from is null or b.date >= p_from)
+          and (p_to is null or b.date <= p_to)
+          and k.key1 is not null
+    ) t
+    group by date, kind, key1, key2;
+
+    get diagnostics inserted = row_count;
+    return inserted;
+end;
+$$;
+
+-- Backfill existing bookings
+select public.rebuild_booking_day_counters();
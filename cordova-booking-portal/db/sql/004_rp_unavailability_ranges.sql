@@ -0,0 +1,20 @@
+-- db/sql/004_rp_unavailability_ranges.sql
+-- Multi-day absences: a row covers [date, end_date]; end_date null means the
+-- single day `date` (existing rows keep working unchanged).
+--
+-- db/absences.py loads every absence overlapping a window with
+--   date <= :end and (end_date >= :start or (end_date is null and date >= :start))
+
+alter table public.rp_unavailability
+    add column if not exists end_date date;
+
+alter table public.rp_unavailability
+    drop constraint if exists rp_unavailability_end_after_start;
+alter table public.rp_unavailability
+    add constraint rp_unavailability_end_after_start
+    check (end_date is null or end_date >= date);
+
+create index if not exists rp_unavailability_date_idx
+    on public.rp_unavailability (date, end_date);
+create index if not exists rp_unavailability_rp_date_idx
+    on public.rp_unavailability (rp_id, date);
@@ -0,0 +1,18 @@
+-- db/sql/005_schools_search.sql
+-- Indexes behind the booking form's school typeahead (db/schools.py):
+--   name ilike 'term%' and name ilike '%term%'  -> trigram index (pg_trgm)
+--   city ilike :city                            -> trigram index on city
+-- Both shapes are served by gin_trgm_ops; a btree on lower(name) would never
+-- be used for an ILIKE on the bare column. Terms shorter than three
+-- characters cannot use a trigram index and scan (schools is small).
+
+create extension if not exists pg_trgm;
+
+-- Created by an earlier version of this file and never used by the queries
+drop index if exists public.schools_name_lower_prefix_idx;
+drop index if exists public.schools_city_name_idx;
+
+create index if not exists schools_name_trgm_idx
+    on public.schools using gin (name gin_trgm_ops);
+create index if not exists schools_city_trgm_idx
+    on public.schools using gin (city gin_trgm_ops);
@@ -0,0 +1,17 @@
+-- db/sql/006_pending_feedback.sql
+-- Completed bookings that have no feedback yet, for the salesperson Feedback
+-- tab (db/feedback.py). The view keeps the bookings columns, so PostgREST can
+-- still embed subject/school/RP/slot/session type through the bookings FKs.
+
+create or replace view public.pending_feedback_bookings
+with (security_invoker = true) as
+select b.*
+from public.bookings b
+left join public.feedback f on f.booking_id = b.id
+where b.status = 'Completed'
+  and f.id is null;
+
+create index if not exists feedback_booking_id_idx
+    on public.feedback (booking_id);
+create index if not exists bookings_salesperson_status_date_idx
+    on public.bookings (salesperson_id, status, date desc, id desc);
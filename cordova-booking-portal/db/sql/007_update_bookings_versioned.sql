@@ -0,0 +1,46 @@
+-- db/sql/007_update_bookings_versioned.sql
+-- Optimistic-concurrency update for admin moderation (db/moderation.py).
+--
+-- Same protocol as commit_bookings() (001): the app reads the versions of
+-- every date a batch of edits touches (old and new dates of moved bookings),
+-- validates against a snapshot taken after that read, and sends the versions
+-- it saw. Each version is bumped only if unchanged, and the updates run in
+-- the same transaction, so a concurrent commit_bookings() on those dates
+-- fails its own version check instead of double-booking.
+--
+-- p_updates: [{"ids": [uuid, ...], "values": {"status"?, "date"?, "slot_id"?}}, ...]
+
+create or replace function public.update_bookings_versioned(p_expected jsonb, p_updates jsonb)
+returns setof public.bookings
+language plpgsql
+as $$
+declare
+    d text;
+    v bigint;
+    u jsonb;
+begin
+    for d, v in select key, value::bigint from jsonb_each_text(p_expected) order by key loop
+        insert into public.booking_day_versions (date, version)
+        values (d::date, 0)
+        on conflict (date) do nothing;
+
+        update public.booking_day_versions
+        set version = version + 1
+        where date = d::date and version = v;
+
+        if not found then
+            raise exception using errcode = 'P0001', message = 'booking_version_conflict';
+        end if;
+    end loop;
+
+    for u in select value from jsonb_array_elements(p_updates) loop
+        return query
+        update public.bookings b
+        set status = coalesce(u->'values'->>'status', b.status),
+            date = coalesce((u->'values'->>'date')::date, b.date),
+            slot_id = coalesce((u->'values'->>'slot_id')::uuid, b.slot_id)
+        where b.id in (select value::uuid from jsonb_array_elements_text(u->'ids'))
+        returning b.*;
+    end loop;
+end;
+$$;
@@ -0,0 +1,45 @@
+-- db/sql/008_commit_bookings_client_ids.sql
+-- commit_bookings() (001) accepting client-generated booking ids.
+--
+-- assign_rp_bulk() sends an id with every row so it can match the returned
+-- rows to its requests by id instead of relying on RETURNING order. Rows
+-- without an id (book_session) still get one from gen_random_uuid().
+
+create or replace function public.commit_bookings(p_expected jsonb, p_rows jsonb)
+returns setof public.bookings
+language plpgsql
+as $$
+declare
+    d text;
+    v bigint;
+begin
+    -- p_expected: {"YYYY-MM-DD": version, ...}
+    for d, v in select key, value::bigint from jsonb_each_text(p_expected) order by key loop
+        insert into public.booking_day_versions (date, version)
+        values (d::date, 0)
+        on conflict (date) do nothing;
+
+        update public.booking_day_versions
+        set version = version + 1
+        where date = d::date and version = v;
+
+        if not found then
+            -- Another submission committed this date first; undo earlier bumps.
+            raise exception using errcode = 'P0001', message = 'booking_version_conflict';
+        end if;
+    end loop;
+
+    return query
+    insert into public.bookings (
+        id, school_id, salesperson_id, subject_id, slot_id, session_type_id, date,
+        city, class_name, grade_of_school, curriculum, topic, title_name, notes,
+        rp_id, status, tab_type
+    )
+    select
+        coalesce(id, gen_random_uuid()), school_id, salesperson_id, subject_id, slot_id, session_type_id, date,
+        city, class_name, grade_of_school, curriculum, topic, title_name, notes,
+        rp_id, coalesce(status, 'Pending'), tab_type
+    from jsonb_populate_recordset(null::public.bookings, p_rows)
+    returning *;
+end;
+$$;
@@ -0,0 +1,30 @@
+-- db/sql/009_table_versions.sql
+-- Change markers for process-wide caches.
+--
+-- A statement-level trigger bumps table_versions.version for a table on
+-- every insert/update/delete, whichever app process (or the dashboard) made
+-- the change. db/absences.py reads the rp_unavailability row (one primary
+-- key lookup) before serving its cache and drops the cache when the number
+-- moved, so an absence recorded by another worker is seen immediately.
+
+create table if not exists public.table_versions (
+    name text primary key,
+    version bigint not null default 0
+);
+
+create or replace function public._bump_table_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into public.table_versions (name, version)
+    values (tg_table_name, 1)
+    on conflict (name) do update set version = public.table_versions.version + 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists rp_unavailability_table_version on public.rp_unavailability;
+create trigger rp_unavailability_table_version
+after insert or update or delete on public.rp_unavailability
+for each statement execute function public._bump_table_version();
@@ -1,12 +1,16 @@
 # pages/2_Salesperson.py
 import streamlit as st
 import pandas as pd
+from collections import Counter
 from datetime import date, timedelta
 
 from config.settings import SESSION_KEYS
 from db.connection import get_supabase
+from db import availability_cache, booking_import, feedback, reference, schools
+from db.aggregates import status_counts
+from db.bookings import DEFAULT_EMBEDS, fetch_bookings_page
 from utils.auth import logout
-from db.allocation import assign_rp, available_slots_summary
+from db.allocation import BookingConflictError, book_session
 
 
 def show_db_error(e: Exception, title: str = "Supabase query failed."):
@@ -48,35 +52,33 @@ with st.sidebar:
         logout()
         st.rerun()
 
-tabs = st.tabs(["Home", "My Bookings", "New Booking", "Feedback"])
+# Only the selected section runs (st.tabs would execute all of them every rerun),
+# and each section is a fragment so its widgets rerun just that section.
+SECTIONS = ["Home", "My Bookings", "New Booking", "Bulk Import", "Feedback"]
+section = st.radio("Section", SECTIONS, horizontal=True, key="sp_section", label_visibility="collapsed")
 
 # -------------------------
-# TAB 1: HOME
+# SECTION 1: HOME
 # -------------------------
-with tabs[0]:
+@st.fragment
+def section_home():
     st.subheader("Summary")
     today_str = str(date.today())
 
     try:
-        res = (
-            supabase.table("bookings")
-            .select("id, status, date, session_type_id")
-            .eq("salesperson_id", salesperson_id)
-            .execute()
+        counts = status_counts(
+            {"today": (today_str, today_str), "all": (None, None)},
+            salesperson_id=salesperson_id,
         )
-        all_bookings = res.data or []
     except Exception as e:
         show_db_error(e, "Unable to load bookings.")
-        all_bookings = []
-
-    def count_where(fn):
-        return sum(1 for b in all_bookings if fn(b))
+        counts = {"today": Counter(), "all": Counter()}
 
-    today_bookings = count_where(lambda b: b.get("date") == today_str)
-    pending = count_where(lambda b: b.get("status") == "Pending")
-    approved = count_where(lambda b: b.get("status") == "Approved")
-    completed = count_where(lambda b: b.get("status") == "Completed")
-    rejected_cancelled = count_where(lambda b: b.get("status") in ["Rejected", "Cancelled"])
+    today_bookings = sum(counts["today"].values())
+    pending = counts["all"]["Pending"]
+    approved = counts["all"]["Approved"]
+    completed = counts["all"]["Completed"]
+    rejected_cancelled = counts["all"]["Rejected"] + counts["all"]["Cancelled"]
 
     col1, col2, col3, col4, col5 = st.columns(5)
     col1.metric("Today's Bookings", today_bookings)
@@ -88,7 +90,18 @@ with tabs[0]:
     st.divider()
     st.subheader("Notifications (basic)")
 
-    last10 = sorted(all_bookings, key=lambda x: x.get("date", ""), reverse=True)[:10]
+    try:
+        last10 = (
+            supabase.table("bookings")
+            .select("id, status, date")
+            .eq("salesperson_id", salesperson_id)
+            .order("date", desc=True)
+            .limit(10)
+            .execute()
+        ).data or []
+    except Exception as e:
+        show_db_error(e, "Unable to load notifications.")
+        last10 = []
     if not last10:
         st.info("No notifications yet.")
     else:
@@ -98,9 +111,12 @@ with tabs[0]:
             )
 
 # -------------------------
-# TAB 2: MY BOOKINGS
+# SECTION 2: MY BOOKINGS
 # -------------------------
-with tabs[1]:
+MY_BOOKINGS_PAGE_SIZE = 50
+
+@st.fragment
+def section_my_bookings():
     st.subheader("My Bookings")
 
     fcol1, fcol2, fcol3 = st.columns(3)
@@ -128,9 +144,7 @@ with tabs[1]:
     subjects = []
     if subject_filter_on:
         try:
-            subjects = (
-                supabase.table("subjects").select("id,name").order("name").execute()
-            ).data or []
+            subjects = reference.get_rows("subjects")
         except Exception as e:
             show_db_error(e, "Unable to load subjects.")
             subjects = []
@@ -143,364 +157,490 @@ with tabs[1]:
             match = [s for s in subjects if s["name"] == chosen_subject]
             subject_id_filter = match[0]["id"] if match else None
 
-    rows = []
+    today = date.today()
+    date_window = {
+        "All": (None, None),
+        "Today": (today, today),
+        "Tomorrow": (today + timedelta(days=1), today + timedelta(days=1)),
+        "This Week": (today, today + timedelta(days=7)),
+    }[filter_range]
+    filters = {
+        "salesperson_id": salesperson_id,
+        "date_from": date_window[0],
+        "date_to": date_window[1],
+        "status": filter_status,
+        "subject_id": subject_id_filter,
+    }
+
+    # cursors[i] is the keyset cursor that starts page i; reset when filters change
+    signature = tuple(sorted((k, str(v)) for k, v in filters.items()))
+    if st.session_state.get("mybookings_signature") != signature:
+        st.session_state["mybookings_signature"] = signature
+        st.session_state["mybookings_cursors"] = [None]
+    cursors = st.session_state["mybookings_cursors"]
+    page = len(cursors) - 1
+
     try:
-        res = (
-            supabase.table("bookings")
-            .select(
-                """
-                id, date, status, topic, title_name,
-                session_type_id, subject_id, slot_id, school_id, rp_id
-                """
-            )
-            .eq("salesperson_id", salesperson_id)
-            .order("date", desc=True)
-            .execute()
+        rows, next_cursor = fetch_bookings_page(
+            filters,
+            after=cursors[-1],
+            page_size=MY_BOOKINGS_PAGE_SIZE,
+            columns="list",
+            embeds=DEFAULT_EMBEDS,
         )
-        rows = res.data or []
     except Exception as e:
         show_db_error(e, "Unable to load your bookings.")
-        rows = []
-
-    def in_range(d):
-        if filter_range == "All":
-            return True
-        if not d:
-            return False
-        dd = date.fromisoformat(d)
-        if filter_range == "Today":
-            return dd == date.today()
-        if filter_range == "Tomorrow":
-            return dd == date.today() + timedelta(days=1)
-        if filter_range == "This Week":
-            return date.today() <= dd <= date.today() + timedelta(days=7)
-        return True
-
-    filtered = [r for r in rows if in_range(r.get("date"))]
-
-    if filter_status != "All":
-        filtered = [r for r in filtered if r.get("status") == filter_status]
-
-    if subject_id_filter:
-        filtered = [r for r in filtered if r.get("subject_id") == subject_id_filter]
-
-    if not filtered:
+        return
+
+    if not rows:
         st.info("No bookings found for selected filters.")
+        if page == 0:
+            return
     else:
-        df = pd.DataFrame(filtered)
-
-        try:
-            subjects = supabase.table("subjects").select("id,name").execute().data or []
-            schools = supabase.table("schools").select("id,name").execute().data or []
-            rps = (
-                supabase.table("resource_persons")
-                .select("id,display_name")
-                .execute()
-                .data
-                or []
-            )
-            session_types = (
-                supabase.table("session_types").select("id,name").execute().data or []
-            )
-            slots = (
-                supabase.table("slots")
-                .select("id,start_time,end_time")
-                .execute()
-                .data
-                or []
-            )
-        except Exception as e:
-            show_db_error(e, "Unable to load lookup tables.")
-        else:
-            subject_map = {s["id"]: s["name"] for s in subjects}
-            school_map = {s["id"]: s["name"] for s in schools}
-            rp_map = {r["id"]: r["display_name"] for r in rps}
-            st_map = {t["id"]: t["name"] for t in session_types}
-            slot_map = {sl["id"]: f'{sl["start_time"]} - {sl["end_time"]}' for sl in slots}
-
-            df["Subject"] = df["subject_id"].map(subject_map)
-            df["School"] = df["school_id"].map(school_map)
-            df["RP"] = df["rp_id"].map(rp_map)
-            df["Session Type"] = df["session_type_id"].map(st_map)
-            df["Slot"] = df["slot_id"].map(slot_map)
-
-            show_cols = [
-                "date",
-                "Slot",
-                "Subject",
-                "School",
-                "Session Type",
-                "topic",
-                "title_name",
-                "RP",
-                "status",
-                "id",
-            ]
-            show_cols = [c for c in show_cols if c in df.columns]
-            st.dataframe(df[show_cols], use_container_width=True)
+        df = pd.DataFrame(rows)
+
+        show_cols = [
+            "date",
+            "Slot",
+            "Subject",
+            "School",
+            "Session Type",
+            "topic",
+            "title_name",
+            "RP",
+            "status",
+            "id",
+        ]
+        show_cols = [c for c in show_cols if c in df.columns]
+        st.dataframe(df[show_cols], use_container_width=True)
+
+    if page > 0 or next_cursor is not None:
+        p1, p2, p3 = st.columns([1, 2, 1])
+        with p1:
+            st.button("◀ Previous", disabled=page == 0, use_container_width=True, key="mybookings_prev",
+                      on_click=cursors.pop)
+        with p2:
+            st.caption(f"Page {page + 1} · {len(rows)} rows")
+        with p3:
+            st.button("Next ▶", disabled=next_cursor is None, use_container_width=True, key="mybookings_next",
+                      on_click=cursors.append, args=(next_cursor,))
 
 # -------------------------
-# TAB 3: NEW BOOKING
+# SECTION 3: NEW BOOKING
 # -------------------------
-with tabs[2]:
-    st.subheader("New Booking")
-    subtab = st.tabs(["Creative Kids", "Little Genius"])
+CALENDAR_DAYS = 14
+
+def _pick_open_slot(prefix: str, options: dict):
+    picked = options.get(st.session_state.get(f"{prefix}_calendar_pick"))
+    if picked:
+        st.session_state[f"{prefix}_date"] = picked[0]
+        st.session_state[f"{prefix}_slot"] = picked[1]
+
+def _heat_color(v):
+    if v <= 0:
+        return "background-color: #f8d7da"
+    if v == 1:
+        return "background-color: #fff3cd"
+    return "background-color: #d4edda"
+
+def availability_heatmap(prefix: str, subject_id, session_type_id, slot_label_map: dict):
+    start = date.today()
+    end = start + timedelta(days=CALENDAR_DAYS - 1)
+    try:
+        cal = availability_cache.calendar(subject_id, session_type_id, start, end)
+    except Exception as e:
+        show_db_error(e, "Availability calendar failed.")
+        return
+
+    if not cal["slots"]:
+        st.info("No active slots.")
+        return
+
+    slot_labels = [f'{s["start_time"]} - {s["end_time"]}' for s in cal["slots"]]
+    # A cell is bookable only if the slot has parallel capacity left and an RP is free
+    open_counts = [
+        [min(p, r) for p, r in zip(poss, rem)]
+        for poss, rem in zip(cal["possible_rps"], cal["remaining_parallel"])
+    ]
+    df_cal = pd.DataFrame(open_counts, index=cal["dates"], columns=slot_labels).T
+    df_cal.columns = [date.fromisoformat(d).strftime("%a %d %b") for d in cal["dates"]]
+
+    st.caption("Open bookings per slot (RPs free, capped by remaining parallel capacity).")
+    st.dataframe(df_cal.style.map(_heat_color), use_container_width=True)
+
+    options = {}
+    for i, d in enumerate(cal["dates"]):
+        for j, label in enumerate(slot_labels):
+            if open_counts[i][j] > 0 and label in slot_label_map:
+                options[f"{d} | {label} ({open_counts[i][j]} open)"] = (date.fromisoformat(d), label)
+
+    if not options:
+        st.warning("No open slots in the next two weeks for this subject/type.")
+        return
+
+    st.selectbox(
+        "Pick an open slot",
+        ["Select"] + list(options.keys()),
+        key=f"{prefix}_calendar_pick",
+        on_change=_pick_open_slot,
+        args=(prefix, options),
+    )
+
+@st.fragment
+def booking_form(tab_name: str):
+    prefix = tab_name.replace(" ", "_").lower()
+    st.markdown(f"### {tab_name} Booking Form")
 
-    def booking_form(tab_name: str):
-        prefix = tab_name.replace(" ", "_").lower()
-        st.markdown(f"### {tab_name} Booking Form")
+    try:
+        subjects = reference.get_rows("subjects")
+        slots = reference.get_rows("slots")
+        session_types = reference.get_rows("session_types")
+    except Exception as e:
+        show_db_error(e, "Unable to load dropdown data for booking form.")
+        return
+
+    if not subjects:
+        st.warning("No subjects found in DB.")
+        return
+    if not slots:
+        st.warning("No slots found in DB.")
+        return
+    if not session_types:
+        st.warning("No session types found in DB.")
+        return
+
+    subject_map = {s["name"]: s["id"] for s in subjects}
+    slot_label_map = {f'{s["start_time"]} - {s["end_time"]}': s["id"] for s in slots}
+    session_map = {s["name"]: s["id"] for s in session_types}
+
+    search_col, city_col = st.columns([2, 1])
+    school_search = search_col.text_input(
+        "Search School", placeholder="Type the start of the school name", key=f"{prefix}_school_search"
+    )
+    school_city_filter = city_col.text_input("In City", placeholder="Any", key=f"{prefix}_school_city_filter")
+    try:
+        school_matches = schools.search_schools(school_search, city=school_city_filter.strip() or None)
+    except Exception as e:
+        show_db_error(e, "Unable to search schools.")
+        return
 
-        try:
-            subjects = supabase.table("subjects").select("id,name").order("name").execute().data or []
-            slots = supabase.table("slots").select("id,start_time,end_time,duration_minutes").order("start_time").execute().data or []
-            session_types = supabase.table("session_types").select("id,name,duration_minutes").order("name").execute().data or []
-            schools = supabase.table("schools").select("id,name,city").order("name").execute().data or []
-        except Exception as e:
-            show_db_error(e, "Unable to load dropdown data for booking form.")
-            return
+    school_labels = {
+        (f'{sc["name"]} ({sc["city"]})' if sc.get("city") else sc["name"]): sc["id"] for sc in school_matches
+    }
+    school_names = ["Select School"] + list(school_labels) + ["➕ Add New School"]
+    school_choice = st.selectbox("School Name*", school_names, key=f"{prefix}_school")
+    if school_search and not school_matches:
+        st.caption("No matching schools; pick \"➕ Add New School\" to add it.")
 
-        if not subjects:
-            st.warning("No subjects found in DB.")
-            return
-        if not slots:
-            st.warning("No slots found in DB.")
-            return
-        if not session_types:
-            st.warning("No session types found in DB.")
-            return
+    new_school_name = ""
+    new_school_city = ""
+    if school_choice == "➕ Add New School":
+        new_school_name = st.text_input("New School Name*", key=f"{prefix}_new_school_name")
+        new_school_city = st.text_input("City*", key=f"{prefix}_new_school_city")
 
-        subject_map = {s["name"]: s["id"] for s in subjects}
-        slot_label_map = {f'{s["start_time"]} - {s["end_time"]}': s["id"] for s in slots}
-        session_map = {s["name"]: s["id"] for s in session_types}
+    city = st.text_input("City*", value=new_school_city if new_school_city else "", key=f"{prefix}_city")
 
-        school_names = ["Select School"] + [sc["name"] for sc in schools] + ["➕ Add New School"]
-        school_choice = st.selectbox("School Name*", school_names, key=f"{prefix}_school")
+    # Seeded via session state so the availability calendar can set it
+    st.session_state.setdefault(f"{prefix}_date", date.today())
+    booking_date = st.date_input("Date*", key=f"{prefix}_date")
 
-        new_school_name = ""
-        new_school_city = ""
-        if school_choice == "➕ Add New School":
-            new_school_name = st.text_input("New School Name*", key=f"{prefix}_new_school_name")
-            new_school_city = st.text_input("City*", key=f"{prefix}_new_school_city")
+    subject_name = st.selectbox("Subject*", ["Select Subject"] + list(subject_map.keys()), key=f"{prefix}_subject")
+    session_name = st.selectbox("Session Type*", ["Select Type"] + list(session_map.keys()), key=f"{prefix}_session_type")
 
-        city = st.text_input("City*", value=new_school_city if new_school_city else "", key=f"{prefix}_city")
+    if subject_name != "Select Subject" and session_name != "Select Type":
+        try:
+            # Load the heatmap window in one go so the summary below is a cache hit
+            if date.today() <= booking_date < date.today() + timedelta(days=CALENDAR_DAYS):
+                availability_cache.calendar(
+                    subject_map[subject_name], session_map[session_name],
+                    date.today(), date.today() + timedelta(days=CALENDAR_DAYS - 1),
+                )
+            summary = availability_cache.slots_summary(
+                subject_map[subject_name],
+                str(booking_date),
+                session_map[session_name],
+            )
+            df_sum = pd.DataFrame(summary)
+            if not df_sum.empty:
+                df_sum["Slot"] = df_sum.apply(lambda r: f'{r["start_time"]} - {r["end_time"]}', axis=1)
+                df_sum = df_sum[["Slot", "remaining_parallel", "possible_rps"]]
+                df_sum.columns = ["Slot", "Remaining Parallel Capacity", "Possible RPs Available"]
+                st.info("Available slots for selected subject/date/type:")
+                st.dataframe(df_sum, use_container_width=True)
+        except Exception as e:
+            show_db_error(e, "Slot availability check failed.")
+
+        with st.expander("📅 Availability for the next two weeks"):
+            availability_heatmap(
+                prefix,
+                subject_map[subject_name],
+                session_map[session_name],
+                slot_label_map,
+            )
 
-        booking_date = st.date_input("Date*", value=date.today(), key=f"{prefix}_date")
+    slot_label = st.selectbox("Slot*", ["Select Slot"] + list(slot_label_map.keys()), key=f"{prefix}_slot")
 
-        subject_name = st.selectbox("Subject*", ["Select Subject"] + list(subject_map.keys()), key=f"{prefix}_subject")
-        session_name = st.selectbox("Session Type*", ["Select Type"] + list(session_map.keys()), key=f"{prefix}_session_type")
+    class_name = st.text_input("Class*", placeholder="e.g., 1 / 2 / 3", key=f"{prefix}_class")
+    grade_of_school = st.text_input("Grade of School*", placeholder="Primary / Secondary etc.", key=f"{prefix}_grade")
+    curriculum = st.text_input("Curriculum*", placeholder="CBSE / ICSE / State etc.", key=f"{prefix}_curriculum")
 
-        if subject_name != "Select Subject" and session_name != "Select Type":
-            try:
-                summary = available_slots_summary(
-                    subject_map[subject_name],
-                    str(booking_date),
-                    session_map[session_name],
-                )
-                df_sum = pd.DataFrame(summary)
-                if not df_sum.empty:
-                    df_sum["Slot"] = df_sum.apply(lambda r: f'{r["start_time"]} - {r["end_time"]}', axis=1)
-                    df_sum = df_sum[["Slot", "remaining_parallel", "possible_rps"]]
-                    df_sum.columns = ["Slot", "Remaining Parallel Capacity", "Possible RPs Available"]
-                    st.info("Available slots for selected subject/date/type:")
-                    st.dataframe(df_sum, use_container_width=True)
-            except Exception as e:
-                show_db_error(e, "Slot availability check failed.")
-
-        slot_label = st.selectbox("Slot*", ["Select Slot"] + list(slot_label_map.keys()), key=f"{prefix}_slot")
-
-        class_name = st.text_input("Class*", placeholder="e.g., 1 / 2 / 3", key=f"{prefix}_class")
-        grade_of_school = st.text_input("Grade of School*", placeholder="Primary / Secondary etc.", key=f"{prefix}_grade")
-        curriculum = st.text_input("Curriculum*", placeholder="CBSE / ICSE / State etc.", key=f"{prefix}_curriculum")
-
-        topic = st.text_input("Topic*", placeholder="Mandatory for all", key=f"{prefix}_topic")
-        title_name = st.text_input("Title Name*", placeholder="Mandatory for all", key=f"{prefix}_title")
-        notes = st.text_area("Notes (optional)", key=f"{prefix}_notes")
-
-        if st.button(f"Submit {tab_name} Booking", use_container_width=True, key=f"{prefix}_submit"):
-            if school_choice == "Select School":
-                st.error("Please select or add a school.")
-                return
-            if school_choice == "➕ Add New School" and (not new_school_name or not city):
-                st.error("Please enter new school name and city.")
-                return
-            if subject_name == "Select Subject":
-                st.error("Please select subject.")
-                return
-            if session_name == "Select Type":
-                st.error("Please select session type.")
-                return
-            if slot_label == "Select Slot":
-                st.error("Please select slot.")
-                return
-            if not class_name or not grade_of_school or not curriculum:
-                st.error("Class, grade, and curriculum are required.")
-                return
-            if not topic or not title_name:
-                st.error("Topic and Title Name are mandatory.")
-                return
+    topic = st.text_input("Topic*", placeholder="Mandatory for all", key=f"{prefix}_topic")
+    title_name = st.text_input("Title Name*", placeholder="Mandatory for all", key=f"{prefix}_title")
+    notes = st.text_area("Notes (optional)", key=f"{prefix}_notes")
 
-            try:
-                if school_choice == "➕ Add New School":
-                    sc_res = supabase.table("schools").insert(
-                        {"name": new_school_name, "city": city, "is_active": True}
-                    ).execute()
-                    school_id = (sc_res.data or [None])[0]["id"]
-                else:
-                    school_id = next(sc["id"] for sc in schools if sc["name"] == school_choice)
-
-                subject_id = subject_map[subject_name]
-                slot_id = slot_label_map[slot_label]
-                session_type_id = session_map[session_name]
-
-                rp_id = assign_rp(
-                    subject_id=subject_id,
-                    slot_id=slot_id,
-                    booking_date=str(booking_date),
-                    session_type_id=session_type_id,
-                    school_id=school_id,
-                )
+    if st.button(f"Submit {tab_name} Booking", use_container_width=True, key=f"{prefix}_submit"):
+        if school_choice == "Select School":
+            st.error("Please select or add a school.")
+            return
+        if school_choice == "➕ Add New School" and (not new_school_name or not city):
+            st.error("Please enter new school name and city.")
+            return
+        if subject_name == "Select Subject":
+            st.error("Please select subject.")
+            return
+        if session_name == "Select Type":
+            st.error("Please select session type.")
+            return
+        if slot_label == "Select Slot":
+            st.error("Please select slot.")
+            return
+        if not class_name or not grade_of_school or not curriculum:
+            st.error("Class, grade, and curriculum are required.")
+            return
+        if not topic or not title_name:
+            st.error("Topic and Title Name are mandatory.")
+            return
+
+        try:
+            if school_choice == "➕ Add New School":
+                school_id = schools.add_school(new_school_name, city)["id"]
+                reference.invalidate("schools")
+            else:
+                school_id = school_labels[school_choice]
+
+            subject_id = subject_map[subject_name]
+            slot_id = slot_label_map[slot_label]
+            session_type_id = session_map[session_name]
+
+            booking_row = book_session(
+                {
+                    "school_id": school_id,
+                    "salesperson_id": salesperson_id,
+                    "subject_id": subject_id,
+                    "slot_id": slot_id,
+                    "session_type_id": session_type_id,
+                    "date": str(booking_date),
+                    "city": city,
+                    "class_name": class_name,
+                    "grade_of_school": grade_of_school,
+                    "curriculum": curriculum,
+                    "topic": topic,
+                    "title_name": title_name,
+                    "notes": notes,
+                    "status": "Pending",
+                    "tab_type": tab_name,
+                }
+            )
 
-                if not rp_id:
-                    st.error("No Resource Person available for this slot/subject. Try another slot.")
-                    return
-
-                insert_res = supabase.table("bookings").insert(
-                    {
-                        "school_id": school_id,
-                        "salesperson_id": salesperson_id,
-                        "subject_id": subject_id,
-                        "slot_id": slot_id,
-                        "session_type_id": session_type_id,
-                        "date": str(booking_date),
-                        "city": city,
-                        "class_name": class_name,
-                        "grade_of_school": grade_of_school,
-                        "curriculum": curriculum,
-                        "topic": topic,
-                        "title_name": title_name,
-                        "notes": notes,
-                        "rp_id": rp_id,
-                        "status": "Pending",
-                        "tab_type": tab_name,
-                    }
-                ).execute()
-
-                booking_row = (insert_res.data or [None])[0]
-                st.success("Booking submitted successfully! Status: Pending Approval")
-                st.write("Assigned RP ID:", rp_id)
-                st.write("Booking ID:", booking_row["id"])
-            except Exception as e:
-                show_db_error(e, "Booking submission failed.")
+            if not booking_row:
+                st.error("No Resource Person available for this slot/subject. Try another slot.")
                 return
 
-    with subtab[0]:
-        booking_form("Creative Kids")
+            st.success("Booking submitted successfully! Status: Pending Approval")
+            st.write("Assigned RP ID:", booking_row["rp_id"])
+            st.write("Booking ID:", booking_row["id"])
+        except BookingConflictError as e:
+            st.error(str(e))
+            return
+        except Exception as e:
+            show_db_error(e, "Booking submission failed.")
+            return
+
+def section_new_booking():
+    st.subheader("New Booking")
+    form_type = st.radio(
+        "Booking type", ["Creative Kids", "Little Genius"], horizontal=True, key="sp_booking_type"
+    )
+    booking_form(form_type)
 
-    with subtab[1]:
-        booking_form("Little Genius")
+# -------------------------
+# SECTION 4: BULK IMPORT
+# -------------------------
+@st.fragment
+def section_bulk_import():
+    st.subheader("Bulk Import")
+    st.caption(
+        "Upload a CSV or Excel sheet with one booking per row. Schools must already exist "
+        "(add new ones from the booking form first); slots can be given as their start time. "
+        "Dates must be YYYY-MM-DD or DD/MM/YYYY."
+    )
+    st.download_button(
+        "Download template", booking_import.template_csv(), "booking_import_template.csv",
+        mime="text/csv", key="import_template",
+    )
+
+    tab_type = st.radio("Booking type", ["Creative Kids", "Little Genius"], horizontal=True, key="import_tab_type")
+    upload = st.file_uploader("Bookings file", type=["csv", "xlsx"], key="import_file")
+    if upload is None:
+        return
+
+    # Parse and validate once per uploaded file, not on every rerun
+    if st.session_state.get("import_file_id") != upload.file_id:
+        st.session_state.pop("import_report", None)
+        try:
+            st.session_state["import_rows"] = booking_import.validate(booking_import.read_upload(upload, upload.name))
+        except booking_import.BookingImportError as e:
+            st.session_state.pop("import_rows", None)
+            st.error(str(e))
+            return
+        except Exception as e:
+            show_db_error(e, "Unable to read the uploaded file.")
+            return
+        st.session_state["import_file_id"] = upload.file_id
+
+    rows = st.session_state.get("import_rows")
+    if rows is None:
+        return
+    invalid = rows[rows["error"] != ""]
+    n_valid = len(rows) - len(invalid)
+
+    c1, c2 = st.columns(2)
+    c1.metric("Valid rows", n_valid)
+    c2.metric("Rows with errors", len(invalid))
+    if len(invalid):
+        st.dataframe(invalid[["row", "school", "date", "slot", "subject", "error"]], hide_index=True, use_container_width=True)
+
+    # One import per upload; re-submitting the same file would book every row twice
+    imported = st.session_state.get("import_report") is not None
+    if st.button(f"Import {n_valid} bookings", disabled=n_valid == 0 or imported, type="primary", key="import_submit"):
+        bar = st.progress(0.0, text="Allocating resource persons...")
+        try:
+            st.session_state["import_report"] = booking_import.import_bookings(
+                rows, salesperson_id, tab_type,
+                progress=lambda done, total: bar.progress(done / total, text=f"{done}/{total} rows processed"),
+            )
+        except Exception as e:
+            show_db_error(e, "Bulk import failed.")
+            return
+        finally:
+            bar.empty()
+
+    report = st.session_state.get("import_report")
+    if report is not None:
+        counts = report["status"].value_counts()
+        st.success(
+            " · ".join(f"{status}: {counts.get(status, 0)}" for status in (
+                booking_import.STATUS_BOOKED, booking_import.STATUS_REJECTED,
+                booking_import.STATUS_INVALID, booking_import.STATUS_CONFLICT,
+            ))
+        )
+        st.dataframe(report, hide_index=True, use_container_width=True)
+        st.download_button(
+            "Download report", report.to_csv(index=False), "booking_import_report.csv",
+            mime="text/csv", key="import_report_download",
+        )
 
 # -------------------------
-# TAB 4: FEEDBACK
+# SECTION 5: FEEDBACK
 # -------------------------
-with tabs[3]:
+FEEDBACK_PAGE_SIZE = 50
+
+@st.fragment
+def section_feedback():
     st.subheader("Submit Feedback (Completed Sessions)")
 
+    st.session_state.setdefault("fb_cursors", [None])
+    cursors = st.session_state["fb_cursors"]
+    page = len(cursors) - 1
+
     try:
-        completed_res = (
-            supabase.table("bookings")
-            .select(
-                """
-                id, date, status, topic, title_name,
-                subject_id, slot_id, school_id, session_type_id, rp_id
-                """
-            )
-            .eq("salesperson_id", salesperson_id)
-            .eq("status", "Completed")
-            .order("date", desc=True)
-            .execute()
+        pending_feedback, next_cursor = feedback.fetch_pending_feedback(
+            salesperson_id, after=cursors[-1], page_size=FEEDBACK_PAGE_SIZE
         )
-        completed_rows = completed_res.data or []
     except Exception as e:
-        show_db_error(e, "Unable to load completed bookings.")
-        completed_rows = []
+        show_db_error(e, "Unable to load completed sessions awaiting feedback.")
+        return
 
-    if not completed_rows:
-        st.info("No completed sessions yet.")
-    else:
+    if not pending_feedback and page > 0:
+        # The last rows of this page got feedback; step back instead of showing an empty page
+        cursors.pop()
+        st.rerun()
+
+    if not pending_feedback:
+        st.success("All completed sessions already have feedback submitted ✅")
+        return
+
+    if page > 0 or next_cursor is not None:
+        try:
+            st.caption(f"{feedback.count_pending_feedback(salesperson_id)} completed sessions awaiting feedback")
+        except Exception as e:
+            show_db_error(e, "Unable to count pending feedback.")
+
+    booking_options = [
+        f'{b["date"]} | {b["Slot"]} | {b["Subject"]} | {b["School"]} | {b["id"][:6]}'
+        for b in pending_feedback
+    ]
+    selected_label = st.selectbox(
+        "Select completed booking", booking_options, key="fb_booking_select"
+    )
+    selected_booking = pending_feedback[booking_options.index(selected_label)]
+
+    if page > 0 or next_cursor is not None:
+        p1, p2, p3 = st.columns([1, 2, 1])
+        with p1:
+            st.button("◀ Previous", disabled=page == 0, use_container_width=True, key="fb_prev",
+                      on_click=cursors.pop)
+        with p2:
+            st.caption(f"Page {page + 1}")
+        with p3:
+            st.button("Next ▶", disabled=next_cursor is None, use_container_width=True, key="fb_next",
+                      on_click=cursors.append, args=(next_cursor,))
+
+    st.markdown("### Booking Summary")
+    st.write("**School:**", selected_booking["School"])
+    st.write("**Subject:**", selected_booking["Subject"])
+    st.write("**Slot:**", selected_booking["Slot"])
+    st.write("**Session Type:**", selected_booking["Session Type"])
+    st.write("**RP:**", selected_booking["RP"])
+    st.write("**Topic:**", selected_booking.get("topic"))
+    st.write("**Title Name:**", selected_booking.get("title_name"))
+
+    st.divider()
+    st.markdown("### Feedback Form")
+
+    was_conducted = st.radio("Was the session conducted?", ["Yes", "No"], key="fb_conducted")
+    teacher_response_rating = st.slider("How was the teacher response?", 1, 5, 4, key="fb_teacher_rating")
+    engagement_rating = st.slider("How was the student engagement?", 1, 5, 4, key="fb_engagement_rating")
+    school_feedback = st.text_area("Did school share any feedback?", key="fb_school_feedback")
+    notes = st.text_area("Additional notes (optional)", key="fb_notes")
+
+    if st.button("✅ Submit Feedback", use_container_width=True, key="fb_submit_btn"):
         try:
-            fb_res = (
-                supabase.table("feedback")
-                .select("booking_id")
-                .eq("salesperson_id", salesperson_id)
-                .execute()
+            feedback.submit_feedback(
+                {
+                    "booking_id": selected_booking["id"],
+                    "salesperson_id": salesperson_id,
+                    "was_conducted": was_conducted,
+                    "teacher_response_rating": teacher_response_rating,
+                    "engagement_rating": engagement_rating,
+                    "school_feedback": school_feedback,
+                    "notes": notes,
+                }
             )
-            submitted_ids = {f["booking_id"] for f in (fb_res.data or [])}
+
+            st.success("Feedback submitted successfully ✅")
+            st.rerun()
         except Exception as e:
-            show_db_error(e, "Unable to load existing feedback.")
-            submitted_ids = set()
+            show_db_error(e, "Feedback submission failed.")
 
-        pending_feedback = [b for b in completed_rows if b["id"] not in submitted_ids]
 
-        if not pending_feedback:
-            st.success("All completed sessions already have feedback submitted ✅")
-        else:
-            try:
-                subjects = supabase.table("subjects").select("id,name").execute().data or []
-                schools = supabase.table("schools").select("id,name,city").execute().data or []
-                rps = supabase.table("resource_persons").select("id,display_name").execute().data or []
-                session_types = supabase.table("session_types").select("id,name").execute().data or []
-                slots = supabase.table("slots").select("id,start_time,end_time").execute().data or []
-            except Exception as e:
-                show_db_error(e, "Unable to load lookup tables.")
-            else:
-                subject_map = {s["id"]: s["name"] for s in subjects}
-                school_map = {s["id"]: s["name"] for s in schools}
-                rp_map = {r["id"]: r["display_name"] for r in rps}
-                st_map = {t["id"]: t["name"] for t in session_types}
-                slot_map = {sl["id"]: f'{sl["start_time"]} - {sl["end_time"]}' for sl in slots}
-
-                booking_options = [
-                    f'{b["date"]} | {slot_map.get(b["slot_id"])} | {subject_map.get(b["subject_id"])} | {school_map.get(b["school_id"])} | {b["id"][:6]}'
-                    for b in pending_feedback
-                ]
-                selected_label = st.selectbox(
-                    "Select completed booking", booking_options, key="fb_booking_select"
-                )
-                selected_booking = pending_feedback[booking_options.index(selected_label)]
-
-                st.markdown("### Booking Summary")
-                st.write("**School:**", school_map.get(selected_booking["school_id"]))
-                st.write("**Subject:**", subject_map.get(selected_booking["subject_id"]))
-                st.write("**Slot:**", slot_map.get(selected_booking["slot_id"]))
-                st.write("**Session Type:**", st_map.get(selected_booking["session_type_id"]))
-                st.write("**RP:**", rp_map.get(selected_booking["rp_id"]))
-                st.write("**Topic:**", selected_booking.get("topic"))
-                st.write("**Title Name:**", selected_booking.get("title_name"))
-
-                st.divider()
-                st.markdown("### Feedback Form")
-
-                was_conducted = st.radio("Was the session conducted?", ["Yes", "No"], key="fb_conducted")
-                teacher_response_rating = st.slider("How was the teacher response?", 1, 5, 4, key="fb_teacher_rating")
-                engagement_rating = st.slider("How was the student engagement?", 1, 5, 4, key="fb_engagement_rating")
-                school_feedback = st.text_area("Did school share any feedback?", key="fb_school_feedback")
-                notes = st.text_area("Additional notes (optional)", key="fb_notes")
-
-                if st.button("✅ Submit Feedback", use_container_width=True, key="fb_submit_btn"):
-                    try:
-                        supabase.table("feedback").insert(
-                            {
-                                "booking_id": selected_booking["id"],
-                                "salesperson_id": salesperson_id,
-                                "was_conducted": was_conducted,
-                                "teacher_response_rating": teacher_response_rating,
-                                "engagement_rating": engagement_rating,
-                                "school_feedback": school_feedback,
-                                "notes": notes,
-                            }
-                        ).execute()
-
-                        st.success("Feedback submitted successfully ✅")
-                        st.rerun()
-                    except Exception as e:
-                        show_db_error(e, "Feedback submission failed.")
+# -------------------------
+# RENDER SELECTED SECTION
+# -------------------------
+{
+    "Home": section_home,
+    "My Bookings": section_my_bookings,
+    "New Booking": section_new_booking,
+    "Bulk Import": section_bulk_import,
+    "Feedback": section_feedback,
+}[section]()
@@ -1,8 +1,20 @@
 import streamlit as st
 import pandas as pd
+import os
 from datetime import date
-from config.settings import SESSION_KEYS
+from config.settings import ALLOCATION_TRACE, FEEDBACK_REPORT_MONTHS, QUERY_INSTRUMENTATION, SESSION_KEYS
 from db.connection import get_supabase
+from db import allocation_trace, export, feedback_analytics, moderation, reference, schools
+from db.absences import fetch_absence_rows, record_absence
+from db.aggregates import BOOKING_STATUSES, status_counts
+from db.bookings import (
+    BOOKING_COLUMN_SETS,
+    bookings_query,
+    fetch_booking,
+    fetch_bookings_page,
+    flatten_bookings,
+)
+from db.fetch import fetch_parallel
 from utils.auth import logout
 
 st.title("Admin Dashboard")
@@ -33,7 +45,8 @@ tabs = st.tabs([
     "Bookings",
     "Feedback & Reports",
     "Teachers",
-    "RP Linking"
+    "RP Linking",
+    "Allocation Trace",
 ])
 
 def safe_tab(fn):
@@ -52,30 +65,43 @@ def tab_home():
 
     today_str = str(date.today())
 
-    today_rows = (
-        supabase.table("bookings")
-        .select("id, status, subject_id, rp_id, slot_id, session_type_id, school_id, date")
-        .eq("date", today_str)
-        .execute()
-    ).data or []
-
-    subjects = supabase.table("subjects").select("id,name").execute().data or []
-    rps = supabase.table("resource_persons").select("id,display_name").execute().data or []
-    slots = supabase.table("slots").select("id,start_time,end_time").execute().data or []
-    session_types = supabase.table("session_types").select("id,name").execute().data or []
-    schools = supabase.table("schools").select("id,name").execute().data or []
-
-    subject_map = {s["id"]: s["name"] for s in subjects}
-    rp_map = {r["id"]: r["display_name"] for r in rps}
-    slot_map = {sl["id"]: f'{sl["start_time"]} - {sl["end_time"]}' for sl in slots}
-    st_map = {t["id"]: t["name"] for t in session_types}
-    school_map = {sc["id"]: sc["name"] for sc in schools}
-
-    total_today = len(today_rows)
-    pending_today = sum(1 for b in today_rows if b.get("status") == "Pending")
-    approved_today = sum(1 for b in today_rows if b.get("status") == "Approved")
-    rejected_today = sum(1 for b in today_rows if b.get("status") == "Rejected")
-    cancelled_today = sum(1 for b in today_rows if b.get("status") == "Cancelled")
+    # Independent queries run concurrently; each section unwraps its own result.
+    # Expired lookup tables load as jobs of this same batch.
+    lookup_jobs = reference.prefetch_jobs("resource_persons", "slots", "session_types")
+    results = fetch_parallel({
+        **lookup_jobs,
+        "counts": lambda: status_counts({"today": (today_str, today_str)})["today"],
+        "today": lambda: flatten_bookings(
+            bookings_query("subject_id, rp_id", embeds=("subject", "rp"), eq={"date": today_str}).execute().data
+        ),
+        "absences": lambda: fetch_absence_rows(today_str, today_str),
+        "upcoming": lambda: flatten_bookings(
+            bookings_query(
+                BOOKING_COLUMN_SETS["summary"] + ", topic",
+                in_={"status": ["Approved", "Scheduled", "Pending"]},
+                date_from=today_str,
+            )
+            .order("date", desc=False)
+            .limit(3)
+            .execute()
+            .data
+        ),
+    })
+
+    for name in lookup_jobs:
+        results[name].unwrap()
+    today_rows = results["today"].unwrap()
+
+    rp_map = reference.name_map("resource_persons")
+    slot_map = reference.name_map("slots")
+    st_map = reference.name_map("session_types")
+
+    counts = results["counts"].unwrap()
+    total_today = sum(counts.values())
+    pending_today = counts["Pending"]
+    approved_today = counts["Approved"]
+    rejected_today = counts["Rejected"]
+    cancelled_today = counts["Cancelled"]
 
     c1, c2, c3, c4, c5 = st.columns(5)
     c1.metric("Total Bookings Today", total_today)
@@ -89,7 +115,7 @@ def tab_home():
     st.markdown("### Subject-wise Booking Count (Today)")
     subj_counts = {}
     for b in today_rows:
-        name = subject_map.get(b.get("subject_id"), "Unknown")
+        name = b.get("Subject") or "Unknown"
         subj_counts[name] = subj_counts.get(name, 0) + 1
     df_subj = pd.DataFrame([{"Subject": k, "Bookings": v} for k, v in subj_counts.items()])
     if df_subj.empty:
@@ -102,7 +128,7 @@ def tab_home():
     st.markdown("### RP-wise Load Summary (Today)")
     rp_counts = {}
     for b in today_rows:
-        name = rp_map.get(b.get("rp_id"), "Unassigned")
+        name = b.get("RP") or "Unassigned"
         rp_counts[name] = rp_counts.get(name, 0) + 1
     df_rp = pd.DataFrame([{"RP": k, "Classes Today": v} for k, v in rp_counts.items()])
     if df_rp.empty:
@@ -113,38 +139,28 @@ def tab_home():
     st.divider()
 
     st.markdown("### Today's Absent Teachers")
-    abs_rows = (
-        supabase.table("rp_unavailability")
-        .select("rp_id, date, is_full_day, slot_id, session_type_id")
-        .eq("date", today_str)
-        .execute()
-    ).data or []
-
-    if not abs_rows:
+    absences = results["absences"]
+    if not absences.ok:
+        st.error("Unable to load absences.")
+        st.code(str(absences.error))
+    elif not absences.data:
         st.success("No absences today ✅")
     else:
         absent_view = []
-        for a in abs_rows:
+        for a in absences.data:
             absent_view.append({
                 "RP": rp_map.get(a["rp_id"]),
                 "Full Day": a.get("is_full_day"),
                 "Slot": slot_map.get(a.get("slot_id")) if a.get("slot_id") else "-",
-                "Session Type": st_map.get(a.get("session_type_id")) if a.get("session_type_id") else "-"
+                "Session Type": st_map.get(a.get("session_type_id")) if a.get("session_type_id") else "-",
+                "Until": a.get("end_date") or a.get("date"),
             })
         st.dataframe(pd.DataFrame(absent_view), use_container_width=True)
 
     st.divider()
 
     st.markdown("### Next 3 Upcoming Sessions")
-    upcoming = (
-        supabase.table("bookings")
-        .select("id, date, status, subject_id, rp_id, slot_id, session_type_id, school_id, topic")
-        .gte("date", today_str)
-        .in_("status", ["Approved", "Scheduled", "Pending"])
-        .order("date", desc=False)
-        .limit(3)
-        .execute()
-    ).data or []
+    upcoming = results["upcoming"].unwrap()
 
     if not upcoming:
         st.info("No upcoming sessions.")
@@ -153,11 +169,11 @@ def tab_home():
         for b in upcoming:
             up_view.append({
                 "Date": b.get("date"),
-                "Slot": slot_map.get(b.get("slot_id")),
-                "Subject": subject_map.get(b.get("subject_id")),
-                "Session Type": st_map.get(b.get("session_type_id")),
-                "School": school_map.get(b.get("school_id")),
-                "RP": rp_map.get(b.get("rp_id")),
+                "Slot": b.get("Slot"),
+                "Subject": b.get("Subject"),
+                "Session Type": b.get("Session Type"),
+                "School": b.get("School"),
+                "RP": b.get("RP"),
                 "Status": b.get("status"),
                 "Topic": b.get("topic"),
             })
@@ -181,80 +197,278 @@ def tab_users():
         .execute()
     ).data or []
 
+    result = st.session_state.pop("pending_users_result", None)
+    if result:
+        st.success(f"Approved {result[0]} · deleted {result[1]} users.")
+
     if not pending_users:
         st.success("No pending users right now.")
         return
 
-    df = pd.DataFrame(pending_users)
-    st.dataframe(df, use_container_width=True)
+    user_approvals(pending_users)
 
-    st.divider()
-    options = [f'{u["email"]} ({u["role"]})' for u in pending_users]
-    selected = st.selectbox("Select a pending user", options, key="pending_user_select")
-    selected_user = pending_users[options.index(selected)]
-
-    colA, colB = st.columns(2)
-    with colA:
-        if st.button("✅ Approve User", use_container_width=True):
-            supabase.table("users").update({"is_active": True}).eq("id", selected_user["id"]).execute()
-            st.success(f"Approved: {selected_user['email']}")
-            st.rerun()
+USER_ACTIONS = ["Keep pending", "Approve", "Reject/Delete"]
 
-    with colB:
-        if st.button("❌ Reject/Delete User", use_container_width=True):
-            supabase.table("users").delete().eq("id", selected_user["id"]).execute()
-            st.warning(f"Deleted: {selected_user['email']}")
-            st.rerun()
+@st.fragment
+def user_approvals(pending_users):
+    """Edits stay inside this fragment; Apply writes every decision in at most two requests."""
+    df = pd.DataFrame(pending_users)
+    df.insert(0, "Action", USER_ACTIONS[0])
+    edited = st.data_editor(
+        df,
+        column_config={
+            "Action": st.column_config.SelectboxColumn("Action", options=USER_ACTIONS, required=True),
+            "id": None,
+        },
+        disabled=[c for c in df.columns if c != "Action"],
+        hide_index=True,
+        use_container_width=True,
+        key="pending_users_editor",
+    )
+
+    approve_ids = edited.loc[edited["Action"] == "Approve", "id"].tolist()
+    reject_ids = edited.loc[edited["Action"] == "Reject/Delete", "id"].tolist()
+    st.caption(f"{len(approve_ids)} to approve · {len(reject_ids)} to reject")
+
+    if st.button("Apply decisions", disabled=not (approve_ids or reject_ids), use_container_width=True, key="pending_users_apply"):
+        if approve_ids:
+            supabase.table("users").update({"is_active": True}).in_("id", approve_ids).execute()
+        if reject_ids:
+            supabase.table("users").delete().in_("id", reject_ids).execute()
+        st.session_state["pending_users_result"] = (len(approve_ids), len(reject_ids))
+        st.rerun()
 
 with tabs[1]:
     safe_tab(tab_users)
 
+# ---------------------------
+# EXPORTS
+# ---------------------------
+def _drop_export(key):
+    prepared = st.session_state.pop(f"{key}_export", None)
+    if prepared and os.path.exists(prepared["path"]):
+        os.remove(prepared["path"])
+
+def _serve_export(key, serve):
+    st.session_state[f"{key}_export_serve"] = serve
+
+def export_panel(key, signature, pages):
+    """
+    Format picker + "Prepare export" for a filtered table. pages() returns the
+    DataFrame page generator; the file is written once and kept (one per panel)
+    until the filters change or a new export is prepared. Its bytes are only
+    loaded into a download button until that button is clicked, not on every
+    rerun.
+    """
+    prepared = st.session_state.get(f"{key}_export")
+    if prepared and (prepared["signature"] != signature or not os.path.exists(prepared["path"])):
+        # Filters changed, or the file aged out (export.sweep_exports)
+        _drop_export(key)
+        prepared = None
+
+    c1, c2 = st.columns([1, 2])
+    fmt = c1.selectbox("Format", export.export_formats(), key=f"{key}_export_format")
+    if c2.button("Prepare export", key=f"{key}_export_prepare"):
+        _drop_export(key)
+        with st.spinner("Exporting..."):
+            path, n = export.write_export(pages(), fmt)
+        prepared = {"path": path, "rows": n, "format": fmt, "signature": signature}
+        st.session_state[f"{key}_export"] = prepared
+        _serve_export(key, True)
+
+    if prepared:
+        if prepared["rows"] == 0:
+            st.info("No rows match these filters.")
+            return
+        label = f'{prepared["rows"]} rows (.{prepared["format"]}, {os.path.getsize(prepared["path"]) / 1024:.0f} KB)'
+        if not st.session_state.get(f"{key}_export_serve"):
+            st.button(f"Download again: {label}", key=f"{key}_export_again", on_click=_serve_export, args=(key, True))
+            return
+        with open(prepared["path"], "rb") as fh:
+            st.download_button(
+                f"Download {label}",
+                fh,
+                file_name=f'{key}_{date.today()}.{prepared["format"]}',
+                mime=export.MIME_TYPES[prepared["format"]],
+                key=f"{key}_export_download",
+                on_click=_serve_export,
+                args=(key, False),
+            )
+
 # ---------------------------
 # TAB 3: BOOKINGS
 # ---------------------------
+BOOKINGS_PAGE_SIZE = 50
+MODERATION_PAGE_SIZE = 250
+KEEP_STATUS = "(keep edits)"
+
+def unique_labels(names):
+    """id -> label with repeated labels suffixed by a short id, so a label maps back to one id."""
+    counts = pd.Series(list(names.values())).value_counts()
+    return {i: f"{label} · {str(i)[:8]}" if counts.get(label, 0) > 1 else label for i, label in names.items()}
+
+@st.fragment
+def moderation_grid(rows):
+    """
+    Editable status/date/slot grid for one page of bookings. Edits rerun only
+    this fragment; Apply diffs the grid against `rows` and writes all changes
+    through moderation.apply_changes in one batch.
+    """
+    slot_labels = unique_labels(reference.name_map("slots"))
+    slot_ids = {label: i for i, label in slot_labels.items()}
+    df = pd.DataFrame([
+        {
+            "Select": False,
+            "date": date.fromisoformat(str(r["date"])),
+            "Slot": slot_labels.get(r.get("slot_id"), r.get("Slot")),
+            "status": r.get("status"),
+            "Subject": r.get("Subject"),
+            "School": r.get("School"),
+            "RP": r.get("RP"),
+            "Salesperson": r.get("Salesperson"),
+            "topic": r.get("topic"),
+            "id": r["id"],
+        }
+        for r in rows
+    ])
+    edited = st.data_editor(
+        df,
+        column_config={
+            "Select": st.column_config.CheckboxColumn("Select"),
+            "date": st.column_config.DateColumn("date", required=True),
+            "Slot": st.column_config.SelectboxColumn("Slot", options=list(slot_ids), required=True),
+            "status": st.column_config.SelectboxColumn("status", options=BOOKING_STATUSES, required=True),
+        },
+        disabled=["Subject", "School", "RP", "Salesperson", "topic", "id"],
+        hide_index=True,
+        use_container_width=True,
+        key="admin_moderation_editor",
+    )
+
+    c1, c2 = st.columns([2, 1])
+    bulk_status = c1.selectbox(
+        "Set selected rows to", [KEEP_STATUS] + BOOKING_STATUSES, key="admin_moderation_bulk_status"
+    )
+    all_rows = c1.checkbox("Apply to every row on this page", key="admin_moderation_all_rows")
+    if bulk_status != KEEP_STATUS:
+        target = edited["Select"] | all_rows
+        edited.loc[target, "status"] = bulk_status
+
+    edited_rows = [
+        {"id": e["id"], "status": e["status"], "date": str(e["date"]), "slot_id": slot_ids.get(e["Slot"])}
+        for e in edited.to_dict("records")
+    ]
+    changes = moderation.diff_changes(rows, edited_rows)
+    c2.write("")
+    if c2.button(f"Apply {len(changes)} changes", disabled=not changes, type="primary", use_container_width=True, key="admin_moderation_apply"):
+        with st.spinner("Validating and saving..."):
+            st.session_state["admin_moderation_result"] = moderation.apply_changes(changes)
+        st.session_state.pop("admin_moderation_editor", None)
+        st.rerun()
+
 def tab_bookings():
     st.subheader("All Bookings")
 
-    subjects = supabase.table("subjects").select("id,name").execute().data or []
-    schools = supabase.table("schools").select("id,name,city").execute().data or []
-    rps = supabase.table("resource_persons").select("id,display_name").execute().data or []
-    session_types = supabase.table("session_types").select("id,name").execute().data or []
-    slots = supabase.table("slots").select("id,start_time,end_time").execute().data or []
-    salespersons = supabase.table("users").select("id,email,name").eq("role", "salesperson").execute().data or []
-
-    subject_map = {s["id"]: s["name"] for s in subjects}
-    school_map = {s["id"]: s["name"] for s in schools}
-    rp_map = {r["id"]: r["display_name"] for r in rps}
-    st_map = {t["id"]: t["name"] for t in session_types}
-    slot_map = {sl["id"]: f'{sl["start_time"]} - {sl["end_time"]}' for sl in slots}
-    sp_map = {u["id"]: (u.get("name") or u.get("email")) for u in salespersons}
-
-    filter_status = st.selectbox("Status", ["All", "Pending", "Approved", "Rejected", "Cancelled", "Completed"])
-
-    q = supabase.table("bookings").select("*").order("date", desc=True)
-    if filter_status != "All":
-        q = q.eq("status", filter_status)
-
-    rows = (q.execute().data or [])
+    salespersons = supabase.table("users").select("id,email,name").eq("role", "salesperson").order("email").execute().data or []
+    # Options are ids (labels may repeat); None means "All"
+    sp_names = {None: "All"} | {u["id"]: u.get("name") or u["email"] for u in salespersons}
+    rp_names = {None: "All"} | reference.name_map("resource_persons")
+    subject_names = {None: "All"} | reference.name_map("subjects")
+
+    f1, f2, f3 = st.columns(3)
+    with f1:
+        date_range = st.date_input("Date range", value=(), key="admin_bk_dates")
+        filter_status = st.selectbox("Status", ["All", "Pending", "Approved", "Rejected", "Cancelled", "Completed"], key="admin_bk_status")
+    with f2:
+        sp_id = st.selectbox("Salesperson", list(sp_names), format_func=sp_names.get, key="admin_bk_sp")
+        rp_id = st.selectbox("RP", list(rp_names), format_func=rp_names.get, key="admin_bk_rp")
+    with f3:
+        subject_id = st.selectbox("Subject", list(subject_names), format_func=subject_names.get, key="admin_bk_subject")
+        # Typeahead (db/schools.py) instead of loading every school into the selectbox
+        school_search = st.text_input("Search School", placeholder="Type the start of the school name", key="admin_bk_school_search")
+        school_names = {None: "All"} | {
+            sc["id"]: f'{sc["name"]} ({sc["city"]})' if sc.get("city") else sc["name"]
+            for sc in schools.search_schools(school_search)
+        }
+        school_id = st.selectbox("School", list(school_names), format_func=school_names.get, key="admin_bk_school")
+    sort = st.radio("Sort by date", ["Newest first", "Oldest first"], horizontal=True, key="admin_bk_sort")
+    moderate = st.toggle("Moderate (edit status / reschedule)", key="admin_bk_moderate")
+
+    filters = {
+        "date_from": date_range[0] if len(date_range) > 0 else None,
+        "date_to": date_range[1] if len(date_range) > 1 else None,
+        "status": filter_status,
+        "salesperson_id": sp_id,
+        "rp_id": rp_id,
+        "subject_id": subject_id,
+        "school_id": school_id,
+    }
+    desc = sort == "Newest first"
+
+    with st.expander("Export bookings matching these filters"):
+        export_panel(
+            "bookings",
+            tuple(sorted((k, str(v)) for k, v in filters.items())),
+            lambda: export.iter_booking_pages(filters),
+        )
+
+    # cursors[i] is the keyset cursor that starts page i; reset when filters change
+    signature = (tuple(sorted((k, str(v)) for k, v in filters.items())), desc, moderate)
+    if st.session_state.get("admin_bk_signature") != signature:
+        st.session_state["admin_bk_signature"] = signature
+        st.session_state["admin_bk_cursors"] = [None]
+    cursors = st.session_state["admin_bk_cursors"]
+    page = len(cursors) - 1
+
+    result = st.session_state.pop("admin_moderation_result", None)
+    if result:
+        st.success(f'Applied {result["applied"]} changes ({result["updates"]} update requests).')
+        if result["refused"]:
+            st.warning(f'{len(result["refused"])} changes were refused because they break allocation rules:')
+            st.dataframe(pd.DataFrame(result["refused"]), hide_index=True, use_container_width=True)
+
+    page_size = MODERATION_PAGE_SIZE if moderate else BOOKINGS_PAGE_SIZE
+    rows, next_cursor = fetch_bookings_page(filters, after=cursors[-1], page_size=page_size, desc=desc)
     if not rows:
         st.info("No bookings found.")
-        return
+        if page == 0:
+            return
 
-    df = pd.DataFrame(rows)
-    if "subject_id" in df.columns:
-        df["Subject"] = df["subject_id"].map(subject_map)
-    if "school_id" in df.columns:
-        df["School"] = df["school_id"].map(school_map)
-    if "rp_id" in df.columns:
-        df["RP"] = df["rp_id"].map(rp_map)
-    if "session_type_id" in df.columns:
-        df["Session Type"] = df["session_type_id"].map(st_map)
-    if "slot_id" in df.columns:
-        df["Slot"] = df["slot_id"].map(slot_map)
-    if "salesperson_id" in df.columns:
-        df["Salesperson"] = df["salesperson_id"].map(sp_map)
-
-    st.dataframe(df, use_container_width=True)
+    event = None
+    if moderate and rows:
+        moderation_grid(rows)
+    else:
+        show_cols = ["date", "Slot", "Subject", "School", "Session Type", "RP", "Salesperson", "status", "topic", "id"]
+        df = pd.DataFrame(rows)
+        df = df[[c for c in show_cols if c in df.columns]]
+        event = st.dataframe(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key="admin_bk_grid",
+        )
+
+    p1, p2, p3 = st.columns([1, 2, 1])
+    with p1:
+        if st.button("◀ Previous", disabled=page == 0, use_container_width=True, key="admin_bk_prev"):
+            cursors.pop()
+            st.rerun()
+    with p2:
+        st.caption(f"Page {page + 1} · {len(rows)} rows")
+    with p3:
+        if st.button("Next ▶", disabled=next_cursor is None, use_container_width=True, key="admin_bk_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+    # Full row (every column) only for the booking the admin clicked
+    selected = event.selection.rows if event else []
+    if selected and selected[0] < len(rows):
+        detail = fetch_booking(rows[selected[0]]["id"])
+        if detail:
+            st.markdown("### Booking Details")
+            st.json(detail)
 
 with tabs[2]:
     safe_tab(tab_bookings)
@@ -262,14 +476,53 @@ with tabs[2]:
 # ---------------------------
 # TAB 4: FEEDBACK
 # ---------------------------
+FEEDBACK_PREVIEW_ROWS = 200
+
 def tab_feedback():
     st.subheader("Feedback & Reports")
 
-    fb = supabase.table("feedback").select("*").order("created_at", desc=True).execute().data or []
-    if not fb:
-        st.info("No feedback yet.")
-        return
-    st.dataframe(pd.DataFrame(fb), use_container_width=True)
+    with st.expander("Export feedback"):
+        fb_range = st.date_input("Submitted between", value=(), key="admin_fb_export_dates")
+        fb_from = fb_range[0] if len(fb_range) > 0 else None
+        fb_to = fb_range[1] if len(fb_range) > 1 else None
+        export_panel(
+            "feedback",
+            (str(fb_from), str(fb_to)),
+            lambda: export.iter_feedback_pages(fb_from, fb_to),
+        )
+
+    months = feedback_analytics.recent_months(FEEDBACK_REPORT_MONTHS)
+    r1, r2 = st.columns([2, 1])
+    with r1:
+        selected_months = st.multiselect("Months (by submission date)", months, default=months[:3], key="admin_fb_months")
+    with r2:
+        dimension = st.selectbox("Group by", list(feedback_analytics.DIMENSIONS), key="admin_fb_dimension")
+
+    if not selected_months:
+        st.info("Pick at least one month.")
+    else:
+        summary = feedback_analytics.totals(selected_months)
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Feedback", summary["feedback"])
+        m2.metric("Avg Teacher Response", summary["teacher"] if summary["feedback"] else "-")
+        m3.metric("Avg Engagement", summary["engagement"] if summary["feedback"] else "-")
+        m4.metric("Conducted", f'{summary["conducted_pct"]}%' if summary["feedback"] else "-")
+
+        report = feedback_analytics.report(selected_months, dimension)
+        if report.empty:
+            st.info("No feedback in the selected months.")
+        else:
+            st.dataframe(report, hide_index=True, use_container_width=True)
+            st.bar_chart(report.set_index(dimension)[["Avg Teacher Response", "Avg Engagement"]])
+
+    if st.checkbox(f"Show the latest {FEEDBACK_PREVIEW_ROWS} submissions", key="admin_fb_show_latest"):
+        fb = (
+            supabase.table("feedback").select("*").order("created_at", desc=True).limit(FEEDBACK_PREVIEW_ROWS).execute()
+        ).data or []
+        if not fb:
+            st.info("No feedback yet.")
+        else:
+            st.dataframe(pd.DataFrame(fb), use_container_width=True)
 
 with tabs[3]:
     safe_tab(tab_feedback)
@@ -286,6 +539,39 @@ def tab_teachers():
         return
     st.dataframe(pd.DataFrame(rps), use_container_width=True)
 
+    st.divider()
+    st.markdown("### Record RP Absence")
+
+    slot_map = reference.name_map("slots")
+    st_map = reference.name_map("session_types")
+    rp_labels = [r.get("display_name") or r["id"] for r in rps]
+
+    with st.form("record_absence", clear_on_submit=True):
+        rp_label = st.selectbox("Resource Person", rp_labels)
+        c1, c2 = st.columns(2)
+        with c1:
+            start = st.date_input("From", value=date.today())
+        with c2:
+            end = st.date_input("To (inclusive)", value=date.today())
+        full_day = st.checkbox("Full day", value=True)
+        slot_label = st.selectbox("Only this slot", ["-"] + list(slot_map.values()))
+        st_label = st.selectbox("Only this session type", ["-"] + list(st_map.values()))
+        submitted = st.form_submit_button("Save absence")
+
+    if submitted:
+        slot_id = next((k for k, v in slot_map.items() if v == slot_label), None)
+        session_type_id = next((k for k, v in st_map.items() if v == st_label), None)
+        if end < start:
+            st.error("'To' date must be on or after 'From'.")
+        elif not full_day and not slot_id and not session_type_id:
+            st.error("Pick a slot or session type for a partial-day absence.")
+        else:
+            record_absence(
+                rps[rp_labels.index(rp_label)]["id"], start, end,
+                is_full_day=full_day, slot_id=slot_id, session_type_id=session_type_id,
+            )
+            st.success("Absence saved.")
+
 with tabs[4]:
     safe_tab(tab_teachers)
 
@@ -303,12 +589,7 @@ def tab_rp_linking():
         .execute()
     ).data or []
 
-    rp_profiles = (
-        supabase.table("resource_persons")
-        .select("id,display_name,user_id")
-        .order("display_name")
-        .execute()
-    ).data or []
+    rp_profiles = reference.get_rows("resource_persons")
 
     if not rp_users:
         st.warning("No RP users found in users table.")
@@ -333,9 +614,87 @@ def tab_rp_linking():
         supabase.table("resource_persons").update({
             "user_id": selected_user["id"]
         }).eq("id", selected_profile["id"]).execute()
+        reference.invalidate("resource_persons")
 
         st.success("Linked successfully.")
         st.rerun()
 
 with tabs[5]:
     safe_tab(tab_rp_linking)
+
+# ---------------------------
+# TAB 7: ALLOCATION TRACE
+# ---------------------------
+def tab_allocation_trace():
+    st.subheader("Allocation Trace")
+
+    if not ALLOCATION_TRACE:
+        st.info("Tracing is off. Set CORDOVA_ALLOCATION_TRACE=1 to record assign_rp decisions.")
+    if not QUERY_INSTRUMENTATION:
+        st.caption("Per-phase query counts need CORDOVA_QUERY_INSTRUMENTATION=1.")
+
+    stats = allocation_trace.rule_stats()
+    outcomes = allocation_trace.outcome_counts()
+    if not stats and not outcomes:
+        st.caption("No traced allocations in this process yet.")
+        return
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("**Outcomes**")
+        st.dataframe(
+            pd.DataFrame([{"outcome": k, "calls": v} for k, v in sorted(outcomes.items(), key=lambda kv: -kv[1])]),
+            use_container_width=True, hide_index=True,
+        )
+    with c2:
+        st.markdown("**Per-RP rule hits**")
+        if stats:
+            st.dataframe(pd.DataFrame(stats), use_container_width=True, hide_index=True)
+        order = allocation_trace.current_order()
+        if order:
+            st.caption("Current check order: " + " → ".join(order))
+
+    if st.button("Reset trace stats"):
+        allocation_trace.reset()
+        st.rerun()
+
+    traces = allocation_trace.recent_traces()
+    if not traces:
+        return
+
+    subject_map = reference.name_map("subjects")
+    slot_map = reference.name_map("slots")
+    rp_map = reference.name_map("resource_persons")
+
+    only_failed = st.checkbox("Only unassigned requests", value=True)
+    shown = [t for t in traces if not only_failed or not t["rp_id"]]
+    if not shown:
+        st.caption("No matching traces.")
+        return
+
+    labels = [
+        f'{t["ts"][:19]} · {t["request"]["date"]} · {subject_map.get(t["request"]["subject_id"], "?")} · '
+        f'{slot_map.get(t["request"]["slot_id"], "?")} → {rp_map.get(t["rp_id"], t["rp_id"]) or t["blocked_by"]}'
+        for t in shown
+    ]
+    t = shown[labels.index(st.selectbox("Trace", labels))]
+
+    st.write(f'Total: **{t["total_ms"]:.2f} ms** · outcome: **{t["blocked_by"] or "assigned"}**')
+    st.dataframe(pd.DataFrame(t["phases"]), use_container_width=True, hide_index=True)
+    if t["candidates"]:
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "RP": rp_map.get(c["rp_id"], c["rp_id"]),
+                    "priority": c["priority"],
+                    "rejected_by": c["rejected_by"] or "✅ accepted",
+                    "all_failed": ", ".join(c["failed"]),
+                    "check_us": round(sum(c["check_ns"].values()) / 1000, 1),
+                }
+                for c in t["candidates"]
+            ]),
+            use_container_width=True, hide_index=True,
+        )
+
+with tabs[6]:
+    safe_tab(tab_allocation_trace)
@@ -4,6 +4,9 @@ import pandas as pd
 from datetime import date, timedelta, datetime
 from config.settings import SESSION_KEYS
 from db.connection import get_supabase_admin
+from db import availability_cache, reference
+from db.aggregates import count_bookings, status_counts
+from db.bookings import fetch_bookings
 from utils.auth import logout
 
 st.title("Resource Person Dashboard")
@@ -59,16 +62,8 @@ tabs = st.tabs(["Home", "My Classes"])
 # -------------------------
 # LOOKUPS
 # -------------------------
-subjects = supabase.table("subjects").select("id,name").execute().data or []
-schools = supabase.table("schools").select("id,name,city").execute().data or []
-session_types = supabase.table("session_types").select("id,name").execute().data or []
-slots = supabase.table("slots").select("id,start_time,end_time").execute().data or []
-
-subject_map = {s["id"]: s["name"] for s in subjects}
-school_map = {s["id"]: s["name"] for s in schools}
-school_city_map = {s["id"]: s.get("city") for s in schools}
-st_map = {t["id"]: t["name"] for t in session_types}
-slot_map = {sl["id"]: f'{sl["start_time"]} - {sl["end_time"]}' for sl in slots}
+subjects = reference.get_rows("subjects")
+st_map = reference.name_map("session_types")
 
 # -------------------------
 # TAB 1: HOME
@@ -79,21 +74,26 @@ with tabs[0]:
     today_str = str(date.today())
     month_start = str(date.today().replace(day=1))
 
-    res_all = (
-        supabase.table("bookings")
-        .select("id, date, status, session_type_id, subject_id")
-        .eq("rp_id", rp_id)
-        .execute()
-    )
-    all_classes = res_all.data or []
-
-    def count_where(fn):
-        return sum(1 for b in all_classes if fn(b))
+    tomorrow_str = str(date.today() + timedelta(days=1))
 
-    today_classes = count_where(lambda b: b.get("date") == today_str and b.get("status") in ["Approved", "Scheduled"])
-    tomorrow_classes = count_where(lambda b: b.get("date") == str(date.today() + timedelta(days=1)) and b.get("status") in ["Approved", "Scheduled"])
-    month_classes = count_where(lambda b: (b.get("date") or "") >= month_start)
-    avrd_classes = count_where(lambda b: st_map.get(b.get("session_type_id")) == "AVRD")
+    counts = status_counts(
+        {
+            "today": (today_str, today_str),
+            "tomorrow": (tomorrow_str, tomorrow_str),
+            "month": (month_start, None),
+        },
+        rp_id=rp_id,
+        client=supabase,
+    )
+    avrd_ids = [i for i, name in st_map.items() if name == "AVRD"]
+
+    today_classes = counts["today"]["Approved"] + counts["today"]["Scheduled"]
+    tomorrow_classes = counts["tomorrow"]["Approved"] + counts["tomorrow"]["Scheduled"]
+    month_classes = sum(counts["month"].values())
+    avrd_classes = (
+        count_bookings(eq={"rp_id": rp_id}, in_={"session_type_id": avrd_ids}, client=supabase)
+        if avrd_ids else 0
+    )
 
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Today's Classes", today_classes)
@@ -123,18 +123,14 @@ with tabs[1]:
             key="rp_filter_subject"
         )
 
-    res = (
-        supabase.table("bookings")
-        .select("""
-            id, date, status, topic, title_name, notes,
-            school_id, subject_id, slot_id, session_type_id, city,
-            rp_attendance_status, rp_session_notes, rp_marked_at
-        """)
-        .eq("rp_id", rp_id)
-        .order("date", desc=False)
-        .execute()
+    rows = fetch_bookings(
+        "rp_classes",
+        embeds=("subject", "school", "slot", "session_type"),
+        eq={"rp_id": rp_id},
+        order="date",
+        desc=False,
+        client=supabase,
     )
-    rows = res.data or []
 
     def in_range(d):
         if filter_range == "All":
@@ -165,11 +161,6 @@ with tabs[1]:
         st.stop()
 
     df = pd.DataFrame(filtered)
-    df["Subject"] = df["subject_id"].map(subject_map)
-    df["School"] = df["school_id"].map(school_map)
-    df["School City"] = df["school_id"].map(school_city_map)
-    df["Session Type"] = df["session_type_id"].map(st_map)
-    df["Slot"] = df["slot_id"].map(slot_map)
 
     show_cols = [
         "date", "Slot", "Subject", "Session Type",
@@ -182,7 +173,7 @@ with tabs[1]:
     st.subheader("Mark Attendance & Submit Notes")
 
     booking_options = [
-        f'{r["date"]} | {slot_map.get(r["slot_id"])} | {subject_map.get(r["subject_id"])} | {school_map.get(r["school_id"])} | {r["id"][:6]}'
+        f'{r["date"]} | {r["Slot"]} | {r["Subject"]} | {r["School"]} | {r["id"][:6]}'
         for r in filtered
     ]
     selected_label = st.selectbox("Select class to update", booking_options, key="rp_booking_select")
@@ -211,5 +202,6 @@ with tabs[1]:
             payload["status"] = "Completed"
 
         supabase.table("bookings").update(payload).eq("id", selected_booking["id"]).execute()
+        availability_cache.invalidate(selected_booking["date"])
         st.success("Attendance & notes saved.")
         st.rerun()
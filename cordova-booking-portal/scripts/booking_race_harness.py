@@ -0,0 +1,140 @@
+# scripts/booking_race_harness.py
+"""
+Fires N parallel booking submissions for one date and checks that the
+committed bookings still satisfy every allocation rule.
+
+Run from the app folder against the Supabase project in the app's secrets:
+    python -m scripts.booking_race_harness --date 2026-11-02 --n 12 --cleanup
+
+or without a project, against the in-process local backend seeded with a
+bench.workload data set (the date defaults to the first weekday after the
+workload's bookings, so the check starts from an empty, consistent day):
+    python -m scripts.booking_race_harness --local --n 12 --rtt-ms 5
+"""
+import argparse
+import os
+import random
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+HARNESS_TOPIC = "race-harness"
+
+
+def _seed_local(rtt_ms):
+    """Seeds the local store with one month of workload data; returns a free weekday after it."""
+    from bench.workload import WorkloadSpec, generate
+    from db.local_backend import get_local_store
+
+    data = generate(WorkloadSpec(months=1))
+    store = get_local_store()
+    store.load(data)
+    store.rpcs["rebuild_booking_day_counters"](store, {})
+    # A simulated round trip lets the submissions interleave like real requests
+    store.latency_ms = rtt_ms
+
+    # Generated bookings are not allocator-consistent, so race on a day without any
+    day = date.fromisoformat(max(str(b["date"]) for b in data["bookings"])) + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return str(day)
+
+
+def _submit(booking):
+    from db.allocation import BookingConflictError, book_session
+    try:
+        row = book_session(booking)
+        return ("committed", row) if row else ("no_rp", None)
+    except BookingConflictError:
+        return ("conflict", None)
+    except Exception as e:
+        return ("error", str(e))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--date", help="Booking date (YYYY-MM-DD); required unless --local")
+    ap.add_argument("--local", action="store_true", help="Use the local backend seeded by bench.workload")
+    ap.add_argument("--rtt-ms", type=float, default=5, help="Simulated round trip per query with --local")
+    ap.add_argument("--n", type=int, default=8, help="Parallel submissions")
+    ap.add_argument("--subject-id")
+    ap.add_argument("--session-type-id")
+    ap.add_argument("--salesperson-id", help="Salesperson recorded on the test bookings")
+    ap.add_argument("--spread-slots", action="store_true", help="Use random slots instead of one hot slot")
+    ap.add_argument("--cleanup", action="store_true", help="Delete the harness bookings afterwards")
+    args = ap.parse_args(argv)
+
+    if args.local:
+        # Must be set before the app modules read config.settings
+        os.environ["CORDOVA_DB_BACKEND"] = "local"
+        local_start = _seed_local(args.rtt_ms)
+        args.date = args.date or local_start
+    elif not args.date:
+        ap.error("--date is required unless --local is given")
+
+    from db.absences import fetch_absence_rows
+    from db.allocation import find_rule_violations
+    from db.connection import get_supabase
+
+    supabase = get_supabase()
+    slots = supabase.table("slots").select("id,start_time,end_time").eq("is_active", True).order("start_time").execute().data or []
+    schools = supabase.table("schools").select("id,name").limit(max(args.n, 1)).execute().data or []
+    session_types = supabase.table("session_types").select("id,name").execute().data or []
+    rules = supabase.table("rp_subject_rules").select("rp_id,subject_id,priority,max_classes_per_day,is_saturday,is_avrd").execute().data or []
+
+    if not slots or not schools or not session_types or not rules:
+        print("Need slots, schools, session types and rp_subject_rules to run.")
+        return 2
+
+    subject_id = args.subject_id or rules[0]["subject_id"]
+    session_type_id = args.session_type_id or session_types[0]["id"]
+
+    bookings = []
+    for i in range(args.n):
+        slot = random.choice(slots) if args.spread_slots else slots[0]
+        bookings.append({
+            "school_id": schools[i % len(schools)]["id"],
+            "salesperson_id": args.salesperson_id,
+            "subject_id": subject_id,
+            "slot_id": slot["id"],
+            "session_type_id": session_type_id,
+            "date": args.date,
+            "topic": HARNESS_TOPIC,
+            "title_name": HARNESS_TOPIC,
+            "status": "Pending",
+        })
+
+    with ThreadPoolExecutor(max_workers=args.n) as pool:
+        outcomes = list(pool.map(_submit, bookings))
+
+    print("Outcomes:", dict(Counter(kind for kind, _ in outcomes)))
+    for kind, detail in outcomes:
+        if kind == "error":
+            print("  error:", detail)
+
+    day = (
+        supabase.table("bookings")
+        .select("id, date, status, slot_id, school_id, rp_id, subject_id, session_type_id")
+        .eq("date", args.date)
+        .execute()
+    ).data or []
+    absences = fetch_absence_rows(args.date, args.date)
+
+    violations = find_rule_violations(day, slots, rules, session_types, absences)
+    for v in violations:
+        print(f"VIOLATION [{v['rule']}] {v['date']}: {v['detail']}")
+    if not violations:
+        print(f"OK: {len(day)} bookings on {args.date}, no rule violated.")
+
+    if args.cleanup:
+        ids = [row["id"] for kind, row in outcomes if kind == "committed"]
+        if ids:
+            supabase.table("bookings").delete().in_("id", ids).execute()
+            print(f"Deleted {len(ids)} harness bookings.")
+
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+# scripts/rollup.py
+"""
+Verify or rebuild the booking_day_counters rollup.
+
+    python -m scripts.rollup verify --from 2026-01-01 --to 2026-12-31
+    python -m scripts.rollup rebuild --from 2026-01-01 --to 2026-12-31
+"""
+import argparse
+import sys
+
+from db.rollup import rebuild_day_counters, verify_day_counters
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("command", choices=["verify", "rebuild"])
+    ap.add_argument("--from", dest="start", required=True)
+    ap.add_argument("--to", dest="end", required=True)
+    args = ap.parse_args(argv)
+
+    if args.command == "rebuild":
+        n = rebuild_day_counters(args.start, args.end)
+        print(f"Rebuilt booking_day_counters for {args.start}..{args.end} ({n} rows).")
+
+    diffs = verify_day_counters(args.start, args.end)
+    for d in diffs[:50]:
+        print(f"{d['date']} {d['kind']} {d['key1']}/{d['key2']}: expected {d['expected']}, found {d['actual']}")
+    if diffs:
+        print(f"{len(diffs)} counter rows out of sync.")
+        return 1
+    print("booking_day_counters is in sync with bookings.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
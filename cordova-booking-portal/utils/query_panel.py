@@ -0,0 +1,43 @@
+# utils/query_panel.py
+import streamlit as st
+import pandas as pd
+
+from db.instrumentation import begin_rerun, fragment_records, summarize, to_jsonl
+
+
+def render_query_panel():
+    """Sidebar cost panel for the previous rerun; also starts recording this one."""
+    records = begin_rerun()
+    fragments = fragment_records()
+
+    with st.sidebar.expander("🔍 Query cost (previous rerun)"):
+        if fragments:
+            f = summarize(fragments)
+            st.caption(f'Fragment reruns since: {f["calls"]} queries · {f["total_ms"]:.0f} ms (not included below)')
+        if not records:
+            st.caption("No queries recorded yet.")
+            return
+
+        s = summarize(records)
+        c1, c2 = st.columns(2)
+        c1.metric("Queries", s["calls"])
+        c2.metric("Total ms", f'{s["total_ms"]:.0f}')
+        st.caption(f'{s["rows"]} rows · {s["bytes"] / 1024:.1f} KB')
+
+        if s["n_plus_one"]:
+            st.warning("Possible N+1 patterns:")
+            for g in s["n_plus_one"]:
+                st.write(f'• {g["target"]} ({g["ops"] or "select"}) ×{g["calls"]} from `{g["caller"]}`')
+
+        df = pd.DataFrame(s["top"][:10])
+        df["total_ms"] = df["total_ms"].round(1)
+        st.dataframe(df[["target", "ops", "caller", "calls", "total_ms", "rows"]],
+                     use_container_width=True, hide_index=True)
+
+        st.download_button(
+            "Download JSONL",
+            to_jsonl(records),
+            file_name="queries.jsonl",
+            mime="application/json",
+            use_container_width=True,
+        )